@@ -15,8 +15,8 @@ from services.supabase_service import SupabaseService
 class CommandsHandler:
     """Обработчик базовых команд"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /start - короткое приветствие (Единое окно)"""
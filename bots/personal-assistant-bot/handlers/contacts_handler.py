@@ -17,8 +17,8 @@ logger = logging.getLogger(__name__)
 class ContactsHandler:
     """Обработчик команд контактов"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
     
     async def contact_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """
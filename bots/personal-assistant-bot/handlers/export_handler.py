@@ -17,8 +17,8 @@ logger = logging.getLogger(__name__)
 class ExportHandler:
     """Обработчик команд экспорта"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
         self.export = ExportService()
         self.analytics = ExpenseAnalytics(self.db)
     
@@ -13,8 +13,8 @@ from services.health_analytics import HealthAnalytics
 class HealthHandler:
     """Обработчик дневника здоровья"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
         self.analytics = HealthAnalytics()
     
     async def handle_health_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
@@ -16,8 +16,8 @@ logger = logging.getLogger(__name__)
 class MicrosoftHandler:
     """Обработчик команд Microsoft"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
         self._graph_clients = {}  # user_id -> MicrosoftGraphService
     
     def _get_client(self, user_id: str) -> MicrosoftGraphService:
@@ -12,9 +12,9 @@ from services.storage_service import StorageService
 class ProjectsHandler:
     """Обработчик команд проектов"""
     
-    def __init__(self):
-        self.db = SupabaseService()
-        self.storage = StorageService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
+        self.storage = StorageService(supabase_service)
     
     async def project_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Список проектов /project list"""
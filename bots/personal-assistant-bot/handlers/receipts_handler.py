@@ -15,8 +15,8 @@ from services.market_service import MarketService
 class ReceiptsHandler:
     """Обработчик чеков"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
         self.ocr = OCRService()
         self.parser = ReceiptParser()
         self.market = MarketService()
@@ -11,8 +11,8 @@ from services.supabase_service import SupabaseService
 class SettingsHandler:
     """Обработчик настроек"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
     
     async def set_mode(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Установить режим работы /mode [режим]"""
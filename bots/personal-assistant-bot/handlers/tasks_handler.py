@@ -11,8 +11,8 @@ from services.supabase_service import SupabaseService
 class TasksHandler:
     """Обработчик команд задач"""
     
-    def __init__(self):
-        self.db = SupabaseService()
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
     
     async def task_list(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Список активных задач /task list"""
@@ -64,7 +64,7 @@ class WorkTrackerHandler:
         }
         
         try:
-            result = self.db.client.table("work_logs").insert(data).execute()
+            result = await self.db.execute(self.db.client.table("work_logs").insert(data))
             logger.info(f"Work log added: {log_type} for user {user_id} at {now}")
             return result.data[0] if result.data else {}
         except Exception as e:
@@ -78,12 +78,11 @@ class WorkTrackerHandler:
         today = date.today().isoformat()
         
         try:
-            result = self.db.client.table("work_logs") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .eq("log_date", today) \
-                .order("log_time") \
-                .execute()
+            result = await self.db.execute(self.db.client.table("work_logs")
+                .select("*")
+                .eq("user_id", user_id)
+                .eq("log_date", today)
+                .order("log_time"))
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting today logs: {e}")
@@ -92,12 +91,11 @@ class WorkTrackerHandler:
     async def get_logs_for_date(self, user_id: str, target_date: date) -> List[Dict[str, Any]]:
         """Получить логи за конкретную дату"""
         try:
-            result = self.db.client.table("work_logs") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .eq("log_date", target_date.isoformat()) \
-                .order("log_time") \
-                .execute()
+            result = await self.db.execute(self.db.client.table("work_logs")
+                .select("*")
+                .eq("user_id", user_id)
+                .eq("log_date", target_date.isoformat())
+                .order("log_time"))
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting logs for date: {e}")
@@ -108,13 +106,12 @@ class WorkTrackerHandler:
         week_ago = (date.today() - timedelta(days=7)).isoformat()
         
         try:
-            result = self.db.client.table("work_logs") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .gte("log_date", week_ago) \
-                .order("log_date", desc=True) \
-                .order("log_time") \
-                .execute()
+            result = await self.db.execute(self.db.client.table("work_logs")
+                .select("*")
+                .eq("user_id", user_id)
+                .gte("log_date", week_ago)
+                .order("log_date", desc=True)
+                .order("log_time"))
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting week logs: {e}")
@@ -40,6 +40,7 @@ from handlers import (
 from handlers.contacts_handler import ContactsHandler
 from handlers.work_tracker_handler import WorkTrackerHandler
 from services.notifications import NotificationService
+from services.supabase_service import SupabaseService
 from services.migration_runner import run_migrations_check
 from services.auto_sync import get_auto_sync
 
@@ -62,17 +63,21 @@ class PersonalAssistantBot:
     
     def __init__(self, application: Application = None):
         self.application = application
-        self.commands = CommandsHandler()
-        self.projects = ProjectsHandler()
-        self.tasks = TasksHandler()
-        self.receipts = ReceiptsHandler()
-        self.health = HealthHandler()
-        self.settings = SettingsHandler()
+        
+        # Единый доступ к БД для всех обработчиков (клиент создаётся при первом запросе)
+        self.db = SupabaseService()
+        
+        self.commands = CommandsHandler(self.db)
+        self.projects = ProjectsHandler(self.db)
+        self.tasks = TasksHandler(self.db)
+        self.receipts = ReceiptsHandler(self.db)
+        self.health = HealthHandler(self.db)
+        self.settings = SettingsHandler(self.db)
         self.reminders = RemindersHandler()
-        self.export = ExportHandler()
-        self.microsoft = MicrosoftHandler()
-        self.contacts = ContactsHandler()
-        self.work_tracker = WorkTrackerHandler(self.tasks.db)  # Используем supabase_service
+        self.export = ExportHandler(self.db)
+        self.microsoft = MicrosoftHandler(self.db)
+        self.contacts = ContactsHandler(self.db)
+        self.work_tracker = WorkTrackerHandler(self.db)
         
         # Единый обработчик текстовых сообщений (Единое окно)
         self.unified = create_unified_handler(
@@ -120,6 +125,9 @@ class PersonalAssistantBot:
         
         # Остановка автосинхронизации
         await self.auto_sync.stop()
+        
+        # Остановка пула запросов к БД
+        self.db.close()
     
     def setup_handlers(self, app: Application):
         """Настройка обработчиков команд"""
@@ -0,0 +1,43 @@
+-- =============================================
+-- Миграция 006: Сохранение чека одной транзакцией
+-- save_receipt_with_items(p_receipt, p_items)
+-- =============================================
+
+-- Чек и все его товары пишутся за один запрос: либо всё, либо ничего
+CREATE OR REPLACE FUNCTION save_receipt_with_items(
+    p_receipt JSONB,
+    p_items JSONB DEFAULT '[]'
+)
+RETURNS SETOF receipts
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_receipt receipts;
+BEGIN
+    INSERT INTO receipts (user_id, store_name, receipt_date, total_sum, metadata)
+    VALUES (
+        p_receipt->>'user_id',
+        p_receipt->>'store_name',
+        (p_receipt->>'receipt_date')::TIMESTAMP,
+        (p_receipt->>'total_sum')::DECIMAL,
+        COALESCE(p_receipt->'metadata', '{}')
+    )
+    RETURNING * INTO v_receipt;
+
+    -- Товары - одной многострочной вставкой
+    INSERT INTO receipt_items (receipt_id, item_name, category, price, quantity)
+    SELECT
+        v_receipt.id,
+        item->>'item_name',
+        item->>'category',
+        (item->>'price')::DECIMAL,
+        COALESCE((item->>'quantity')::DECIMAL, 1)
+    FROM jsonb_array_elements(COALESCE(p_items, '[]')) AS item;
+
+    RETURN NEXT v_receipt;
+END;
+$$;
+
+-- =============================================
+-- Готово! Выполни этот SQL в Supabase SQL Editor
+-- =============================================
@@ -0,0 +1,53 @@
+-- =============================================
+-- Миграция 007: Статистика по чекам на стороне БД
+-- get_receipt_stats(p_user_id) + индекс по товарам
+-- =============================================
+
+-- Товары чека по категориям: агрегаты читаются прямо из индекса
+CREATE INDEX IF NOT EXISTS idx_receipt_items_receipt_category
+    ON receipt_items(receipt_id, category) INCLUDE (price);
+
+-- Итоги, количество товаров, суммы по категориям и магазинам - за один вызов.
+-- NULL, если у пользователя нет чеков
+CREATE OR REPLACE FUNCTION get_receipt_stats(p_user_id TEXT)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    WITH user_receipts AS (
+        SELECT id, store_name, total_sum
+        FROM receipts
+        WHERE user_id = p_user_id
+    ),
+    user_items AS (
+        SELECT i.category, i.price
+        FROM receipt_items i
+        JOIN user_receipts r ON r.id = i.receipt_id
+    )
+    SELECT jsonb_build_object(
+        'total_spent', (SELECT COALESCE(SUM(total_sum), 0) FROM user_receipts),
+        'receipts_count', (SELECT COUNT(*) FROM user_receipts),
+        'items_count', (SELECT COUNT(*) FROM user_items),
+        'by_category', (
+            SELECT COALESCE(jsonb_object_agg(category, spent), '{}')
+            FROM (
+                SELECT COALESCE(category, 'Прочее') AS category, COALESCE(SUM(price), 0) AS spent
+                FROM user_items
+                GROUP BY 1
+            ) c
+        ),
+        'by_store', (
+            SELECT COALESCE(jsonb_object_agg(store, spent), '{}')
+            FROM (
+                SELECT COALESCE(store_name, 'Неизвестно') AS store, COALESCE(SUM(total_sum), 0) AS spent
+                FROM user_receipts
+                GROUP BY 1
+            ) s
+        )
+    )
+    WHERE EXISTS (SELECT 1 FROM user_receipts);
+$$;
+
+-- =============================================
+-- Готово! Выполни этот SQL в Supabase SQL Editor
+-- =============================================
@@ -122,7 +122,7 @@ class ContactsManager:
         }
         
         try:
-            result = self.db.client.table("contact_interactions").insert(data).execute()
+            result = await self.db.execute(self.db.client.table("contact_interactions").insert(data))
             logger.info(f"Interaction added: {interaction_type} with contact {contact_id}")
             return result.data[0] if result.data else {}
         except Exception as e:
@@ -137,13 +137,12 @@ class ContactsManager:
     ) -> List[Dict[str, Any]]:
         """Получить историю взаимодействий с контактом"""
         try:
-            result = self.db.client.table("contact_interactions") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .eq("contact_id", contact_id) \
-                .order("interaction_date", desc=True) \
-                .limit(limit) \
-                .execute()
+            result = await self.db.execute(self.db.client.table("contact_interactions")
+                .select("*")
+                .eq("user_id", user_id)
+                .eq("contact_id", contact_id)
+                .order("interaction_date", desc=True)
+                .limit(limit))
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting interactions: {e}")
@@ -153,12 +152,11 @@ class ContactsManager:
         """Получить взаимодействия с предстоящими follow-up"""
         today = date.today().isoformat()
         try:
-            result = self.db.client.table("contact_interactions") \
-                .select("*, contacts(name)") \
-                .eq("user_id", user_id) \
-                .gte("follow_up_date", today) \
-                .order("follow_up_date") \
-                .execute()
+            result = await self.db.execute(self.db.client.table("contact_interactions")
+                .select("*, contacts(name)")
+                .eq("user_id", user_id)
+                .gte("follow_up_date", today)
+                .order("follow_up_date"))
             return result.data or []
         except Exception as e:
             logger.error(f"Error getting followups: {e}")
@@ -169,11 +167,10 @@ class ContactsManager:
     async def get_context(self, user_id: str) -> Dict[str, Any]:
         """Получить контекст разговора пользователя"""
         try:
-            result = self.db.client.table("conversation_context") \
-                .select("*") \
-                .eq("user_id", user_id) \
-                .single() \
-                .execute()
+            result = await self.db.execute(self.db.client.table("conversation_context")
+                .select("*")
+                .eq("user_id", user_id)
+                .single())
             return result.data or {}
         except Exception as e:
             # Контекст не найден - это нормально
@@ -204,9 +201,8 @@ class ContactsManager:
         
         try:
             # Upsert - вставить или обновить
-            result = self.db.client.table("conversation_context") \
-                .upsert(data, on_conflict="user_id") \
-                .execute()
+            result = await self.db.execute(self.db.client.table("conversation_context")
+                .upsert(data, on_conflict="user_id"))
             return result.data[0] if result.data else {}
         except Exception as e:
             logger.error(f"Error setting context: {e}")
@@ -215,10 +211,9 @@ class ContactsManager:
     async def clear_context(self, user_id: str) -> bool:
         """Очистить контекст разговора"""
         try:
-            self.db.client.table("conversation_context") \
-                .delete() \
-                .eq("user_id", user_id) \
-                .execute()
+            await self.db.execute(self.db.client.table("conversation_context")
+                .delete()
+                .eq("user_id", user_id))
             return True
         except Exception as e:
             logger.error(f"Error clearing context: {e}")
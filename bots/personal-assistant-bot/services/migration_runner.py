@@ -81,6 +81,8 @@ class MigrationRunner:
             '003': [],  # Other
             '004': ['contacts'],
             '005': ['contact_interactions', 'work_logs', 'conversation_context'],
+            '006': [],  # Функция save_receipt_with_items
+            '007': [],  # Функция get_receipt_stats, индекс receipt_items
         }
         
         prefix = migration_name.split('_')[0]
@@ -2,23 +2,22 @@
 Сервис для работы с Supabase Storage
 """
 
-import os
 from typing import Optional
-from supabase import create_client, Client
+from supabase import Client
+
+from services.supabase_service import SupabaseService
 
 
 class StorageService:
     """Сервис для загрузки файлов в Supabase Storage"""
     
-    def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_KEY")
-        
-        if url and key:
-            self.client: Client = create_client(url, key)
-        else:
-            self.client = None
-            print("⚠️ Supabase Storage не настроен")
+    def __init__(self, supabase_service: SupabaseService):
+        self.db = supabase_service
+    
+    @property
+    def client(self) -> Optional[Client]:
+        """Общий клиент Supabase"""
+        return self.db.client
     
     async def upload_file(self, bucket: str, path: str, 
                          file_data: bytes, content_type: str = None) -> Optional[str]:
@@ -2,25 +2,70 @@
 Сервис для работы с Supabase БД
 """
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from utils.timezone import now_naive as moscow_now
 from typing import Optional, List, Dict, Any
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+
+# supabase-py синхронный: запросы выполняются в ограниченном пуле потоков,
+# чтобы не блокировать event loop бота
+SUPABASE_MAX_WORKERS = int(os.getenv("SUPABASE_MAX_WORKERS", "8"))
+SUPABASE_QUERY_TIMEOUT = float(os.getenv("SUPABASE_QUERY_TIMEOUT", "10"))
 
 
 class SupabaseService:
     """Сервис для работы с Supabase"""
     
     def __init__(self):
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_KEY")
+        self._url = os.getenv("SUPABASE_URL")
+        self._key = os.getenv("SUPABASE_KEY")
+        self._client: Optional[Client] = None
         
-        if url and key:
-            self.client: Client = create_client(url, key)
-        else:
-            self.client = None
+        if not (self._url and self._key):
             print("⚠️ Supabase не настроен (SUPABASE_URL, SUPABASE_KEY)")
+        
+        self._executor = ThreadPoolExecutor(
+            max_workers=SUPABASE_MAX_WORKERS,
+            thread_name_prefix="supabase"
+        )
+    
+    @property
+    def client(self) -> Optional[Client]:
+        """
+        Клиент Supabase, создаётся при первом обращении
+        
+        Один экземпляр сервиса создаётся в PersonalAssistantBot и передаётся
+        во все обработчики и StorageService, поэтому клиент, его пул
+        соединений и сессия GoTrue существуют в единственном экземпляре.
+        """
+        if self._client is None and self._url and self._key:
+            self._client = create_client(
+                self._url,
+                self._key,
+                options=ClientOptions(postgrest_client_timeout=SUPABASE_QUERY_TIMEOUT)
+            )
+        return self._client
+    
+    async def execute(self, query, timeout: Optional[float] = None):
+        """
+        Выполнить запрос PostgREST в пуле потоков
+        
+        Не более SUPABASE_MAX_WORKERS запросов выполняются одновременно,
+        остальные ждут в очереди пула. При превышении таймаута вызывающий
+        код получает asyncio.TimeoutError, а поток дорабатывает запрос в фоне.
+        """
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(self._executor, query.execute),
+            timeout=timeout or SUPABASE_QUERY_TIMEOUT
+        )
+    
+    def close(self):
+        """Остановить пул потоков"""
+        self._executor.shutdown(wait=False)
     
     # ==========================================
     # ПОЛЬЗОВАТЕЛИ
@@ -32,7 +77,7 @@ class SupabaseService:
             return {}
         
         # Проверить существование
-        result = self.client.table('user_preferences').select('*').eq('user_id', user_id).execute()
+        result = await self.execute(self.client.table('user_preferences').select('*').eq('user_id', user_id))
         
         if result.data:
             return result.data[0]
@@ -46,7 +91,7 @@ class SupabaseService:
             'timezone': 'Europe/Moscow'
         }
         
-        result = self.client.table('user_preferences').insert(new_user).execute()
+        result = await self.execute(self.client.table('user_preferences').insert(new_user))
         return result.data[0] if result.data else {}
     
     async def get_user_preferences(self, user_id: str) -> Dict:
@@ -54,7 +99,7 @@ class SupabaseService:
         if not self.client:
             return {'mode': 'executor', 'give_advice': False}
         
-        result = self.client.table('user_preferences').select('*').eq('user_id', user_id).execute()
+        result = await self.execute(self.client.table('user_preferences').select('*').eq('user_id', user_id))
         
         if result.data:
             return result.data[0]
@@ -69,7 +114,7 @@ class SupabaseService:
         
         await self.ensure_user_exists(user_id)
         
-        result = self.client.table('user_preferences').update(kwargs).eq('user_id', user_id).execute()
+        result = await self.execute(self.client.table('user_preferences').update(kwargs).eq('user_id', user_id))
         return bool(result.data)
     
     async def get_user_stats(self, user_id: str) -> Dict:
@@ -80,21 +125,21 @@ class SupabaseService:
         stats = {}
         
         # Проекты
-        projects = self.client.table('user_projects').select('status').eq('user_id', user_id).execute()
+        projects = await self.execute(self.client.table('user_projects').select('status').eq('user_id', user_id))
         stats['projects_count'] = len(projects.data) if projects.data else 0
         stats['active_projects'] = sum(1 for p in (projects.data or []) if p['status'] == 'active')
         
         # Задачи
-        tasks = self.client.table('user_tasks').select('status').eq('user_id', user_id).execute()
+        tasks = await self.execute(self.client.table('user_tasks').select('status').eq('user_id', user_id))
         stats['tasks_count'] = len(tasks.data) if tasks.data else 0
         stats['pending_tasks'] = sum(1 for t in (tasks.data or []) if t['status'] == 'pending')
         
         # Чеки
-        receipts = self.client.table('receipts').select('id').eq('user_id', user_id).execute()
+        receipts = await self.execute(self.client.table('receipts').select('id').eq('user_id', user_id))
         stats['receipts_count'] = len(receipts.data) if receipts.data else 0
         
         # Здоровье
-        health = self.client.table('health_diary').select('id').eq('user_id', user_id).execute()
+        health = await self.execute(self.client.table('health_diary').select('id').eq('user_id', user_id))
         stats['health_entries'] = len(health.data) if health.data else 0
         
         return stats
@@ -108,31 +153,35 @@ class SupabaseService:
         if not self.client:
             return []
         
-        query = self.client.table('user_projects').select('*').eq('user_id', user_id)
+        # Счетчики файлов и задач считает PostgREST по внешним ключам - один запрос
+        query = self.client.table('user_projects').select(
+            '*, project_files(count), user_tasks(count)'
+        ).eq('user_id', user_id)
         
         if status:
             query = query.eq('status', status)
         
-        result = query.order('created_at', desc=True).execute()
+        result = await self.execute(query.order('created_at', desc=True))
         
         projects = result.data or []
         
-        # Добавить счетчики файлов и задач
         for project in projects:
-            files = self.client.table('project_files').select('id').eq('project_id', project['id']).execute()
-            project['files_count'] = len(files.data) if files.data else 0
-            
-            tasks = self.client.table('user_tasks').select('id').eq('project_id', project['id']).execute()
-            project['tasks_count'] = len(tasks.data) if tasks.data else 0
+            project['files_count'] = self._embedded_count(project.pop('project_files', None))
+            project['tasks_count'] = self._embedded_count(project.pop('user_tasks', None))
         
         return projects
     
+    @staticmethod
+    def _embedded_count(embedded: Optional[List[Dict]]) -> int:
+        """Значение встроенного count, PostgREST возвращает его как [{'count': N}]"""
+        return embedded[0].get('count', 0) if embedded else 0
+    
     async def count_user_projects(self, user_id: str) -> int:
         """Количество проектов пользователя"""
         if not self.client:
             return 0
         
-        result = self.client.table('user_projects').select('id').eq('user_id', user_id).execute()
+        result = await self.execute(self.client.table('user_projects').select('id').eq('user_id', user_id))
         return len(result.data) if result.data else 0
     
     async def create_project(self, user_id: str, project_name: str, description: str = None) -> Dict:
@@ -147,7 +196,7 @@ class SupabaseService:
             'status': 'active'
         }
         
-        result = self.client.table('user_projects').insert(project).execute()
+        result = await self.execute(self.client.table('user_projects').insert(project))
         return result.data[0] if result.data else {}
     
     async def get_project_by_id(self, project_id: str, user_id: str) -> Optional[Dict]:
@@ -156,7 +205,7 @@ class SupabaseService:
             return None
         
         # Поиск по началу UUID
-        result = self.client.table('user_projects').select('*').eq('user_id', user_id).execute()
+        result = await self.execute(self.client.table('user_projects').select('*').eq('user_id', user_id))
         
         for project in (result.data or []):
             if project['id'].startswith(project_id):
@@ -170,7 +219,7 @@ class SupabaseService:
         if not project:
             return False
         
-        result = self.client.table('user_projects').update({'status': status}).eq('id', project['id']).execute()
+        result = await self.execute(self.client.table('user_projects').update({'status': status}).eq('id', project['id']))
         return bool(result.data)
     
     async def delete_project(self, project_id: str, user_id: str) -> bool:
@@ -179,7 +228,7 @@ class SupabaseService:
         if not project:
             return False
         
-        result = self.client.table('user_projects').delete().eq('id', project['id']).execute()
+        result = await self.execute(self.client.table('user_projects').delete().eq('id', project['id']))
         return bool(result.data)
     
     async def get_project_files(self, project_id: str) -> List[Dict]:
@@ -187,7 +236,7 @@ class SupabaseService:
         if not self.client:
             return []
         
-        result = self.client.table('project_files').select('*').eq('project_id', project_id).execute()
+        result = await self.execute(self.client.table('project_files').select('*').eq('project_id', project_id))
         return result.data or []
     
     async def get_project_tasks(self, project_id: str) -> List[Dict]:
@@ -195,7 +244,7 @@ class SupabaseService:
         if not self.client:
             return []
         
-        result = self.client.table('user_tasks').select('*').eq('project_id', project_id).execute()
+        result = await self.execute(self.client.table('user_tasks').select('*').eq('project_id', project_id))
         return result.data or []
     
     async def save_project_file(self, project_id: Optional[str], file_name: str, 
@@ -213,7 +262,7 @@ class SupabaseService:
             'file_type': file_type
         }
         
-        result = self.client.table('project_files').insert(file_data).execute()
+        result = await self.execute(self.client.table('project_files').insert(file_data))
         return result.data[0] if result.data else {}
     
     # ==========================================
@@ -230,7 +279,7 @@ class SupabaseService:
         if status:
             query = query.eq('status', status)
         
-        result = query.order('created_at', desc=True).execute()
+        result = await self.execute(query.order('created_at', desc=True))
         return result.data or []
     
     async def count_user_tasks(self, user_id: str) -> int:
@@ -238,7 +287,7 @@ class SupabaseService:
         if not self.client:
             return 0
         
-        result = self.client.table('user_tasks').select('id').eq('user_id', user_id).execute()
+        result = await self.execute(self.client.table('user_tasks').select('id').eq('user_id', user_id))
         return len(result.data) if result.data else 0
     
     async def create_task(self, user_id: str, task_description: str, 
@@ -255,7 +304,7 @@ class SupabaseService:
             'status': 'pending'
         }
         
-        result = self.client.table('user_tasks').insert(task).execute()
+        result = await self.execute(self.client.table('user_tasks').insert(task))
         return result.data[0] if result.data else {}
     
     async def update_task_status(self, task_id: str, status: str) -> bool:
@@ -263,7 +312,7 @@ class SupabaseService:
         if not self.client:
             return False
         
-        result = self.client.table('user_tasks').update({'status': status}).eq('id', task_id).execute()
+        result = await self.execute(self.client.table('user_tasks').update({'status': status}).eq('id', task_id))
         return bool(result.data)
     
     async def update_task_priority(self, task_id: str, priority: str) -> bool:
@@ -271,7 +320,7 @@ class SupabaseService:
         if not self.client:
             return False
         
-        result = self.client.table('user_tasks').update({'priority': priority}).eq('id', task_id).execute()
+        result = await self.execute(self.client.table('user_tasks').update({'priority': priority}).eq('id', task_id))
         return bool(result.data)
     
     # ==========================================
@@ -293,33 +342,30 @@ class SupabaseService:
             'metadata': {'raw_text': raw_text}
         }
         
-        result = self.client.table('receipts').insert(receipt_data).execute()
-        
-        if not result.data:
-            return {}
-        
-        receipt = result.data[0]
+        item_rows = [
+            {
+                'item_name': item.get('name'),
+                'category': item.get('category'),
+                'price': item.get('price'),
+                'quantity': item.get('quantity', 1)
+            }
+            for item in (items or [])
+        ]
+        
+        # Чек и товары - одна транзакция в БД (migrations/006_save_receipt_rpc.sql)
+        result = await self.execute(self.client.rpc('save_receipt_with_items', {
+            'p_receipt': receipt_data,
+            'p_items': item_rows
+        }))
         
-        # Сохранить товары
-        if items:
-            for item in items:
-                item_data = {
-                    'receipt_id': receipt['id'],
-                    'item_name': item.get('name'),
-                    'category': item.get('category'),
-                    'price': item.get('price'),
-                    'quantity': item.get('quantity', 1)
-                }
-                self.client.table('receipt_items').insert(item_data).execute()
-        
-        return receipt
+        return result.data[0] if result.data else {}
     
     async def get_user_receipts(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Получить чеки пользователя"""
         if not self.client:
             return []
         
-        result = self.client.table('receipts').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(limit).execute()
+        result = await self.execute(self.client.table('receipts').select('*').eq('user_id', user_id).order('created_at', desc=True).limit(limit))
         return result.data or []
     
     async def get_receipt_stats(self, user_id: str) -> Dict:
@@ -327,39 +373,10 @@ class SupabaseService:
         if not self.client:
             return {}
         
-        receipts = self.client.table('receipts').select('*').eq('user_id', user_id).execute()
+        # Агрегаты считает БД за один запрос (migrations/007_receipt_stats_rpc.sql)
+        result = await self.execute(self.client.rpc('get_receipt_stats', {'p_user_id': user_id}))
         
-        if not receipts.data:
-            return {}
-        
-        total_spent = sum(r.get('total_sum', 0) or 0 for r in receipts.data)
-        
-        # Получить все товары
-        receipt_ids = [r['id'] for r in receipts.data]
-        items = []
-        for rid in receipt_ids:
-            result = self.client.table('receipt_items').select('*').eq('receipt_id', rid).execute()
-            items.extend(result.data or [])
-        
-        # По категориям
-        by_category = {}
-        for item in items:
-            cat = item.get('category', 'Прочее')
-            by_category[cat] = by_category.get(cat, 0) + (item.get('price', 0) or 0)
-        
-        # По магазинам
-        by_store = {}
-        for r in receipts.data:
-            store = r.get('store_name', 'Неизвестно')
-            by_store[store] = by_store.get(store, 0) + (r.get('total_sum', 0) or 0)
-        
-        return {
-            'total_spent': total_spent,
-            'receipts_count': len(receipts.data),
-            'items_count': len(items),
-            'by_category': by_category,
-            'by_store': by_store
-        }
+        return result.data or {}
     
     # ==========================================
     # ЗДОРОВЬЕ
@@ -378,7 +395,7 @@ class SupabaseService:
             'data': data or {}
         }
         
-        result = self.client.table('health_diary').insert(entry).execute()
+        result = await self.execute(self.client.table('health_diary').insert(entry))
         return result.data[0] if result.data else {}
     
     async def get_health_entries(self, user_id: str, days: int = 1) -> List[Dict]:
@@ -388,7 +405,7 @@ class SupabaseService:
         
         since_date = (moscow_now() - timedelta(days=days)).isoformat()
         
-        result = self.client.table('health_diary').select('*').eq('user_id', user_id).gte('created_at', since_date).order('created_at', desc=True).execute()
+        result = await self.execute(self.client.table('health_diary').select('*').eq('user_id', user_id).gte('created_at', since_date).order('created_at', desc=True))
         
         return result.data or []
 
@@ -416,7 +433,7 @@ class SupabaseService:
             'is_favorite': contact_data.get('is_favorite', False)
         }
         
-        result = self.client.table('contacts').insert(contact).execute()
+        result = await self.execute(self.client.table('contacts').insert(contact))
         return result.data[0] if result.data else {}
     
     async def get_contacts(self, user_id: str, limit: int = 50, category: str = None) -> List[Dict]:
@@ -429,7 +446,7 @@ class SupabaseService:
         if category:
             query = query.eq('category', category)
         
-        result = query.order('is_favorite', desc=True).order('display_name').limit(limit).execute()
+        result = await self.execute(query.order('is_favorite', desc=True).order('display_name').limit(limit))
         return result.data or []
     
     async def search_contacts(self, user_id: str, query: str) -> List[Dict]:
@@ -438,9 +455,9 @@ class SupabaseService:
             return []
         
         # Поиск по имени или телефону
-        result = self.client.table('contacts').select('*').eq('user_id', user_id).or_(
+        result = await self.execute(self.client.table('contacts').select('*').eq('user_id', user_id).or_(
             f"display_name.ilike.%{query}%,phone.ilike.%{query}%,notes.ilike.%{query}%"
-        ).order('display_name').execute()
+        ).order('display_name'))
         
         return result.data or []
     
@@ -449,7 +466,7 @@ class SupabaseService:
         if not self.client:
             return {}
         
-        result = self.client.table('contacts').select('*').eq('user_id', user_id).eq('id', contact_id).execute()
+        result = await self.execute(self.client.table('contacts').select('*').eq('user_id', user_id).eq('id', contact_id))
         return result.data[0] if result.data else {}
     
     async def update_contact(self, user_id: str, contact_id: str, updates: Dict) -> Dict:
@@ -457,7 +474,7 @@ class SupabaseService:
         if not self.client:
             return {}
         
-        result = self.client.table('contacts').update(updates).eq('user_id', user_id).eq('id', contact_id).execute()
+        result = await self.execute(self.client.table('contacts').update(updates).eq('user_id', user_id).eq('id', contact_id))
         return result.data[0] if result.data else {}
     
     async def delete_contact(self, user_id: str, contact_id: str) -> bool:
@@ -465,7 +482,7 @@ class SupabaseService:
         if not self.client:
             return False
         
-        result = self.client.table('contacts').delete().eq('user_id', user_id).eq('id', contact_id).execute()
+        result = await self.execute(self.client.table('contacts').delete().eq('user_id', user_id).eq('id', contact_id))
         return len(result.data) > 0 if result.data else False
     
     async def toggle_favorite_contact(self, user_id: str, contact_id: str) -> Dict:
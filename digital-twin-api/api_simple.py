@@ -1,16 +1,866 @@
-﻿from fastapi import FastAPI, Header, HTTPException, Depends, Response
+﻿from fastapi import FastAPI, Header, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Set
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from datetime import datetime
+from itertools import chain, islice
+import asyncio
+import json
+import logging
+import math
+import mmap
+import operator
 import os
+import struct
+import sys
+import time
+import uuid
 
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, Counter, Gauge, Histogram
+from starlette.routing import Match
 
 API_KEY = os.getenv("API_KEY", "super-secret-key-change-me")
 
-app = FastAPI(title="Digital Twin API", version="2.0.1")
+# Default per-key quota: sustained requests per second and burst size
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+
+
+def _parse_api_keys(spec: str) -> Dict[str, dict]:
+    """
+    API_KEYS="tenant-a:key-a:50:100,tenant-b:key-b" -> per-key tenant and quota
+
+    Each entry is name:key[:rps[:burst]]; API_KEY stays valid as tenant "default".
+    """
+    if not RATE_LIMIT_RPS > 0 or not RATE_LIMIT_BURST >= 1:
+        raise ValueError("RATE_LIMIT_RPS must be > 0 and RATE_LIMIT_BURST >= 1")
+    keys = {API_KEY: {"tenant": "default", "rate": RATE_LIMIT_RPS, "burst": RATE_LIMIT_BURST}}
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        parts = entry.split(":")
+        if len(parts) < 2:
+            raise ValueError(f"Invalid API_KEYS entry '{entry}'")
+        rate = float(parts[2]) if len(parts) > 2 else RATE_LIMIT_RPS
+        burst = float(parts[3]) if len(parts) > 3 else max(rate, RATE_LIMIT_BURST)
+        if not rate > 0 or not burst >= 1:
+            raise ValueError(f"Invalid API_KEYS entry '{entry}': rps must be > 0 and burst >= 1")
+        keys[parts[1]] = {"tenant": parts[0], "rate": rate, "burst": burst}
+    return keys
+
+
+API_KEYS = _parse_api_keys(os.getenv("API_KEYS", ""))
+
+# Telemetry memory bounds: samples kept per metric, metrics per twin, samples per ingest call
+TELEMETRY_BUFFER_SIZE = int(os.getenv("TELEMETRY_BUFFER_SIZE", "100000"))
+TELEMETRY_MAX_METRICS = int(os.getenv("TELEMETRY_MAX_METRICS", "64"))
+TELEMETRY_MAX_BATCH = int(os.getenv("TELEMETRY_MAX_BATCH", "100000"))
+
+# Metrics queries: max buckets per aggregate, cached rollup bucket sizes and
+# downsample results per series, and input size above which LTTB pre-reduces
+METRICS_MAX_BUCKETS = int(os.getenv("METRICS_MAX_BUCKETS", "10000"))
+METRICS_ROLLUP_CACHE = int(os.getenv("METRICS_ROLLUP_CACHE", "8"))
+METRICS_DOWNSAMPLE_CACHE = int(os.getenv("METRICS_DOWNSAMPLE_CACHE", "16"))
+LTTB_MAX_INPUT = int(os.getenv("LTTB_MAX_INPUT", "200000"))
+
+# Live updates: pending messages per subscriber and telemetry push interval (seconds)
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "256"))
+LIVE_FLUSH_INTERVAL = float(os.getenv("LIVE_FLUSH_INTERVAL", "0.25"))
+
+# Snapshot of twins and telemetry for warm restarts; empty path disables it.
+# Point it at a persistent volume, the container filesystem does not survive a restart.
+SNAPSHOT_PATH = os.getenv("SNAPSHOT_PATH", "")
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Restore the last snapshot on startup, keep saving it, and save once more on shutdown"""
+    snapshots = None
+    if SNAPSHOT_PATH:
+        try:
+            load_snapshot(SNAPSHOT_PATH)
+        except Exception as e:
+            logger.warning(f"Snapshot {SNAPSHOT_PATH} not loaded: {e}")
+        snapshots = asyncio.create_task(_snapshot_loop())
+    try:
+        yield
+    finally:
+        if snapshots is not None:
+            snapshots.cancel()
+            try:
+                await snapshots
+            except asyncio.CancelledError:
+                pass
+            await save_snapshot()
+
+
+app = FastAPI(title="Digital Twin API", version="2.0.1", lifespan=lifespan)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests currently being served", ["method", "route"])
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response body is sent",
+    ["method", "route", "status"]
+)
+
+
+class MetricsMiddleware:
+    """Request count, in-flight requests and latency per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = "unmatched"
+        for r in scope["app"].routes:
+            if r.matches(scope)[0] == Match.FULL:
+                route = r.path
+                break
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method=method, route=route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            HTTP_REQUESTS.labels(method=method, route=route, status=str(status)).inc()
+            HTTP_LATENCY.labels(method=method, route=route, status=str(status)).observe(time.perf_counter() - started)
+
+
+RATE_LIMIT_DECISIONS = Counter("rate_limit_decisions_total", "Rate limiter decisions", ["tenant", "decision"])
+RATE_LIMIT_TOKENS = Gauge("rate_limit_tokens", "Tokens left in the bucket after the last request", ["tenant"])
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; one token per request"""
+
+    __slots__ = ("rate", "burst", "tokens", "updated_at")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def headers(self, allowed: bool) -> List[tuple]:
+        """RateLimit-* headers (IETF draft), plus Retry-After when refused"""
+        reset = (self.burst - self.tokens) / self.rate
+        headers = [
+            (b"ratelimit-limit", str(int(self.burst)).encode()),
+            (b"ratelimit-remaining", str(int(self.tokens)).encode()),
+            (b"ratelimit-reset", str(math.ceil(reset)).encode()),
+            (b"ratelimit-policy", f"{int(self.burst)};w={math.ceil(self.burst / self.rate)}".encode()),
+        ]
+        if not allowed:
+            headers.append((b"retry-after", str(math.ceil((1 - self.tokens) / self.rate)).encode()))
+        return headers
+
+
+class RateLimitMiddleware:
+    """
+    Per-API-key token buckets for /api/v1 HTTP requests
+
+    One bucket per configured key, so checking a request is O(1). Requests
+    with an unknown or missing key share one bucket with the default quota,
+    so invalid keys cannot flood the app before reaching the 401.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.buckets = {key: TokenBucket(q["rate"], q["burst"]) for key, q in API_KEYS.items()}
+        self.tenants = {key: q["tenant"] for key, q in API_KEYS.items()}
+        self.unknown = TokenBucket(RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/v1"):
+            await self.app(scope, receive, send)
+            return
+
+        key = None
+        for name, value in scope["headers"]:
+            if name == b"x-api-key":
+                key = value.decode("latin-1")
+                break
+        bucket = self.buckets.get(key, self.unknown)
+        tenant = self.tenants.get(key, "unknown")
+
+        allowed = bucket.take()
+        RATE_LIMIT_DECISIONS.labels(tenant=tenant, decision="allowed" if allowed else "limited").inc()
+        RATE_LIMIT_TOKENS.labels(tenant=tenant).set(bucket.tokens)
+        headers = bucket.headers(allowed)
+
+        if not allowed:
+            body = b'{"detail":"Rate limit exceeded"}'
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + headers
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + headers
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+TELEMETRY_SAMPLES = Counter("telemetry_samples_total", "Telemetry samples ingested")
+LIVE_SUBSCRIBERS = Gauge("live_subscribers", "Connected live update subscribers")
+LIVE_MESSAGES = Counter("live_messages_total", "Live update messages by outcome", ["outcome"])
+
+
+# ==========================================
+# Twin registry and telemetry storage
+# ==========================================
+
+class RingBuffer:
+    """
+    Fixed-capacity (timestamp, value) series backed by two array('d')
+
+    Memory is allocated once; new samples overwrite the oldest. Samples are
+    expected in time order per metric, which keeps range reads a bisect.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+        # Total samples ever appended; lets derived caches tell what is new
+        self.appended = 0
+        self.rollups: Dict[float, "Rollup"] = {}
+        self.downsampled: Dict[tuple, tuple] = {}
+
+    def extend(self, timestamps: array, values: array):
+        n = len(timestamps)
+        self.appended += n
+        if n >= self.capacity:
+            timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+            n = self.capacity
+
+        end = (self.start + self.count) % self.capacity
+        first = min(n, self.capacity - end)
+        self.timestamps[end:end + first] = timestamps[:first]
+        self.values[end:end + first] = values[:first]
+        if first < n:
+            self.timestamps[:n - first] = timestamps[first:]
+            self.values[:n - first] = values[first:]
+
+        overflow = max(self.count + n - self.capacity, 0)
+        self.start = (self.start + overflow) % self.capacity
+        self.count = min(self.count + n, self.capacity)
+
+    def ordered(self):
+        """(timestamps, values) oldest first"""
+        end = self.start + self.count
+        if end <= self.capacity:
+            return self.timestamps[self.start:end], self.values[self.start:end]
+        wrap = end - self.capacity
+        return (
+            self.timestamps[self.start:] + self.timestamps[:wrap],
+            self.values[self.start:] + self.values[:wrap]
+        )
+
+    def window(self, since: Optional[float] = None, until: Optional[float] = None):
+        """(timestamps, values) with since <= timestamp <= until"""
+        timestamps, values = self.ordered()
+        lo = bisect_left(timestamps, since) if since is not None else 0
+        hi = bisect_right(timestamps, until) if until is not None else len(timestamps)
+        return timestamps[lo:hi], values[lo:hi]
+
+    def last(self):
+        """Newest (timestamp, value), or None when empty"""
+        if not self.count:
+            return None
+        i = (self.start + self.count - 1) % self.capacity
+        return self.timestamps[i], self.values[i]
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        last = self.last()
+        return last[0] if last else None
+
+    @property
+    def first_timestamp(self) -> Optional[float]:
+        return self.timestamps[self.start] if self.count else None
+
+    def rollup(self, bucket: float) -> "Rollup":
+        """Up-to-date rollup for this bucket size, created on first use"""
+        rollup = self.rollups.get(bucket)
+        if rollup is None:
+            if len(self.rollups) >= METRICS_ROLLUP_CACHE:
+                self.rollups.pop(next(iter(self.rollups)))
+            rollup = self.rollups[bucket] = Rollup(bucket)
+        rollup.update(self)
+        return rollup
+
+
+def _stats(values: array) -> list:
+    return [len(values), min(values), max(values), sum(values)]
+
+
+class Rollup:
+    """
+    count/min/max/sum per time bucket of one RingBuffer
+
+    Only samples appended since the previous update are folded in, so a
+    dashboard polling the same rollup does work proportional to new data.
+    Buckets whose samples were overwritten in the ring are dropped, and the
+    bucket the ring currently starts in is recomputed from what is left.
+    """
+
+    def __init__(self, bucket: float):
+        self.bucket = bucket
+        self.buckets: Dict[float, list] = {}
+        self.consumed = 0
+
+    def bucket_start(self, timestamp: float) -> float:
+        return math.floor(timestamp / self.bucket) * self.bucket
+
+    def update(self, buffer: RingBuffer):
+        new = buffer.appended - self.consumed
+        if new == 0:
+            return
+        timestamps, values = buffer.ordered()
+        if new > len(timestamps):
+            self.buckets.clear()
+            new = len(timestamps)
+        if new:
+            self._add(timestamps[-new:], values[-new:])
+        self.consumed = buffer.appended
+
+        if buffer.appended > buffer.count and timestamps:
+            first = self.bucket_start(timestamps[0])
+            for start in [start for start in self.buckets if start < first]:
+                del self.buckets[start]
+            end = bisect_left(timestamps, first + self.bucket)
+            self.buckets[first] = _stats(values[:end])
+
+    def _add(self, timestamps: array, values: array):
+        i, n = 0, len(timestamps)
+        while i < n:
+            start = self.bucket_start(timestamps[i])
+            j = max(bisect_left(timestamps, start + self.bucket, i), i + 1)
+            stats = _stats(values[i:j])
+            current = self.buckets.get(start)
+            if current is not None:
+                stats = [
+                    current[0] + stats[0],
+                    min(current[1], stats[1]),
+                    max(current[2], stats[2]),
+                    current[3] + stats[3]
+                ]
+            self.buckets[start] = stats
+            i = j
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _bucket_row(start: Optional[float], stats: list, sorted_values: Optional[List[float]], percentiles: List[float]) -> dict:
+    row = {
+        "start": start,
+        "count": stats[0],
+        "min": stats[1],
+        "max": stats[2],
+        "mean": stats[3] / stats[0]
+    }
+    for pct in percentiles:
+        row[f"p{pct:g}"] = _percentile(sorted_values, pct)
+    return row
+
+
+def _bucket_index_ok(timestamp: float, bucket: float) -> bool:
+    """Whether floor(timestamp / bucket) is finite and exact in a float"""
+    index = timestamp / bucket
+    return math.isfinite(index) and abs(index) < 2 ** 53
+
+
+def aggregate(
+    buffer: RingBuffer,
+    since: Optional[float],
+    until: Optional[float],
+    bucket: Optional[float],
+    percentiles: List[float]
+) -> List[dict]:
+    """
+    min/max/mean (and percentiles) over the window, per bucket when given
+
+    Buckets fully inside the window come from the cached Rollup; edge
+    buckets and percentile queries are computed from the raw samples. The
+    Rollup covers the whole buffer, so it is only used when the buffer's span
+    also fits in METRICS_MAX_BUCKETS.
+    """
+    timestamps, values = buffer.window(since, until)
+    if not timestamps:
+        return []
+    if bucket is None:
+        ordered = sorted(values) if percentiles else None
+        return [_bucket_row(timestamps[0], _stats(values), ordered, percentiles)]
+
+    if not (_bucket_index_ok(timestamps[0], bucket) and _bucket_index_ok(timestamps[-1], bucket)):
+        raise HTTPException(status_code=422, detail="Bucket width is too small for these timestamps")
+    if (timestamps[-1] - timestamps[0]) / bucket >= METRICS_MAX_BUCKETS:
+        raise HTTPException(status_code=422, detail=f"Query exceeds {METRICS_MAX_BUCKETS} buckets")
+
+    first, last = buffer.first_timestamp, buffer.last_timestamp
+    use_rollup = (
+        not percentiles
+        and _bucket_index_ok(first, bucket)
+        and _bucket_index_ok(last, bucket)
+        and (last - first) / bucket < METRICS_MAX_BUCKETS
+    )
+    rollup = buffer.rollup(bucket) if use_rollup else None
+    rows = []
+    i, n = 0, len(timestamps)
+    while i < n:
+        start = math.floor(timestamps[i] / bucket) * bucket
+        j = max(bisect_left(timestamps, start + bucket, i), i + 1)
+        covered = (since is None or start >= since) and (until is None or start + bucket <= until)
+        if rollup is not None and covered and start in rollup.buckets:
+            rows.append(_bucket_row(start, rollup.buckets[start], None, percentiles))
+        else:
+            chunk = values[i:j]
+            rows.append(_bucket_row(start, _stats(chunk), sorted(chunk) if percentiles else None, percentiles))
+        i = j
+    return rows
+
+
+def _minmax_reduce(timestamps: array, values: array, target: int):
+    """Keep the min and max sample of each of target/2 equal chunks (order preserved)"""
+    chunks = max(target // 2, 1)
+    size = len(values) / chunks
+    out_t, out_v = array("d"), array("d")
+    for c in range(chunks):
+        lo, hi = int(c * size), int((c + 1) * size)
+        if hi <= lo:
+            continue
+        chunk = values[lo:hi]
+        a = lo + chunk.index(min(chunk))
+        b = lo + chunk.index(max(chunk))
+        for k in sorted({a, b}):
+            out_t.append(timestamps[k])
+            out_v.append(values[k])
+    return out_t, out_v
+
+
+def lttb(timestamps: array, values: array, points: int):
+    """
+    Largest-Triangle-Three-Buckets downsampling to `points` samples
+
+    Inputs larger than LTTB_MAX_INPUT are first reduced to per-chunk
+    min/max pairs, which keeps peaks while bounding the Python-level work.
+    """
+    n = len(timestamps)
+    if points >= n or points < 3:
+        return timestamps, values
+    if n > LTTB_MAX_INPUT:
+        timestamps, values = _minmax_reduce(timestamps, values, LTTB_MAX_INPUT)
+        n = len(timestamps)
+
+    out_t, out_v = array("d", [timestamps[0]]), array("d", [values[0]])
+    every = (n - 2) / (points - 2)
+    a = 0
+    for i in range(points - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n)
+        next_t, next_v = timestamps[next_lo:next_hi], values[next_lo:next_hi]
+        cx, cy = sum(next_t) / len(next_t), sum(next_v) / len(next_v)
+        ax, ay = timestamps[a], values[a]
+
+        # Triangle area is linear in the candidate point: |dx * by - dy * bx + k|
+        dx, dy = ax - cx, ay - cy
+        k = dy * ax - dx * ay
+        bucket_t, bucket_v = timestamps[lo:hi], values[lo:hi]
+        areas = [abs(dx * by - dy * bx + k) for bx, by in zip(bucket_t, bucket_v)]
+        a = lo + areas.index(max(areas))
+        out_t.append(timestamps[a])
+        out_v.append(values[a])
+
+    out_t.append(timestamps[-1])
+    out_v.append(values[-1])
+    return out_t, out_v
+
+
+def downsample(buffer: RingBuffer, since: Optional[float], until: Optional[float], points: int):
+    """LTTB over the window, cached until the buffer receives new samples"""
+    key = (since, until, points)
+    cached = buffer.downsampled.get(key)
+    if cached is not None and cached[0] == buffer.appended:
+        return cached[1]
+    result = lttb(*buffer.window(since, until), points)
+    if len(buffer.downsampled) >= METRICS_DOWNSAMPLE_CACHE:
+        buffer.downsampled.pop(next(iter(buffer.downsampled)))
+    buffer.downsampled[key] = (buffer.appended, result)
+    return result
+
+
+# ==========================================
+# Live updates
+# ==========================================
+
+class Subscriber:
+    """
+    One live connection with a bounded, coalescing outbox
+
+    Pending messages are keyed by what they describe (a twin's state or its
+    latest telemetry), so a newer message replaces an unsent older one and a
+    slow consumer receives only the latest state. When the outbox is full the
+    oldest pending message is dropped.
+    """
+
+    def __init__(self, websocket: WebSocket, twin_ids: Optional[Set[str]]):
+        self.websocket = websocket
+        self.twin_ids = twin_ids
+        self.pending: "OrderedDict[tuple, str]" = OrderedDict()
+        self.ready = asyncio.Event()
+
+    def wants(self, twin_id: str) -> bool:
+        return self.twin_ids is None or twin_id in self.twin_ids
+
+    def offer(self, key: tuple, message: str):
+        if key in self.pending:
+            LIVE_MESSAGES.labels(outcome="coalesced").inc()
+        elif len(self.pending) >= LIVE_QUEUE_SIZE:
+            self.pending.popitem(last=False)
+            LIVE_MESSAGES.labels(outcome="dropped").inc()
+        self.pending[key] = message
+        self.ready.set()
+
+    async def run(self):
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+                while self.pending:
+                    _, message = self.pending.popitem(last=False)
+                    await self.websocket.send_text(message)
+                    LIVE_MESSAGES.labels(outcome="sent").inc()
+        except (WebSocketDisconnect, RuntimeError, OSError):
+            # Connection closed or the peer dropped mid-send; the receive loop unsubscribes
+            pass
+
+
+class LiveHub:
+    """
+    Fans twin changes out to subscribers
+
+    Each update is serialized once and the same string is offered to every
+    interested subscriber. Twin state changes go out immediately; telemetry
+    is pushed every LIVE_FLUSH_INTERVAL seconds as the latest value of each
+    metric of the twins that received samples.
+    """
+
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self._dirty: Set[str] = set()
+        self._flusher: Optional[asyncio.Task] = None
+
+    def add(self, subscriber: Subscriber):
+        self.subscribers.add(subscriber)
+        LIVE_SUBSCRIBERS.set(len(self.subscribers))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    def remove(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+        LIVE_SUBSCRIBERS.set(len(self.subscribers))
+
+    def _fan_out(self, twin_id: str, key: tuple, message: str):
+        for subscriber in self.subscribers:
+            if subscriber.wants(twin_id):
+                subscriber.offer(key, message)
+
+    def twin_changed(self, twin: "Twin", event: str = "updated"):
+        if self.subscribers:
+            message = json.dumps({"type": "twin", "event": event, "twin": twin.model_dump(mode="json")})
+            self._fan_out(twin.id, ("twin", twin.id), message)
+
+    def telemetry_received(self, twin_id: str):
+        if self.subscribers:
+            self._dirty.add(twin_id)
+
+    async def _flush_loop(self):
+        while self.subscribers:
+            await asyncio.sleep(LIVE_FLUSH_INTERVAL)
+            dirty, self._dirty = self._dirty, set()
+            for twin_id in dirty:
+                buffers = TELEMETRY.get(twin_id)
+                if buffers is None:
+                    continue
+                message = json.dumps({"type": "telemetry", "twin_id": twin_id, "metrics": telemetry_latest(buffers)})
+                self._fan_out(twin_id, ("telemetry", twin_id), message)
+
+
+def telemetry_latest(buffers: Dict[str, RingBuffer]) -> dict:
+    latest = {}
+    for name, buffer in buffers.items():
+        last = buffer.last()
+        if last is not None:
+            latest[name] = {"timestamp": last[0], "value": last[1], "samples": buffer.count}
+    return latest
+
+
+LIVE = LiveHub()
+
+
+class TwinCreate(BaseModel):
+    name: str = Field(..., min_length=1)
+    status: str = "active"
+    metadata: dict = Field(default_factory=dict)
+
+
+class TwinUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1)
+    status: Optional[str] = None
+    metadata: Optional[dict] = None
+
+
+class Twin(BaseModel):
+    id: str
+    name: str
+    status: str
+    metadata: dict = Field(default_factory=dict)
+    created_at: datetime
+    updated_at: datetime
+
+
+TWINS: Dict[str, Twin] = {}
+TELEMETRY: Dict[str, Dict[str, RingBuffer]] = {}
+
+
+def _seed_twins():
+    now = datetime.utcnow()
+    for twin_id, name, status in (("twin-001", "Factory A", "active"), ("twin-002", "Factory B", "idle")):
+        TWINS[twin_id] = Twin(id=twin_id, name=name, status=status, created_at=now, updated_at=now)
+        TELEMETRY[twin_id] = {}
+
+
+_seed_twins()
+
+
+# ==========================================
+# Snapshots
+# ==========================================
+#
+# Layout: b"TWINSNP1", u64 header length, JSON header (twins, series index,
+# byte order), padding to 8 bytes, then per series `count` float64
+# timestamps followed by `count` float64 values, oldest first.
+
+SNAPSHOT_MAGIC = b"TWINSNP1"
+_snapshot_saved = None
+
+
+def _state_marker() -> tuple:
+    """Changes whenever twins or telemetry change, to skip identical snapshots"""
+    return (
+        tuple((t.id, t.updated_at) for t in TWINS.values()),
+        sum(b.appended for buffers in TELEMETRY.values() for b in buffers.values())
+    )
+
+
+def _write_snapshot(path: str, header: dict, blocks: List[array]):
+    body = json.dumps(header).encode()
+    padding = -(len(SNAPSHOT_MAGIC) + 8 + len(body)) % 8
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(struct.pack("<Q", len(body)))
+        f.write(body)
+        f.write(b"\0" * padding)
+        for block in blocks:
+            block.tofile(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+async def save_snapshot():
+    """
+    Write twins and telemetry to SNAPSHOT_PATH
+
+    Buffers are copied on the event loop (one memcpy per series) so the
+    snapshot is consistent; encoding and disk I/O run in a worker thread.
+    """
+    global _snapshot_saved
+    marker = _state_marker()
+    if marker == _snapshot_saved:
+        return
+
+    started = time.perf_counter()
+    series, blocks, offset = [], [], 0
+    for twin_id, buffers in TELEMETRY.items():
+        for metric, buffer in buffers.items():
+            timestamps, values = buffer.ordered()
+            series.append({
+                "twin_id": twin_id,
+                "metric": metric,
+                "count": len(timestamps),
+                "appended": buffer.appended,
+                "offset": offset
+            })
+            blocks.extend((timestamps, values))
+            offset += 16 * len(timestamps)
+    header = {
+        "byteorder": sys.byteorder,
+        "saved_at": datetime.utcnow().isoformat(),
+        "twins": [twin.model_dump(mode="json") for twin in TWINS.values()],
+        "series": series
+    }
+
+    await asyncio.to_thread(_write_snapshot, SNAPSHOT_PATH, header, blocks)
+    _snapshot_saved = marker
+    logger.info(f"Snapshot saved: {len(TWINS)} twins, {len(series)} series in {time.perf_counter() - started:.3f}s")
+
+
+def load_snapshot(path: str):
+    """Replace the registry and telemetry with a snapshot, reading samples through mmap"""
+    if not os.path.exists(path):
+        return
+
+    started = time.perf_counter()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            raise ValueError("not a twin snapshot")
+        (length,) = struct.unpack_from("<Q", mm, len(SNAPSHOT_MAGIC))
+        start = len(SNAPSHOT_MAGIC) + 8
+        header = json.loads(mm[start:start + length])
+        data = start + length + (-(start + length) % 8)
+
+        twins = {t["id"]: Twin(**t) for t in header["twins"]}
+        telemetry: Dict[str, Dict[str, RingBuffer]] = {twin_id: {} for twin_id in twins}
+        for item in header["series"]:
+            if item["twin_id"] not in telemetry:
+                continue
+            n = item["count"]
+            offset = data + item["offset"]
+            timestamps, values = array("d"), array("d")
+            timestamps.frombytes(mm[offset:offset + 8 * n])
+            values.frombytes(mm[offset + 8 * n:offset + 16 * n])
+            if header["byteorder"] != sys.byteorder:
+                timestamps.byteswap()
+                values.byteswap()
+            buffer = RingBuffer(TELEMETRY_BUFFER_SIZE)
+            buffer.extend(timestamps, values)
+            buffer.appended = item["appended"]
+            telemetry[item["twin_id"]][item["metric"]] = buffer
+
+    TWINS.clear()
+    TWINS.update(twins)
+    TELEMETRY.clear()
+    TELEMETRY.update(telemetry)
+
+    global _snapshot_saved
+    _snapshot_saved = _state_marker()
+    logger.info(f"Snapshot loaded: {len(twins)} twins in {time.perf_counter() - started:.3f}s")
+
+
+async def _snapshot_loop():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            await save_snapshot()
+        except Exception as e:
+            logger.warning(f"Snapshot not saved: {e}")
+
+
+def get_twin_or_404(twin_id: str) -> Twin:
+    twin = TWINS.get(twin_id)
+    if twin is None:
+        raise HTTPException(status_code=404, detail="Twin not found")
+    return twin
+
+
+def get_buffer_or_404(twin_id: str, metric: str) -> RingBuffer:
+    get_twin_or_404(twin_id)
+    buffer = TELEMETRY[twin_id].get(metric)
+    if buffer is None:
+        raise HTTPException(status_code=404, detail="Metric not found")
+    return buffer
+
+
+def _parse_telemetry(body: bytes):
+    """
+    Decode a columnar telemetry batch into float arrays
+
+    {"timestamps": [t0, t1, ...], "metrics": {"temperature": [v0, v1, ...], ...}}
+    Timestamps are epoch seconds in non-decreasing order; every metric has
+    one value per timestamp. NaN, infinities and booleans are rejected.
+    """
+    try:
+        payload = json.loads(body)
+        # array("d") takes true/false as 1.0/0.0; only scan when they can occur
+        if (b"true" in body or b"false" in body) and any(
+            type(v) is bool
+            for column in chain([payload["timestamps"]], payload["metrics"].values())
+            for v in column
+        ):
+            raise TypeError("values must be numbers, not booleans")
+        timestamps = array("d", payload["timestamps"])
+        metrics = {
+            str(name): array("d", values)
+            for name, values in payload["metrics"].items()
+        }
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid telemetry batch: {e}")
+
+    for name, values in metrics.items():
+        if len(values) != len(timestamps):
+            raise HTTPException(
+                status_code=422,
+                detail=f"Metric '{name}' has {len(values)} values for {len(timestamps)} timestamps"
+            )
+    if len(timestamps) * max(len(metrics), 1) > TELEMETRY_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {TELEMETRY_MAX_BATCH} samples")
+
+    if not all(map(math.isfinite, timestamps)):
+        raise HTTPException(status_code=422, detail="Timestamps must be finite numbers")
+    if not all(map(operator.le, timestamps, islice(timestamps, 1, None))):
+        raise HTTPException(status_code=422, detail="Timestamps must be in non-decreasing order")
+    for name, values in metrics.items():
+        if not all(map(math.isfinite, values)):
+            raise HTTPException(status_code=422, detail=f"Metric '{name}' has non-finite values")
+    return timestamps, metrics
 
 
 async def verify_api_key(x_api_key: str = Header(None)):
-    if x_api_key != API_KEY:
+    if x_api_key not in API_KEYS:
         raise HTTPException(status_code=401, detail="Invalid or missing API key")
 
 
@@ -42,14 +892,173 @@ async def metrics():
 
 @app.get("/api/v1/twins", dependencies=[Depends(verify_api_key)])
 async def list_twins():
+    return {"twins": list(TWINS.values())}
+
+
+@app.post("/api/v1/twins", status_code=201, response_model=Twin, dependencies=[Depends(verify_api_key)])
+async def create_twin(twin: TwinCreate):
+    now = datetime.utcnow()
+    created = Twin(id=f"twin-{uuid.uuid4().hex[:12]}", created_at=now, updated_at=now, **twin.model_dump())
+    TWINS[created.id] = created
+    TELEMETRY[created.id] = {}
+    LIVE.twin_changed(created, "created")
+    return created
+
+
+@app.get("/api/v1/twins/{twin_id}", response_model=Twin, dependencies=[Depends(verify_api_key)])
+async def get_twin(twin_id: str):
+    return get_twin_or_404(twin_id)
+
+
+@app.patch("/api/v1/twins/{twin_id}", response_model=Twin, dependencies=[Depends(verify_api_key)])
+async def update_twin(twin_id: str, update: TwinUpdate):
+    twin = get_twin_or_404(twin_id)
+    changes = update.model_dump(exclude_none=True)
+    updated = twin.model_copy(update=dict(changes, updated_at=datetime.utcnow()))
+    TWINS[twin_id] = updated
+    LIVE.twin_changed(updated)
+    return updated
+
+
+@app.delete("/api/v1/twins/{twin_id}", status_code=204, dependencies=[Depends(verify_api_key)])
+async def delete_twin(twin_id: str):
+    twin = get_twin_or_404(twin_id)
+    del TWINS[twin_id]
+    TELEMETRY.pop(twin_id, None)
+    LIVE.twin_changed(twin, "deleted")
+
+
+@app.post("/api/v1/twins/{twin_id}/telemetry", status_code=202, dependencies=[Depends(verify_api_key)])
+async def ingest_telemetry(twin_id: str, request: Request):
+    """
+    Ingest a columnar batch of samples
+
+    The body is decoded straight into float arrays (no per-sample models) and
+    appended to per-metric ring buffers of TELEMETRY_BUFFER_SIZE samples.
+    """
+    get_twin_or_404(twin_id)
+    timestamps, metrics = _parse_telemetry(await request.body())
+
+    buffers = TELEMETRY[twin_id]
+    new_metrics = [name for name in metrics if name not in buffers]
+    if len(buffers) + len(new_metrics) > TELEMETRY_MAX_METRICS:
+        raise HTTPException(status_code=422, detail=f"Twin exceeds {TELEMETRY_MAX_METRICS} metrics")
+
+    # Reads bisect on time, so a batch may not start before what is stored
+    if timestamps:
+        for name in metrics:
+            buffer = buffers.get(name)
+            if buffer is not None and buffer.count and timestamps[0] < buffer.last_timestamp:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Metric '{name}' already has samples up to {buffer.last_timestamp}"
+                )
+
+    for name, values in metrics.items():
+        buffer = buffers.get(name)
+        if buffer is None:
+            buffer = buffers[name] = RingBuffer(TELEMETRY_BUFFER_SIZE)
+        buffer.extend(timestamps, values)
+
+    accepted = len(timestamps) * len(metrics)
+    TELEMETRY_SAMPLES.inc(accepted)
+    LIVE.telemetry_received(twin_id)
+    return {"accepted": accepted, "metrics": len(metrics)}
+
+
+@app.get("/api/v1/twins/{twin_id}/telemetry", dependencies=[Depends(verify_api_key)])
+async def list_telemetry_metrics(twin_id: str):
+    get_twin_or_404(twin_id)
     return {
-        "twins": [
-            {"id": "twin-001", "name": "Factory A", "status": "active"},
-            {"id": "twin-002", "name": "Factory B", "status": "idle"}
-        ]
+        "metrics": {
+            name: {"samples": buffer.count, "last_timestamp": buffer.last_timestamp}
+            for name, buffer in TELEMETRY[twin_id].items()
+        }
     }
 
 
+@app.get("/api/v1/twins/{twin_id}/telemetry/{metric}", dependencies=[Depends(verify_api_key)])
+async def read_telemetry(twin_id: str, metric: str, since: Optional[float] = None, until: Optional[float] = None):
+    buffer = get_buffer_or_404(twin_id, metric)
+    timestamps, values = buffer.window(since, until)
+    return {"metric": metric, "timestamps": timestamps.tolist(), "values": values.tolist()}
+
+
+@app.get("/api/v1/twins/{twin_id}/metrics/{metric}/aggregate", dependencies=[Depends(verify_api_key)])
+async def aggregate_metric(
+    twin_id: str,
+    metric: str,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    bucket: Optional[float] = Query(None, gt=0, description="Bucket width in seconds; whole window if omitted"),
+    percentiles: Optional[str] = Query(None, description="Comma-separated, e.g. 50,95,99")
+):
+    """min/max/mean and optional percentiles over a time window"""
+    buffer = get_buffer_or_404(twin_id, metric)
+    try:
+        pcts = [float(p) for p in percentiles.split(",")] if percentiles else []
+    except ValueError:
+        raise HTTPException(status_code=422, detail="percentiles must be numbers")
+    if any(not 0 < p <= 100 for p in pcts):
+        raise HTTPException(status_code=422, detail="percentiles must be in (0, 100]")
+    return {
+        "metric": metric,
+        "bucket": bucket,
+        "buckets": aggregate(buffer, since, until, bucket, pcts)
+    }
+
+
+@app.get("/api/v1/twins/{twin_id}/metrics/{metric}/downsample", dependencies=[Depends(verify_api_key)])
+async def downsample_metric(
+    twin_id: str,
+    metric: str,
+    points: int = Query(500, ge=3, le=10000),
+    since: Optional[float] = None,
+    until: Optional[float] = None
+):
+    """Series reduced to at most `points` samples with LTTB, for charts"""
+    buffer = get_buffer_or_404(twin_id, metric)
+    timestamps, values = downsample(buffer, since, until, points)
+    return {"metric": metric, "timestamps": timestamps.tolist(), "values": values.tolist()}
+
+
+@app.websocket("/api/v1/twins/live")
+async def twins_live(websocket: WebSocket, twin_id: Optional[List[str]] = Query(None), api_key: Optional[str] = None):
+    """
+    Push twin state and telemetry changes instead of polling
+
+    Authenticate with an X-API-Key header or the api_key query parameter
+    (browsers cannot set WebSocket headers). Repeat twin_id to subscribe to
+    specific twins; all twins otherwise. The first message is a snapshot of
+    the subscribed twins.
+    """
+    if (websocket.headers.get("x-api-key") or api_key) not in API_KEYS:
+        await websocket.close(code=1008, reason="Invalid or missing API key")
+        return
+    await websocket.accept()
+
+    subscriber = Subscriber(websocket, set(twin_id) if twin_id else None)
+    await websocket.send_text(json.dumps({
+        "type": "snapshot",
+        "twins": [twin.model_dump(mode="json") for twin in TWINS.values() if subscriber.wants(twin.id)]
+    }))
+    LIVE.add(subscriber)
+    sender = asyncio.create_task(subscriber.run())
+    try:
+        # Client messages are ignored; receiving detects the disconnect
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        LIVE.remove(subscriber)
+        sender.cancel()
+        try:
+            await sender
+        except asyncio.CancelledError:
+            pass
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("api_simple:app", host="0.0.0.0", port=8000, reload=False)
@@ -0,0 +1,93 @@
+from fastapi import HTTPException, Request
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+import asyncio
+import time
+
+
+class AsyncTTLCache:
+    """
+    In-process async cache with per-call TTLs and request coalescing
+
+    Concurrent misses for the same key share one loader call (single-flight).
+    invalidate() drops all entries; loads that were already running when it
+    was called do not write their (possibly stale) result back. At most
+    max_entries are kept; the least recently used entry is evicted first.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+        self._entries: Dict[Hashable, Tuple[float, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+
+    async def get_or_load(self, key: Hashable, ttl: float, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value for key, calling loader at most once per miss"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            # Move to the end so eviction drops the least recently used entry
+            self._entries[key] = self._entries.pop(key)
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, ttl, loader, self._generation))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+
+        # Shield so a cancelled caller does not cancel the load for the others
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, ttl: float, loader: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        try:
+            value = await loader()
+            if generation == self._generation and ttl > 0:
+                self._entries.pop(key, None)
+                self._entries[key] = (time.monotonic() + ttl, value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self):
+        """Drop every cached entry"""
+        self._generation += 1
+        self._entries.clear()
+        self._inflight.clear()
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0
+        }
+
+
+def _consume_exception(task: asyncio.Task):
+    # Avoid "exception was never retrieved" when every waiter was cancelled
+    if not task.cancelled():
+        task.exception()
+
+
+def get_events_cache(request: Request) -> AsyncTTLCache:
+    """Dependency to get the events dashboard cache created in the app lifespan"""
+    cache = getattr(request.app.state, "events_cache", None)
+    if cache is None:
+        raise HTTPException(status_code=500, detail="Events cache is not initialized")
+    return cache
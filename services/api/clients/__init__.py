@@ -0,0 +1 @@
+"""Shared upstream clients (Microsoft Graph, Supabase)"""
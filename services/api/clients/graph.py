@@ -0,0 +1,486 @@
+from fastapi import HTTPException, Request
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import httpx
+import os
+
+from api.clients.graph_throttle import (
+    GRAPH_RETRIES,
+    GRAPH_THROTTLED,
+    RETRY_STATUSES,
+    THROTTLE_STATUSES,
+    LimiterRegistry,
+    RetryPolicy,
+    mailbox_key,
+    retry_after_seconds
+)
+from api.clients.graph_token import GraphTokenProvider, TOKEN_URL
+from api.metrics import track_upstream
+from api.models.contacts import (
+    ContactResponse,
+    EmailAddress,
+    PhoneNumber
+)
+
+# Microsoft Graph API endpoints
+GRAPH_API_BASE = os.environ.get("GRAPH_API_BASE", "https://graph.microsoft.com/v1.0")
+
+# Max requests per JSON $batch call (Graph limit)
+GRAPH_BATCH_LIMIT = 20
+
+# Contact fields requested from Graph
+CONTACT_SELECT = "id,givenName,surname,displayName,emailAddresses,mobilePhone,businessPhones,homePhones,companyName,jobTitle,createdDateTime,lastModifiedDateTime"
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes")
+
+
+def _is_me_path(path: str) -> bool:
+    return path == "/me" or path.startswith(("/me/", "/me?"))
+
+
+class MSGraphClient:
+    """
+    Microsoft Graph API client
+
+    Owns a single keep-alive (HTTP/2 when available) connection pool that is
+    opened with start() and closed with aclose() from the app lifespan.
+    Pool limits and timeouts are read from GRAPH_* environment variables.
+
+    Authorization uses MS_ACCESS_TOKEN when set (delegated), otherwise an
+    app-only token from MS_CLIENT_ID/MS_CLIENT_SECRET/MS_TENANT_ID managed by
+    GraphTokenProvider. App-only tokens cannot use /me, so /me paths are
+    rewritten to /users/{MS_USER_ID}.
+
+    Every request goes through a per tenant/mailbox AIMD concurrency limiter
+    and is retried on throttling: Retry-After is honoured when present,
+    otherwise jittered exponential backoff is used. 503/504 and transport
+    errors are only retried for idempotent methods.
+    """
+
+    def __init__(self):
+        self.client_id = os.environ.get("MS_CLIENT_ID")
+        self.client_secret = os.environ.get("MS_CLIENT_SECRET")
+        self.tenant_id = os.environ.get("MS_TENANT_ID")
+        self.access_token = os.environ.get("MS_ACCESS_TOKEN")  # User token (delegated)
+        self.user_id = os.environ.get("MS_USER_ID")  # Mailbox for app-only tokens
+
+        # Connection pool settings
+        self.http2 = _env_bool("GRAPH_HTTP2", True)
+        self.max_connections = int(os.environ.get("GRAPH_MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.environ.get("GRAPH_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(os.environ.get("GRAPH_KEEPALIVE_EXPIRY", "30"))
+        self.timeout = float(os.environ.get("GRAPH_TIMEOUT", "30"))
+        self.connect_timeout = float(os.environ.get("GRAPH_CONNECT_TIMEOUT", "5"))
+        self.batch_concurrency = int(os.environ.get("GRAPH_BATCH_CONCURRENCY", "4"))
+        self.retry_policy = RetryPolicy()
+        self.limiters = LimiterRegistry()
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self.token_provider: Optional[GraphTokenProvider] = None
+        if not self.access_token and all([self.client_id, self.client_secret, self.tenant_id]):
+            self.token_provider = GraphTokenProvider(self.client_id, self.client_secret, self.tenant_id)
+
+    async def start(self):
+        """Open the shared HTTP connection pool"""
+        if self._http is not None:
+            return
+
+        options = dict(
+            base_url=GRAPH_API_BASE,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
+        )
+        try:
+            self._http = httpx.AsyncClient(http2=self.http2, **options)
+        except ImportError:
+            # 'h2' package is not installed - fall back to HTTP/1.1 keep-alive
+            self._http = httpx.AsyncClient(**options)
+
+        if self.token_provider is not None:
+            await self.token_provider.start(self._http)
+
+    async def aclose(self):
+        """Close the shared HTTP connection pool"""
+        if self.token_provider is not None:
+            await self.token_provider.stop()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """Shared HTTP client bound to GRAPH_API_BASE"""
+        if self._http is None:
+            raise HTTPException(status_code=500, detail="Microsoft Graph client is not started")
+        return self._http
+
+    def _check_config(self, path: Optional[str] = None):
+        """Check if MS Graph is configured (for path, when given)"""
+        if not self.access_token:
+            if not all([self.client_id, self.client_secret, self.tenant_id]):
+                raise HTTPException(
+                    status_code=500,
+                    detail="Microsoft Graph API not configured. Set MS_ACCESS_TOKEN or MS_CLIENT_ID/MS_CLIENT_SECRET/MS_TENANT_ID"
+                )
+            if path is not None and _is_me_path(path) and not self.user_id:
+                raise HTTPException(
+                    status_code=500,
+                    detail="Microsoft Graph app-only credentials cannot use /me. Set MS_USER_ID to the mailbox to use"
+                )
+
+    async def get_headers(self) -> dict:
+        """Get authorization headers"""
+        self._check_config()
+        if self.access_token:
+            token = self.access_token
+        else:
+            token = await self.token_provider.get_token()
+        return {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json"
+        }
+
+    def _resolve_path(self, path: str) -> str:
+        """Map /me paths to the configured mailbox when using app-only tokens"""
+        if self.token_provider is not None and _is_me_path(path):
+            self._check_config(path)
+            return f"/users/{self.user_id}{path[3:]}"
+        return path
+
+    async def request(self, method: str, path: str, headers: Optional[dict] = None, **kwargs) -> httpx.Response:
+        """Send an authorized, throttling-aware request to Graph over the shared pool"""
+        method = method.upper()
+        path = self._resolve_path(path)
+        key = mailbox_key(self.tenant_id, path)
+        limiter = self.limiters.get(key)
+
+        attempt = 0
+        while True:
+            await limiter.acquire()
+            try:
+                response = await self._send(method, path, headers, **kwargs)
+            except httpx.TransportError:
+                await limiter.release()
+                delay = self.retry_policy.delay_for(method, None, attempt)
+                if delay is None:
+                    raise
+                GRAPH_RETRIES.labels(mailbox=key, reason="transport").inc()
+            except BaseException:
+                # Config/token errors and cancellation must not keep the slot
+                await limiter.release(throttled=False)
+                raise
+            else:
+                throttled = response.status_code in THROTTLE_STATUSES
+                retry_after = retry_after_seconds(response.headers) if throttled else None
+                await limiter.release(throttled, retry_after)
+                if throttled:
+                    GRAPH_THROTTLED.labels(mailbox=key, status=str(response.status_code)).inc()
+
+                delay = self.retry_policy.delay_for(method, response, attempt)
+                if delay is None:
+                    return response
+                GRAPH_RETRIES.labels(mailbox=key, reason=str(response.status_code)).inc()
+
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _send(self, method: str, path: str, headers: Optional[dict], **kwargs) -> httpx.Response:
+        request_headers = await self.get_headers()
+        if headers:
+            request_headers.update(headers)
+        operation = graph_operation(method, path)
+        response = await self._timed(operation, method, path, headers=request_headers, **kwargs)
+
+        if response.status_code == 401 and self.token_provider is not None:
+            # Token revoked or expired early - fetch a new one and retry once
+            self.token_provider.invalidate(request_headers["Authorization"].removeprefix("Bearer "))
+            request_headers.update(await self.get_headers())
+            response = await self._timed(operation, method, path, headers=request_headers, **kwargs)
+
+        return response
+
+    async def _timed(self, operation: str, method: str, path: str, **kwargs) -> httpx.Response:
+        with track_upstream("graph", operation) as call:
+            response = await self.http.request(method, path, **kwargs)
+            call.outcome = str(response.status_code)
+        return response
+
+    async def iter_pages(
+        self,
+        path: str,
+        params: Optional[dict] = None,
+        headers: Optional[dict] = None
+    ) -> AsyncIterator[dict]:
+        """
+        Follow @odata.nextLink through a Graph collection
+
+        The next page is requested as soon as the current one arrives, so it
+        downloads while the caller is still processing the current page.
+
+        Yields:
+            Page bodies ({"value": [...], "@odata.nextLink": ...})
+        """
+        async def fetch(url: str, url_params: Optional[dict]) -> dict:
+            response = await self.request("GET", url, headers=headers, params=url_params)
+            if response.status_code != 200:
+                raise graph_error(response)
+            return response.json()
+
+        task = asyncio.create_task(fetch(path, params))
+        try:
+            while task is not None:
+                data = await task
+                next_link = data.get("@odata.nextLink")
+                # nextLink already carries the query, including the skip token
+                task = asyncio.create_task(fetch(next_link, None)) if next_link else None
+                yield data
+        finally:
+            if task is not None and not task.done():
+                task.cancel()
+
+    async def batch(self, requests: List[dict]) -> Dict[str, dict]:
+        """
+        Send requests through Graph JSON batching
+
+        Requests are packed into $batch calls of up to GRAPH_BATCH_LIMIT,
+        keeping every dependsOn chain inside one call, and up to
+        GRAPH_BATCH_CONCURRENCY calls run at once. Items throttled inside a
+        batch (429), and items that failed only because such an item was
+        their dependency, are sent again after the longest Retry-After.
+
+        Args:
+            requests: $batch request items ({"id", "method", "url", ...})
+
+        Returns:
+            Response items ({"id", "status", "body", ...}) keyed by request id
+        """
+        semaphore = asyncio.Semaphore(self.batch_concurrency)
+        responses: Dict[str, dict] = {}
+
+        async def send(batch: List[dict]):
+            async with semaphore:
+                try:
+                    response = await self.request("POST", "/$batch", json={"requests": batch})
+                except httpx.HTTPError as e:
+                    status, error = 502, f"Graph API error: {e}"
+                else:
+                    if response.status_code == 200:
+                        for item in response.json().get("responses", []):
+                            responses[item["id"]] = item
+                        return
+                    status, error = response.status_code, f"Graph API error: {response.text}"
+                for item in batch:
+                    responses[item["id"]] = {"id": item["id"], "status": status, "body": {"error": {"message": error}}}
+
+        requests = [dict(item, url=self._resolve_path(item["url"])) for item in requests]
+        pending = requests
+        for attempt in range(self.retry_policy.max_retries + 1):
+            await asyncio.gather(*(send(batch) for batch in pack_batches(pending)))
+            if attempt == self.retry_policy.max_retries:
+                break
+            pending, delay = await self._throttled_batch_items(pending, responses, attempt)
+            if not pending or delay is None:
+                break
+            await asyncio.sleep(delay)
+
+        for item in requests:
+            responses.setdefault(item["id"], {
+                "id": item["id"],
+                "status": 502,
+                "body": {"error": {"message": "No response in Graph batch"}}
+            })
+        return responses
+
+    async def _throttled_batch_items(self, sent: List[dict], responses: Dict[str, dict], attempt: int):
+        """Pick the batch items to send again and how long to wait first"""
+        throttled = {item["id"] for item in sent if responses.get(item["id"], {}).get("status") == 429}
+        if not throttled:
+            return [], None
+
+        # Dependents that failed because a prerequisite was throttled go again too
+        retry_ids = set(throttled)
+        changed = True
+        while changed:
+            changed = False
+            for item in sent:
+                if item["id"] not in retry_ids and responses.get(item["id"], {}).get("status") == 424 \
+                        and retry_ids.intersection(item.get("dependsOn", [])):
+                    retry_ids.add(item["id"])
+                    changed = True
+
+        delays = []
+        for item_id in throttled:
+            retry_after = retry_after_seconds(responses[item_id].get("headers") or {})
+            delays.append(retry_after if retry_after is not None else self.retry_policy.backoff(attempt))
+        delay = max(delays)
+        if delay > self.retry_policy.retry_after_max:
+            return [], None
+
+        for item in sent:
+            if item["id"] in throttled:
+                key = mailbox_key(self.tenant_id, item["url"])
+                GRAPH_THROTTLED.labels(mailbox=key, status="429").inc()
+                GRAPH_RETRIES.labels(mailbox=key, reason="batch_429").inc()
+                await self.limiters.get(key).throttled(delay)
+
+        retry = []
+        for item in sent:
+            if item["id"] in retry_ids:
+                item = dict(item)
+                if "dependsOn" in item:
+                    # Completed prerequisites are not part of the new batch
+                    item["dependsOn"] = [d for d in item["dependsOn"] if d in retry_ids]
+                    if not item["dependsOn"]:
+                        del item["dependsOn"]
+                retry.append(item)
+        return retry, delay
+
+    def _contact_dict(self, data: dict) -> dict:
+        """
+        Shape a Graph contact like ContactResponse without model validation
+
+        Used by the FAST_SERIALIZATION path; Graph data is trusted as-is
+        (emails are not re-validated, timestamps are passed through).
+        """
+        phone_numbers = []
+        for phone_type in ("mobilePhone", "businessPhones", "homePhones"):
+            phones = data.get(phone_type)
+            if isinstance(phones, str):
+                phone_numbers.append({"number": phones, "type": "mobile"})
+            elif phones:
+                kind = phone_type.replace("Phones", "")
+                phone_numbers.extend({"number": p, "type": kind} for p in phones)
+
+        return {
+            "id": data.get("id", ""),
+            "given_name": data.get("givenName"),
+            "surname": data.get("surname"),
+            "display_name": data.get("displayName"),
+            "email_addresses": [
+                {"address": e.get("address", ""), "name": e.get("name")}
+                for e in data.get("emailAddresses") or []
+            ],
+            "phone_numbers": phone_numbers,
+            "company_name": data.get("companyName"),
+            "job_title": data.get("jobTitle"),
+            "created_at": data.get("createdDateTime"),
+            "updated_at": data.get("lastModifiedDateTime")
+        }
+
+    def _parse_contact(self, data: dict) -> ContactResponse:
+        """Parse Graph API contact to ContactResponse"""
+        email_addresses = []
+        for email in data.get("emailAddresses", []):
+            email_addresses.append(EmailAddress(
+                address=email.get("address", ""),
+                name=email.get("name")
+            ))
+
+        phone_numbers = []
+        for phone_type in ["mobilePhone", "businessPhones", "homePhones"]:
+            phones = data.get(phone_type)
+            if phones:
+                if isinstance(phones, str):
+                    phone_numbers.append(PhoneNumber(number=phones, type="mobile"))
+                elif isinstance(phones, list):
+                    for p in phones:
+                        phone_numbers.append(PhoneNumber(number=p, type=phone_type.replace("Phones", "")))
+
+        return ContactResponse(
+            id=data.get("id", ""),
+            given_name=data.get("givenName"),
+            surname=data.get("surname"),
+            display_name=data.get("displayName"),
+            email_addresses=email_addresses,
+            phone_numbers=phone_numbers,
+            company_name=data.get("companyName"),
+            job_title=data.get("jobTitle"),
+            created_at=data.get("createdDateTime"),
+            updated_at=data.get("lastModifiedDateTime")
+        )
+
+
+def pack_batches(requests: List[dict], limit: int = GRAPH_BATCH_LIMIT) -> List[List[dict]]:
+    """
+    Group $batch request items into calls of at most `limit`
+
+    Items linked through dependsOn must share a call, so they are grouped
+    first and the groups are then packed first-fit in request order.
+
+    Raises:
+        ValueError: A dependency group is larger than `limit`
+    """
+    parent = {item["id"]: item["id"] for item in requests}
+
+    def find(item_id: str) -> str:
+        while parent[item_id] != item_id:
+            parent[item_id] = parent[parent[item_id]]
+            item_id = parent[item_id]
+        return item_id
+
+    for item in requests:
+        for dep in item.get("dependsOn", []):
+            parent[find(item["id"])] = find(dep)
+
+    groups: Dict[str, List[dict]] = {}
+    for item in requests:
+        groups.setdefault(find(item["id"]), []).append(item)
+
+    batches: List[List[dict]] = []
+    for group in groups.values():
+        if len(group) > limit:
+            raise ValueError(f"Dependency chain of {len(group)} operations exceeds the batch limit of {limit}")
+        for batch in batches:
+            if len(batch) + len(group) <= limit:
+                batch.extend(group)
+                break
+        else:
+            batches.append(list(group))
+    return batches
+
+
+def graph_operation(method: str, path: str) -> str:
+    """
+    Metrics label for a Graph call: method plus the path with ids replaced
+
+    "/users/abc/contacts/AAMk..." becomes "GET /users/{id}/contacts/{id}".
+    """
+    segments = []
+    previous = None
+    for segment in httpx.URL(path).path.split("/"):
+        if not segment or segment in ("v1.0", "beta"):
+            continue
+        if previous in ("users", "contacts", "contactFolders", "events", "messages") and not segment.startswith("$"):
+            segment = "{id}" if segment != "delta" else segment
+        segments.append(segment)
+        previous = segment
+    return f"{method} /{'/'.join(segments)}"
+
+
+def graph_error(response: httpx.Response) -> HTTPException:
+    """HTTPException for a failed Graph response, passing Retry-After on to the caller"""
+    headers = None
+    if response.status_code in RETRY_STATUSES and "Retry-After" in response.headers:
+        headers = {"Retry-After": response.headers["Retry-After"]}
+    return HTTPException(
+        status_code=response.status_code,
+        detail=f"Graph API error: {response.text}",
+        headers=headers
+    )
+
+
+def get_graph_client(request: Request) -> MSGraphClient:
+    """Dependency to get the shared MS Graph client created in the app lifespan"""
+    client = getattr(request.app.state, "graph_client", None)
+    if client is None:
+        raise HTTPException(status_code=500, detail="Microsoft Graph client is not initialized")
+    return client
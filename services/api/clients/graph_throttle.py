@@ -0,0 +1,176 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import asyncio
+import os
+import random
+import re
+import time
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+# Graph throttling metrics
+GRAPH_THROTTLED = Counter(
+    "graph_throttled_total",
+    "Graph responses signalling throttling (429/503)",
+    ["mailbox", "status"]
+)
+GRAPH_RETRIES = Counter(
+    "graph_retries_total",
+    "Graph request retries",
+    ["mailbox", "reason"]
+)
+GRAPH_CONCURRENCY_LIMIT = Gauge(
+    "graph_concurrency_limit",
+    "Adaptive concurrency limit for Graph requests",
+    ["mailbox"]
+)
+
+# Statuses that are retried; 429 means the request was not executed
+THROTTLE_STATUSES = {429, 503}
+RETRY_STATUSES = {429, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_USERS_PATH = re.compile(r"/users/([^/?]+)")
+
+
+def mailbox_key(tenant_id: Optional[str], path: str) -> str:
+    """Throttling scope of a request: tenant plus target mailbox"""
+    match = _USERS_PATH.search(path)
+    return f"{tenant_id or 'default'}/{match.group(1) if match else 'me'}"
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date)"""
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit for one mailbox
+
+    The limit grows by about one slot per limit-worth of successful requests
+    (additive increase) and is multiplied by GRAPH_CONCURRENCY_DECREASE when
+    Graph throttles (multiplicative decrease). A Retry-After from Graph also
+    pauses new requests for the whole mailbox until it has passed.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.minimum = float(os.environ.get("GRAPH_CONCURRENCY_MIN", "1"))
+        self.maximum = float(os.environ.get("GRAPH_CONCURRENCY_MAX", "32"))
+        self.decrease = float(os.environ.get("GRAPH_CONCURRENCY_DECREASE", "0.5"))
+        self.limit = float(os.environ.get("GRAPH_CONCURRENCY_INITIAL", "8"))
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self._cond = asyncio.Condition()
+        GRAPH_CONCURRENCY_LIMIT.labels(mailbox=key).set(self.limit)
+
+    async def acquire(self):
+        while True:
+            pause = self.paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            async with self._cond:
+                await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+                if self.paused_until <= time.monotonic():
+                    self.in_flight += 1
+                    return
+
+    async def release(self, throttled: bool = False, retry_after: Optional[float] = None):
+        # Give the slot back before waiting for the lock, so a cancellation
+        # while waiting cannot leak it
+        self.in_flight -= 1
+        async with self._cond:
+            self._adjust(throttled, retry_after)
+            self._cond.notify_all()
+
+    async def throttled(self, retry_after: Optional[float] = None):
+        """Record throttling reported outside of a held slot (e.g. inside a $batch)"""
+        async with self._cond:
+            self._adjust(True, retry_after)
+            self._cond.notify_all()
+
+    def _adjust(self, throttled: bool, retry_after: Optional[float]):
+        if throttled:
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            if retry_after:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        GRAPH_CONCURRENCY_LIMIT.labels(mailbox=self.key).set(self.limit)
+
+    def status(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "paused_for": round(max(self.paused_until - time.monotonic(), 0.0), 2)
+        }
+
+
+class RetryPolicy:
+    """Retry-After aware, jittered exponential backoff for Graph calls"""
+
+    def __init__(self):
+        self.max_retries = int(os.environ.get("GRAPH_MAX_RETRIES", "4"))
+        self.backoff_base = float(os.environ.get("GRAPH_BACKOFF_BASE", "0.5"))
+        self.backoff_max = float(os.environ.get("GRAPH_BACKOFF_MAX", "30"))
+        self.retry_after_max = float(os.environ.get("GRAPH_RETRY_AFTER_MAX", "60"))
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def delay_for(self, method: str, response: Optional[httpx.Response], attempt: int) -> Optional[float]:
+        """
+        Seconds to wait before retrying, or None to give up
+
+        Args:
+            response: None when the request failed with a transport error
+        """
+        if attempt >= self.max_retries:
+            return None
+
+        if response is None:
+            return self.backoff(attempt) if method in IDEMPOTENT_METHODS else None
+
+        if response.status_code not in RETRY_STATUSES:
+            return None
+        # Non-idempotent calls are only repeated when Graph rejected them unexecuted
+        if response.status_code != 429 and method not in IDEMPOTENT_METHODS:
+            return None
+
+        retry_after = retry_after_seconds(response.headers)
+        if retry_after is None:
+            return self.backoff(attempt)
+        if retry_after > self.retry_after_max:
+            return None
+        return retry_after
+
+
+class LimiterRegistry:
+    """AIMD limiters keyed by tenant/mailbox"""
+
+    def __init__(self):
+        self._limiters: Dict[str, AIMDLimiter] = {}
+
+    def get(self, key: str) -> AIMDLimiter:
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = self._limiters[key] = AIMDLimiter(key)
+        return limiter
+
+    def status(self) -> dict:
+        return {key: limiter.status() for key, limiter in self._limiters.items()}
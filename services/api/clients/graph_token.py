@@ -0,0 +1,138 @@
+from fastapi import HTTPException
+from typing import Optional
+import asyncio
+import httpx
+import logging
+import os
+import time
+
+from api.metrics import track_upstream
+from api.models.contacts import MSGraphTokenResponse
+
+logger = logging.getLogger(__name__)
+
+TOKEN_URL = "https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+
+
+class GraphTokenProvider:
+    """
+    Client-credentials (app-only) tokens for Microsoft Graph
+
+    The token is cached in-process. A background task renews it
+    GRAPH_TOKEN_REFRESH_MARGIN seconds before expiry, and callers that find
+    it inside that margin trigger a renewal without waiting for it. All
+    concurrent callers share a single in-flight token request.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, tenant_id: str):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.token_url = TOKEN_URL.format(tenant_id=tenant_id)
+        self.refresh_margin = float(os.environ.get("GRAPH_TOKEN_REFRESH_MARGIN", "300"))
+        self.retry_delay = float(os.environ.get("GRAPH_TOKEN_RETRY_DELAY", "15"))
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self._token: Optional[MSGraphTokenResponse] = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def start(self, http: httpx.AsyncClient):
+        """Fetch the first token and keep renewing it in the background"""
+        self._http = http
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.warning(f"Initial Graph token request failed: {e}")
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        for task in (self._loop_task, self._refresh_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._loop_task = None
+        self._refresh_task = None
+
+    async def get_token(self) -> str:
+        """Return a valid access token, waiting only when none is usable"""
+        now = time.monotonic()
+        if self._token is not None and now < self._expires_at:
+            if now >= self._refresh_at:
+                self._refresh_in_background()
+            return self._token.access_token
+
+        await self.refresh()
+        return self._token.access_token
+
+    def invalidate(self, access_token: Optional[str] = None):
+        """Forget the cached token (e.g. after Graph rejected it with 401)"""
+        if access_token is not None and self._token is not None and self._token.access_token != access_token:
+            # Already replaced by a newer token
+            return
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+
+    async def refresh(self):
+        """Request a new token, joining a request that is already in flight"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+        await asyncio.shield(self._refresh_task)
+
+    def _refresh_in_background(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._fetch())
+            self._refresh_task.add_done_callback(_log_failure)
+
+    async def _fetch(self):
+        if self._http is None:
+            raise HTTPException(status_code=500, detail="Microsoft Graph client is not started")
+
+        started = time.monotonic()
+        try:
+            with track_upstream("graph", "POST /token") as call:
+                response = await self._http.post(self.token_url, data={
+                    "grant_type": "client_credentials",
+                    "client_id": self.client_id,
+                    "client_secret": self.client_secret,
+                    "scope": GRAPH_SCOPE
+                })
+                call.outcome = str(response.status_code)
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Graph token request failed: {e}")
+
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Graph token request failed: {response.text}"
+            )
+
+        self._token = MSGraphTokenResponse(**response.json())
+        # Expiry counts from when the request was sent; renew ahead of it,
+        # but never earlier than half way through the token lifetime
+        lifetime = self._token.expires_in
+        self._expires_at = started + lifetime
+        self._refresh_at = self._expires_at - min(self.refresh_margin, lifetime / 2)
+
+    async def _run(self):
+        while True:
+            delay = self._refresh_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Graph token refresh failed: {e}")
+                await asyncio.sleep(self.retry_delay)
+
+
+def _log_failure(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Graph token refresh failed: {task.exception()}")
@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Request
+from typing import Any, Callable, Optional
+import asyncio
+import httpx
+import os
+import threading
+import time
+
+from supabase import create_client, Client, ClientOptions
+
+from api.metrics import track_upstream
+
+
+class SupabaseProvider:
+    """
+    Process-wide Supabase client
+
+    One client (and its PostgREST connection pool) is reused by every request.
+    Once per SUPABASE_HEALTH_CHECK_INTERVAL seconds the client is probed with
+    a cheap query and rebuilt if the probe fails.
+
+    supabase-py is synchronous, so async callers go through execute(), which
+    runs the query on a bounded thread pool (SUPABASE_MAX_WORKERS) with a
+    per-call timeout (SUPABASE_QUERY_TIMEOUT) instead of blocking the event loop.
+    """
+
+    def __init__(self):
+        self.url = os.environ.get("SUPABASE_URL")
+        self.key = os.environ.get("SUPABASE_KEY")
+        self.health_check_interval = float(os.environ.get("SUPABASE_HEALTH_CHECK_INTERVAL", "30"))
+        self.health_check_table = os.environ.get("SUPABASE_HEALTH_CHECK_TABLE", "project_events")
+        self.max_workers = int(os.environ.get("SUPABASE_MAX_WORKERS", "16"))
+        self.query_timeout = float(os.environ.get("SUPABASE_QUERY_TIMEOUT", "10"))
+
+        self._client: Optional[Client] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="supabase"
+        )
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.url and self.key)
+
+    def _check_config(self):
+        """Check if Supabase is configured"""
+        if not self.configured:
+            raise HTTPException(status_code=500, detail="Supabase credentials not configured")
+
+    def _connect(self) -> Client:
+        self._close_client()
+        # Bound the HTTP call too, so a query abandoned by execute()'s timeout
+        # does not hold a worker thread for PostgREST's default 120 s
+        self._client = create_client(
+            self.url,
+            self.key,
+            options=ClientOptions(postgrest_client_timeout=self.query_timeout)
+        )
+        self._checked_at = time.monotonic()
+        return self._client
+
+    def _is_healthy(self, client: Client) -> bool:
+        try:
+            client.table(self.health_check_table).select("id").limit(1).execute()
+            return True
+        except Exception:
+            return False
+
+    def get_client(self) -> Client:
+        """
+        Return the shared client, reconnecting if the last health check failed
+
+        The lock only guards reading and swapping the client. The thread that
+        claims a due health check probes without holding it, while other
+        threads keep using the current client.
+        """
+        self._check_config()
+        with self._lock:
+            if self._client is None:
+                return self._connect()
+            client = self._client
+            probe = time.monotonic() - self._checked_at >= self.health_check_interval
+            if probe:
+                self._checked_at = time.monotonic()
+
+        if probe and not self._is_healthy(client):
+            with self._lock:
+                # Another thread may already have replaced it
+                if self._client is client or self._client is None:
+                    return self._connect()
+                return self._client
+        return client
+
+    async def execute(
+        self,
+        build_query: Callable[[Client], Any],
+        timeout: Optional[float] = None,
+        operation: str = "query"
+    ):
+        """
+        Build and execute a query off the event loop
+
+        Args:
+            build_query: Receives the shared client and returns a query builder
+            timeout: Seconds to wait before failing with 504 (default SUPABASE_QUERY_TIMEOUT)
+            operation: Label for the upstream latency histogram
+
+        Returns:
+            The APIResponse of query.execute()
+        """
+        def run():
+            try:
+                # Timed in the worker so pool queueing is not counted as Supabase time
+                with track_upstream("supabase", operation):
+                    return build_query(self.get_client()).execute()
+            except httpx.TransportError:
+                # Broken connection - rebuild the client on the next call
+                self.reset()
+                raise
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(self._executor, run),
+                timeout if timeout is not None else self.query_timeout
+            )
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Supabase query timed out")
+
+    def reset(self):
+        """Drop the current client so the next call reconnects"""
+        with self._lock:
+            self._close_client()
+
+    def _close_client(self):
+        if self._client is not None:
+            try:
+                self._client.postgrest.aclose()
+            except Exception:
+                pass
+            self._client = None
+
+    def close(self):
+        """Close the shared client and worker threads on shutdown"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.reset()
+
+
+def get_supabase_provider(request: Request) -> SupabaseProvider:
+    """Dependency to get the shared Supabase provider created in the app lifespan"""
+    provider = getattr(request.app.state, "supabase", None)
+    if provider is None:
+        raise HTTPException(status_code=500, detail="Supabase client is not initialized")
+    return provider
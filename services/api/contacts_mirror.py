@@ -0,0 +1,271 @@
+from contextlib import closing
+from datetime import datetime, timezone
+from fastapi import Request
+from typing import Dict, Iterable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+
+from api.clients.graph import CONTACT_SELECT, MSGraphClient
+
+logger = logging.getLogger(__name__)
+
+
+class ContactsMirror:
+    """
+    Local mirror of the mailbox contacts kept fresh with Graph delta queries
+
+    Raw Graph contact records are held in memory together with a display-name
+    ordering and a lowercase search text per contact, so list/get/search are
+    answered without calling Graph. A background task follows
+    /me/contacts/delta every CONTACTS_MIRROR_SYNC_INTERVAL seconds and the
+    result is persisted to a SQLite snapshot (CONTACTS_MIRROR_PATH) so a
+    restarted process serves reads immediately and resumes from the stored
+    delta link.
+    """
+
+    def __init__(self, graph: MSGraphClient):
+        self.graph = graph
+        self.snapshot_path = os.environ.get("CONTACTS_MIRROR_PATH", "contacts_mirror.sqlite3")
+        self.sync_interval = float(os.environ.get("CONTACTS_MIRROR_SYNC_INTERVAL", "60"))
+        self.delta_path = os.environ.get("CONTACTS_MIRROR_DELTA_PATH", "/me/contacts/delta")
+
+        self.delta_link: Optional[str] = None
+        self.synced_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+        self._contacts: Dict[str, dict] = {}
+        self._search_text: Dict[str, str] = {}
+        self._order: List[str] = []
+        self._order_dirty = False
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    # ==========================================
+    # Lifecycle
+    # ==========================================
+
+    async def start(self):
+        """Load the persisted snapshot and start background delta sync"""
+        try:
+            await asyncio.to_thread(self._load_snapshot)
+        except Exception as e:
+            logger.warning(f"Contacts mirror snapshot not loaded: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop background sync"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Contacts mirror sync failed: {e}")
+            await asyncio.sleep(self.sync_interval)
+
+    # ==========================================
+    # Reads
+    # ==========================================
+
+    @property
+    def ready(self) -> bool:
+        """True once the mirror holds a complete copy (synced or loaded from snapshot)"""
+        return self.synced_at is not None
+
+    @property
+    def age_seconds(self) -> Optional[float]:
+        if self.synced_at is None:
+            return None
+        return (datetime.now(timezone.utc) - self.synced_at).total_seconds()
+
+    def get(self, contact_id: str) -> Optional[dict]:
+        return self._contacts.get(contact_id)
+
+    def all(self) -> List[dict]:
+        """Every contact ordered by display name"""
+        return [self._contacts[cid] for cid in self._ordered_ids()]
+
+    def list_page(self, top: int, skip: int = 0, search: Optional[str] = None) -> Tuple[List[dict], bool]:
+        """
+        Page through contacts ordered by display name
+
+        Returns:
+            (contacts, has_more)
+        """
+        ids = self._ordered_ids()
+        if search:
+            terms = search.lower().split()
+            ids = [cid for cid in ids if all(t in self._search_text[cid] for t in terms)]
+        page = ids[skip:skip + top]
+        return [self._contacts[cid] for cid in page], skip + top < len(ids)
+
+    def freshness_headers(self) -> dict:
+        return {
+            "X-Mirror-Synced-At": self.synced_at.isoformat(),
+            "X-Mirror-Age": str(int(self.age_seconds))
+        }
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "contacts": len(self._contacts),
+            "synced_at": self.synced_at.isoformat() if self.synced_at else None,
+            "age_seconds": int(self.age_seconds) if self.synced_at else None,
+            "last_error": self.last_error
+        }
+
+    def _ordered_ids(self) -> List[str]:
+        if self._order_dirty:
+            self._order = sorted(
+                self._contacts,
+                key=lambda cid: ((self._contacts[cid].get("displayName") or "").lower(), cid)
+            )
+            self._order_dirty = False
+        return self._order
+
+    # ==========================================
+    # Writes
+    # ==========================================
+
+    def upsert(self, contact: dict):
+        """Add or replace one contact (also used for write-through from routes)"""
+        contact_id = contact.get("id")
+        if not contact_id:
+            return
+        self._contacts[contact_id] = contact
+        self._search_text[contact_id] = _search_text(contact)
+        self._order_dirty = True
+
+    def remove(self, contact_id: str):
+        if self._contacts.pop(contact_id, None) is not None:
+            self._search_text.pop(contact_id, None)
+            self._order_dirty = True
+
+    async def sync(self):
+        """Run one delta round (full enumeration when there is no delta link yet)"""
+        async with self._sync_lock:
+            full = self.delta_link is None
+            changed: Dict[str, dict] = {}
+            removed = set()
+            url = self.delta_link or self.delta_path
+            params = None if self.delta_link else {"$select": CONTACT_SELECT}
+            delta_link = None
+
+            while url:
+                response = await self.graph.request("GET", url, params=params)
+                params = None
+
+                if response.status_code == 410 and not full:
+                    # Delta token expired - start over with a full enumeration
+                    full = True
+                    changed.clear()
+                    removed.clear()
+                    url = self.delta_path
+                    params = {"$select": CONTACT_SELECT}
+                    continue
+
+                if response.status_code != 200:
+                    raise RuntimeError(f"Graph delta error {response.status_code}: {response.text}")
+
+                data = response.json()
+                for item in data.get("value", []):
+                    contact_id = item.get("id")
+                    if not contact_id:
+                        continue
+                    if "@removed" in item:
+                        changed.pop(contact_id, None)
+                        removed.add(contact_id)
+                    else:
+                        changed[contact_id] = item
+                        removed.discard(contact_id)
+
+                url = data.get("@odata.nextLink")
+                delta_link = data.get("@odata.deltaLink") or delta_link
+
+            if full:
+                removed = set(self._contacts) - set(changed)
+
+            for contact_id in removed:
+                self.remove(contact_id)
+            for contact in changed.values():
+                self.upsert(contact)
+
+            self.delta_link = delta_link
+            self.synced_at = datetime.now(timezone.utc)
+            self.last_error = None
+
+            try:
+                await asyncio.to_thread(self._save_snapshot, list(changed.values()), removed, full)
+            except Exception as e:
+                logger.warning(f"Contacts mirror snapshot not saved: {e}")
+
+    # ==========================================
+    # SQLite snapshot
+    # ==========================================
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.snapshot_path)
+        db.execute("CREATE TABLE IF NOT EXISTS contacts (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return db
+
+    def _load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return
+        with closing(self._connect()) as db:
+            rows = db.execute("SELECT data FROM contacts").fetchall()
+            meta = dict(db.execute("SELECT key, value FROM meta").fetchall())
+
+        for (data,) in rows:
+            self.upsert(json.loads(data))
+        self.delta_link = meta.get("delta_link")
+        if meta.get("synced_at"):
+            self.synced_at = datetime.fromisoformat(meta["synced_at"])
+
+    def _save_snapshot(self, changed: List[dict], removed: Iterable[str], full: bool):
+        started = time.monotonic()
+        with closing(self._connect()) as db, db:
+            if full:
+                db.execute("DELETE FROM contacts")
+            else:
+                db.executemany("DELETE FROM contacts WHERE id = ?", [(cid,) for cid in removed])
+            db.executemany(
+                "INSERT OR REPLACE INTO contacts (id, data) VALUES (?, ?)",
+                [(c["id"], json.dumps(c)) for c in changed]
+            )
+            db.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("delta_link", self.delta_link), ("synced_at", self.synced_at.isoformat())]
+            )
+        logger.debug(f"Contacts mirror snapshot saved in {time.monotonic() - started:.3f}s")
+
+
+def _search_text(contact: dict) -> str:
+    parts = [
+        contact.get("displayName"),
+        contact.get("givenName"),
+        contact.get("surname")
+    ]
+    parts.extend(e.get("address") for e in contact.get("emailAddresses") or [])
+    return " ".join(p for p in parts if p).lower()
+
+
+def get_contacts_mirror(request: Request) -> Optional[ContactsMirror]:
+    """Dependency to get the contacts mirror when it is enabled and ready"""
+    mirror = getattr(request.app.state, "contacts_mirror", None)
+    if mirror is None or not mirror.ready:
+        return None
+    return mirror
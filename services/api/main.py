@@ -1,10 +1,61 @@
+from contextlib import asynccontextmanager
+import logging
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from api.cache import AsyncTTLCache
+from api.clients.graph import MSGraphClient
+from api.clients.supabase_client import SupabaseProvider
+from api.contacts_mirror import ContactsMirror
+from api.metrics import MetricsMiddleware, metrics_response
+from api.repositories.event_buffer import EventWriteBuffer
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create shared upstream clients on startup and close them on shutdown"""
+    graph_client = MSGraphClient()
+    await graph_client.start()
+    app.state.graph_client = graph_client
+    contacts_mirror = None
+    if os.environ.get("CONTACTS_MIRROR", "false").lower() == "true":
+        contacts_mirror = ContactsMirror(graph_client)
+        await contacts_mirror.start()
+    app.state.contacts_mirror = contacts_mirror
+    supabase = SupabaseProvider()
+    if supabase.configured:
+        try:
+            supabase.get_client()
+        except Exception as e:
+            # Routes will retry the connection on first use
+            logger.warning(f"Supabase client warm-up failed: {e}")
+    app.state.supabase = supabase
+    events_cache = AsyncTTLCache()
+    app.state.events_cache = events_cache
+    event_buffer = None
+    if supabase.configured and os.environ.get("EVENTS_WRITE_BEHIND", "false").lower() == "true":
+        event_buffer = EventWriteBuffer(supabase, on_flush=events_cache.invalidate)
+        event_buffer.start()
+    app.state.event_buffer = event_buffer
+    try:
+        yield
+    finally:
+        if event_buffer is not None:
+            await event_buffer.stop()
+        if contacts_mirror is not None:
+            await contacts_mirror.stop()
+        await graph_client.aclose()
+        supabase.close()
+
+
 app = FastAPI(
     title="Viktor Digital Twin API",
     description="API for tracking project events, contacts sync, and monitoring system health",
-    version="1.1.0"
+    version="1.1.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -14,8 +65,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Mirror-Synced-At", "X-Mirror-Age"],
 )
 
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 from api.routes.events import router as events_router
 from api.routes.contacts import router as contacts_router
@@ -32,7 +86,8 @@ async def root():
         "docs": "/docs",
         "endpoints": {
             "events": "/events",
-            "contacts": "/contacts"
+            "contacts": "/contacts",
+            "metrics": "/metrics"
         }
     }
 
@@ -40,3 +95,8 @@ async def root():
 async def health_check():
     """Health check endpoint"""
     return {"status": "healthy"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return metrics_response()
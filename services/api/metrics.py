@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.routing import Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import time
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "HTTP requests",
+    ["method", "route", "status"]
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served",
+    ["method", "route"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response body is sent",
+    ["method", "route", "status"]
+)
+UPSTREAM_LATENCY = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of calls to Supabase and Microsoft Graph",
+    ["upstream", "operation", "outcome"]
+)
+
+
+class MetricsMiddleware:
+    """
+    Request count, in-flight requests and latency per route template
+
+    Routes are labelled by their path template (/contacts/{contact_id}), not
+    the concrete URL, so label cardinality stays bounded; requests that match
+    no route are labelled "unmatched".
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route_template(scope)
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method=method, route=route)
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_progress.dec()
+            HTTP_REQUESTS.labels(method=method, route=route, status=str(status)).inc()
+            HTTP_LATENCY.labels(method=method, route=route, status=str(status)).observe(
+                time.perf_counter() - started
+            )
+
+
+def _route_template(scope: Scope) -> str:
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class UpstreamCall:
+    """Outcome of a timed upstream call; callers may set a more specific one (e.g. a status code)"""
+
+    def __init__(self):
+        self.outcome = "ok"
+
+
+@contextmanager
+def track_upstream(upstream: str, operation: str):
+    """Time one upstream call; the outcome is "error" if it raises"""
+    call = UpstreamCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        call.outcome = "error"
+        raise
+    finally:
+        UPSTREAM_LATENCY.labels(upstream=upstream, operation=operation, outcome=call.outcome).observe(
+            time.perf_counter() - started
+        )
+
+
+def metrics_response() -> Response:
+    """Prometheus exposition of the default registry"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 class EmailAddress(BaseModel):
@@ -68,3 +68,28 @@ class MSGraphTokenResponse(BaseModel):
     access_token: str
     token_type: str
     expires_in: int
+
+class ContactBatchOperation(BaseModel):
+    """Single operation of a contacts batch"""
+    id: Optional[str] = Field(None, description="Operation id referenced by depends_on (defaults to its index)")
+    op: Literal["create", "update", "delete"]
+    contact_id: Optional[str] = Field(None, description="Target contact for update/delete")
+    contact: Optional[dict] = Field(None, description="ContactCreate for create, ContactUpdate for update")
+    depends_on: List[str] = []
+
+class ContactsBatchRequest(BaseModel):
+    """Mixed create/update/delete operations"""
+    operations: List[ContactBatchOperation]
+
+class ContactBatchResult(BaseModel):
+    """Outcome of one batch operation"""
+    id: str
+    status: int
+    contact: Optional[ContactResponse] = None
+    error: Optional[str] = None
+
+class ContactsBatchResponse(BaseModel):
+    """Per-operation results of a contacts batch"""
+    results: List[ContactBatchResult]
+    succeeded: int
+    failed: int
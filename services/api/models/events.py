@@ -49,3 +49,16 @@ class SystemHealth(BaseModel):
     total_events_today: int
     successful_today: int
     success_rate: float
+
+class BatchItemError(BaseModel):
+    """Rejected item of a batch request"""
+    index: int
+    error: str
+
+class EventBatchResponse(BaseModel):
+    """Result of a batch event ingestion"""
+    accepted: int
+    rejected: int
+    queued: bool = False
+    errors: List[BatchItemError] = []
+    events: List[EventResponse] = []
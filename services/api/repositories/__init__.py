@@ -0,0 +1 @@
+"""Async data-access layer over Supabase tables and views"""
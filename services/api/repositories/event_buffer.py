@@ -0,0 +1,107 @@
+from fastapi import Request
+from typing import Callable, List, Optional
+import asyncio
+import logging
+import os
+
+from api.clients.supabase_client import SupabaseProvider
+from api.repositories.events import EventsRepository
+
+logger = logging.getLogger(__name__)
+
+
+class EventWriteBuffer:
+    """
+    In-process write-behind buffer for project_events
+
+    Rows are queued in memory and written with multi-row inserts once
+    EVENTS_BUFFER_BATCH_SIZE rows are pending or every
+    EVENTS_BUFFER_FLUSH_INTERVAL seconds, whichever comes first. At most
+    EVENTS_BUFFER_MAX_PENDING rows are held; rows beyond that are refused so
+    callers can report them as rejected.
+
+    on_flush, if given, is called after every successful write (e.g. to
+    invalidate caches that depend on project_events).
+    """
+
+    def __init__(self, provider: SupabaseProvider, on_flush: Optional[Callable[[], None]] = None):
+        self.repo = EventsRepository(provider)
+        self.on_flush = on_flush
+        self.batch_size = int(os.environ.get("EVENTS_BUFFER_BATCH_SIZE", "500"))
+        self.flush_interval = float(os.environ.get("EVENTS_BUFFER_FLUSH_INTERVAL", "1.0"))
+        self.max_pending = int(os.environ.get("EVENTS_BUFFER_MAX_PENDING", "10000"))
+
+        self.flushed = 0
+        self.dropped = 0
+
+        self._pending: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def start(self):
+        """Start the background flush loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out whatever is still pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def add(self, rows: List[dict]) -> int:
+        """
+        Queue rows for writing
+
+        Returns:
+            How many of the leading rows were accepted
+        """
+        room = max(self.max_pending - len(self._pending), 0)
+        accepted = rows[:room]
+        self._pending.extend(accepted)
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        return len(accepted)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all pending rows in chunks of batch_size"""
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                try:
+                    await self.repo.insert_events(batch)
+                    self.flushed += len(batch)
+                    if self.on_flush is not None:
+                        self.on_flush()
+                except Exception as e:
+                    # Put the batch back for the next tick, as far as capacity allows
+                    room = max(self.max_pending - len(self._pending), 0)
+                    self._pending[:0] = batch[:room]
+                    self.dropped += len(batch) - min(room, len(batch))
+                    logger.error(f"Event buffer flush failed ({len(batch)} rows): {e}")
+                    break
+
+
+def get_event_buffer(request: Request) -> Optional[EventWriteBuffer]:
+    """Dependency to get the write-behind buffer (None when EVENTS_WRITE_BEHIND is off)"""
+    return getattr(request.app.state, "event_buffer", None)
@@ -0,0 +1,158 @@
+from fastapi import Depends, HTTPException
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+import base64
+import json
+
+from api.clients.supabase_client import SupabaseProvider, get_supabase_provider
+
+EVENTS_TABLE = "project_events"
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque keyset cursor pointing just past the given row"""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """
+    Decode a cursor produced by encode_cursor into (created_at, id)
+
+    created_at is parsed and re-serialized, so only a well-formed timestamp
+    ever reaches the PostgREST filter.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, event_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at).isoformat(), int(event_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+class EventsRepository:
+    """Async access to project_events and its reporting views"""
+
+    def __init__(self, provider: SupabaseProvider):
+        self.provider = provider
+
+    async def insert_event(self, row: dict) -> Optional[dict]:
+        """Insert one event, return the stored row"""
+        result = await self.provider.execute(
+            lambda db: db.table(EVENTS_TABLE).insert(row),
+            operation="insert_event"
+        )
+        return result.data[0] if result.data else None
+
+    async def insert_events(self, rows: List[dict]) -> List[dict]:
+        """Insert many events with a single multi-row insert"""
+        if not rows:
+            return []
+        result = await self.provider.execute(
+            lambda db: db.table(EVENTS_TABLE).insert(rows),
+            operation="insert_events"
+        )
+        return result.data or []
+
+    async def list_events(
+        self,
+        limit: int = 100,
+        phase: Optional[str] = None,
+        event_type: Optional[str] = None,
+        after: Optional[Tuple[str, int]] = None
+    ) -> List[dict]:
+        """
+        Newest events first with optional filters
+
+        Rows are ordered by (created_at, id) descending. Passing the
+        (created_at, id) of the last row seen as `after` returns the next
+        page with a keyset condition instead of an offset scan.
+        """
+        def build(db):
+            query = db.table(EVENTS_TABLE).select("*")
+            if phase:
+                query = query.eq("phase", phase)
+            if event_type:
+                query = query.eq("event_type", event_type)
+            if after:
+                created_at, event_id = after
+                query = query.or_(
+                    f'created_at.lt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.lt.{event_id})'
+                )
+            return query.order("created_at", desc=True).order("id", desc=True).limit(limit)
+
+        result = await self.provider.execute(build, operation="list_events")
+        return result.data
+
+    async def iter_event_pages(
+        self,
+        page_size: int = 1000,
+        phase: Optional[str] = None,
+        event_type: Optional[str] = None
+    ) -> AsyncIterator[List[dict]]:
+        """
+        Walk all matching events newest first, one keyset page at a time
+
+        Stops on an empty page rather than a short one: PostgREST caps pages
+        at its max-rows setting, which may be below page_size.
+        """
+        after = None
+        while True:
+            rows = await self.list_events(
+                limit=page_size,
+                phase=phase,
+                event_type=event_type,
+                after=after
+            )
+            if not rows:
+                return
+            yield rows
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+
+    async def recent_events(self, limit: int = 20) -> List[dict]:
+        """Rows from v_recent_events"""
+        result = await self.provider.execute(
+            lambda db: db.table("v_recent_events").select("*").limit(limit),
+            operation="recent_events"
+        )
+        return result.data
+
+    async def timeline(self, days: int = 7) -> List[dict]:
+        """Latest daily rows from project_timeline"""
+        result = await self.provider.execute(
+            lambda db: db.table("project_timeline").select("*").order("date", desc=True).limit(days),
+            operation="timeline"
+        )
+        return result.data
+
+    async def system_health(self) -> Optional[dict]:
+        """Single row from v_system_health"""
+        result = await self.provider.execute(
+            lambda db: db.table("v_system_health").select("*").limit(1),
+            operation="system_health"
+        )
+        return result.data[0] if result.data else None
+
+    async def events_by_phase(self) -> List[dict]:
+        """Rows from v_events_by_phase"""
+        result = await self.provider.execute(
+            lambda db: db.table("v_events_by_phase").select("*"),
+            operation="events_by_phase"
+        )
+        return result.data
+
+    async def phase_progress(self) -> List[dict]:
+        """Rows from v_phase_progress"""
+        result = await self.provider.execute(
+            lambda db: db.table("v_phase_progress").select("*"),
+            operation="phase_progress"
+        )
+        return result.data
+
+
+def get_events_repository(
+    provider: SupabaseProvider = Depends(get_supabase_provider)
+) -> EventsRepository:
+    """Dependency to get the events repository"""
+    return EventsRepository(provider)
@@ -1,308 +1,404 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import Optional
-import httpx
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from typing import List, Optional
+from urllib.parse import urlencode
+import orjson
 import os
 
+from api.clients.graph import CONTACT_SELECT, MSGraphClient, get_graph_client, graph_error
+from api.contacts_mirror import ContactsMirror, get_contacts_mirror
+from api.serialization import FAST_SERIALIZATION, fast_response
 from api.models.contacts import (
     ContactCreate,
     ContactUpdate,
     ContactResponse,
     ContactsListResponse,
-    EmailAddress,
-    PhoneNumber
+    ContactsBatchRequest,
+    ContactBatchResult,
+    ContactsBatchResponse
 )
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 
-# Microsoft Graph API endpoints
-GRAPH_API_BASE = "https://graph.microsoft.com/v1.0"
-TOKEN_URL = "https://login.microsoftonline.com/{tenant_id}/oauth2/v2.0/token"
+# Max operations accepted by POST /contacts/batch
+BATCH_MAX_OPERATIONS = int(os.environ.get("CONTACTS_BATCH_MAX_OPERATIONS", "1000"))
 
+# Graph page size for GET /contacts/all (999 is the Graph maximum for contacts)
+ENUMERATE_PAGE_SIZE = int(os.environ.get("CONTACTS_ENUMERATE_PAGE_SIZE", "999"))
 
-class MSGraphClient:
-    """Microsoft Graph API client"""
+
+def _create_payload(contact: ContactCreate) -> dict:
+    """Build Graph API payload for a new contact"""
+    payload = {
+        "givenName": contact.given_name,
+        "surname": contact.surname,
+        "displayName": contact.display_name or f"{contact.given_name} {contact.surname or ''}".strip(),
+        "companyName": contact.company_name,
+        "jobTitle": contact.job_title,
+        "personalNotes": contact.notes,
+        "emailAddresses": [
+            {"address": e.address, "name": e.name} for e in contact.email_addresses
+        ],
+        "businessPhones": [p.number for p in contact.phone_numbers if p.type == "business"],
+        "homePhones": [p.number for p in contact.phone_numbers if p.type == "home"],
+        "mobilePhone": next((p.number for p in contact.phone_numbers if p.type == "mobile"), None)
+    }
     
-    def __init__(self):
-        self.client_id = os.environ.get("MS_CLIENT_ID")
-        self.client_secret = os.environ.get("MS_CLIENT_SECRET")
-        self.tenant_id = os.environ.get("MS_TENANT_ID")
-        self.access_token = os.environ.get("MS_ACCESS_TOKEN")  # User token (delegated)
-        
-    def _check_config(self):
-        """Check if MS Graph is configured"""
-        if not self.access_token:
-            if not all([self.client_id, self.client_secret, self.tenant_id]):
-                raise HTTPException(
-                    status_code=500, 
-                    detail="Microsoft Graph API not configured. Set MS_ACCESS_TOKEN or MS_CLIENT_ID/MS_CLIENT_SECRET/MS_TENANT_ID"
-                )
+    # Remove None values
+    return {k: v for k, v in payload.items() if v is not None}
+
+
+def _update_payload(contact: ContactUpdate) -> dict:
+    """Build Graph API payload with only provided fields"""
+    payload = {}
     
-    async def get_headers(self) -> dict:
-        """Get authorization headers"""
-        self._check_config()
-        return {
-            "Authorization": f"Bearer {self.access_token}",
-            "Content-Type": "application/json"
-        }
+    if contact.given_name is not None:
+        payload["givenName"] = contact.given_name
+    if contact.surname is not None:
+        payload["surname"] = contact.surname
+    if contact.display_name is not None:
+        payload["displayName"] = contact.display_name
+    if contact.company_name is not None:
+        payload["companyName"] = contact.company_name
+    if contact.job_title is not None:
+        payload["jobTitle"] = contact.job_title
+    if contact.notes is not None:
+        payload["personalNotes"] = contact.notes
+    if contact.email_addresses is not None:
+        payload["emailAddresses"] = [
+            {"address": e.address, "name": e.name} for e in contact.email_addresses
+        ]
+    if contact.phone_numbers is not None:
+        payload["businessPhones"] = [p.number for p in contact.phone_numbers if p.type == "business"]
+        payload["homePhones"] = [p.number for p in contact.phone_numbers if p.type == "home"]
+        payload["mobilePhone"] = next((p.number for p in contact.phone_numbers if p.type == "mobile"), None)
     
-    def _parse_contact(self, data: dict) -> ContactResponse:
-        """Parse Graph API contact to ContactResponse"""
-        email_addresses = []
-        for email in data.get("emailAddresses", []):
-            email_addresses.append(EmailAddress(
-                address=email.get("address", ""),
-                name=email.get("name")
-            ))
-        
-        phone_numbers = []
-        for phone_type in ["mobilePhone", "businessPhones", "homePhones"]:
-            phones = data.get(phone_type)
-            if phones:
-                if isinstance(phones, str):
-                    phone_numbers.append(PhoneNumber(number=phones, type="mobile"))
-                elif isinstance(phones, list):
-                    for p in phones:
-                        phone_numbers.append(PhoneNumber(number=p, type=phone_type.replace("Phones", "")))
-        
-        return ContactResponse(
-            id=data.get("id", ""),
-            given_name=data.get("givenName"),
-            surname=data.get("surname"),
-            display_name=data.get("displayName"),
-            email_addresses=email_addresses,
-            phone_numbers=phone_numbers,
-            company_name=data.get("companyName"),
-            job_title=data.get("jobTitle"),
-            created_at=data.get("createdDateTime"),
-            updated_at=data.get("lastModifiedDateTime")
-        )
+    return payload
+
+
+def _contact_result(client: MSGraphClient, data: dict, status_code: int = 200, headers: Optional[dict] = None):
+    """ContactResponse for a Graph record, or the same shape as orjson with FAST_SERIALIZATION"""
+    if FAST_SERIALIZATION:
+        return fast_response(client._contact_dict(data), status_code, headers)
+    return client._parse_contact(data)
+
+
+def _contacts_list_result(
+    client: MSGraphClient,
+    items: List[dict],
+    next_link: Optional[str],
+    headers: Optional[dict] = None
+):
+    if FAST_SERIALIZATION:
+        return fast_response({
+            "contacts": [client._contact_dict(c) for c in items],
+            "total_count": len(items),
+            "next_link": next_link
+        }, headers=headers)
+    return ContactsListResponse(
+        contacts=[client._parse_contact(c) for c in items],
+        total_count=len(items),
+        next_link=next_link
+    )
 
 
-def get_graph_client() -> MSGraphClient:
-    """Dependency to get MS Graph client"""
-    return MSGraphClient()
+def _ndjson_contacts(client: MSGraphClient, items: List[dict]) -> bytes:
+    if FAST_SERIALIZATION:
+        return b"".join(orjson.dumps(client._contact_dict(c)) + b"\n" for c in items)
+    return "".join(client._parse_contact(c).model_dump_json() + "\n" for c in items).encode()
 
 
 @router.get("/", response_model=ContactsListResponse)
 async def list_contacts(
+    http_response: Response,
     top: int = Query(50, le=100, description="Number of contacts to return"),
     skip: int = Query(0, description="Number of contacts to skip"),
     search: Optional[str] = Query(None, description="Search query"),
-    client: MSGraphClient = Depends(get_graph_client)
+    client: MSGraphClient = Depends(get_graph_client),
+    mirror: Optional[ContactsMirror] = Depends(get_contacts_mirror)
 ):
     """
     List contacts from Microsoft 365 / Outlook
     
     Requires: MS_ACCESS_TOKEN environment variable with delegated permissions
+    
+    With CONTACTS_MIRROR enabled the page is served from the local mirror;
+    X-Mirror-Synced-At / X-Mirror-Age tell how fresh it is.
     """
-    headers = await client.get_headers()
+    if mirror is not None:
+        items, has_more = mirror.list_page(top, skip, search)
+        freshness = mirror.freshness_headers()
+        http_response.headers.update(freshness)
+        next_link = None
+        if has_more:
+            query = {"top": top, "skip": skip + top}
+            if search:
+                query["search"] = search
+            next_link = f"{router.prefix}/?{urlencode(query)}"
+        return _contacts_list_result(client, items, next_link, freshness)
     
+    headers = {}
     params = {
         "$top": top,
         "$skip": skip,
         "$orderby": "displayName",
-        "$select": "id,givenName,surname,displayName,emailAddresses,mobilePhone,businessPhones,homePhones,companyName,jobTitle,createdDateTime,lastModifiedDateTime"
+        "$select": CONTACT_SELECT
     }
     
     if search:
         params["$search"] = f'"displayName:{search}" OR "emailAddresses/address:{search}"'
         headers["ConsistencyLevel"] = "eventual"
     
-    async with httpx.AsyncClient() as http:
-        response = await http.get(
-            f"{GRAPH_API_BASE}/me/contacts",
-            headers=headers,
-            params=params
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Graph API error: {response.text}"
-            )
-        
-        data = response.json()
-        contacts = [client._parse_contact(c) for c in data.get("value", [])]
-        
-        return ContactsListResponse(
-            contacts=contacts,
-            total_count=len(contacts),
-            next_link=data.get("@odata.nextLink")
-        )
+    response = await client.request("GET", "/me/contacts", headers=headers, params=params)
+    
+    if response.status_code != 200:
+        raise graph_error(response)
+    
+    data = response.json()
+    return _contacts_list_result(client, data.get("value", []), data.get("@odata.nextLink"))
+
+
+@router.get("/all")
+async def enumerate_contacts(
+    client: MSGraphClient = Depends(get_graph_client),
+    mirror: Optional[ContactsMirror] = Depends(get_contacts_mirror)
+):
+    """
+    Stream every contact in the mailbox as NDJSON (one ContactResponse per line)
+
+    Graph is paged with $top=CONTACTS_ENUMERATE_PAGE_SIZE and the next page is
+    fetched while the current one is being serialized. With CONTACTS_MIRROR
+    enabled the contacts come from the local mirror instead.
+    """
+    if mirror is not None:
+        items = mirror.all()
+
+        async def mirror_body():
+            for start in range(0, len(items), ENUMERATE_PAGE_SIZE):
+                yield _ndjson_contacts(client, items[start:start + ENUMERATE_PAGE_SIZE])
+
+        return StreamingResponse(mirror_body(), media_type="application/x-ndjson", headers=mirror.freshness_headers())
+
+    pages = client.iter_pages("/me/contacts", params={"$top": ENUMERATE_PAGE_SIZE, "$select": CONTACT_SELECT})
+
+    # Read the first page up front so Graph errors still return a proper status
+    first_page = await anext(pages, None)
+
+    async def body():
+        try:
+            if first_page is not None:
+                yield _ndjson_contacts(client, first_page.get("value", []))
+            async for page in pages:
+                yield _ndjson_contacts(client, page.get("value", []))
+        finally:
+            await pages.aclose()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
 
 @router.get("/{contact_id}", response_model=ContactResponse)
 async def get_contact(
     contact_id: str,
-    client: MSGraphClient = Depends(get_graph_client)
+    http_response: Response,
+    client: MSGraphClient = Depends(get_graph_client),
+    mirror: Optional[ContactsMirror] = Depends(get_contacts_mirror)
 ):
     """Get a specific contact by ID"""
-    headers = await client.get_headers()
+    if mirror is not None:
+        cached = mirror.get(contact_id)
+        if cached is not None:
+            freshness = mirror.freshness_headers()
+            http_response.headers.update(freshness)
+            return _contact_result(client, cached, headers=freshness)
     
-    async with httpx.AsyncClient() as http:
-        response = await http.get(
-            f"{GRAPH_API_BASE}/me/contacts/{contact_id}",
-            headers=headers
-        )
-        
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Contact not found")
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Graph API error: {response.text}"
-            )
-        
-        return client._parse_contact(response.json())
+    response = await client.request("GET", f"/me/contacts/{contact_id}")
+    
+    if response.status_code == 404:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    
+    if response.status_code != 200:
+        raise graph_error(response)
+    
+    return _contact_result(client, response.json())
 
 
 @router.post("/", response_model=ContactResponse, status_code=201)
 async def create_contact(
     contact: ContactCreate,
-    client: MSGraphClient = Depends(get_graph_client)
+    client: MSGraphClient = Depends(get_graph_client),
+    mirror: Optional[ContactsMirror] = Depends(get_contacts_mirror)
 ):
     """Create a new contact in Outlook"""
-    headers = await client.get_headers()
+    response = await client.request("POST", "/me/contacts", json=_create_payload(contact))
     
-    # Build Graph API payload
-    payload = {
-        "givenName": contact.given_name,
-        "surname": contact.surname,
-        "displayName": contact.display_name or f"{contact.given_name} {contact.surname or ''}".strip(),
-        "companyName": contact.company_name,
-        "jobTitle": contact.job_title,
-        "personalNotes": contact.notes,
-        "emailAddresses": [
-            {"address": e.address, "name": e.name} for e in contact.email_addresses
-        ],
-        "businessPhones": [p.number for p in contact.phone_numbers if p.type == "business"],
-        "homePhones": [p.number for p in contact.phone_numbers if p.type == "home"],
-        "mobilePhone": next((p.number for p in contact.phone_numbers if p.type == "mobile"), None)
-    }
+    if response.status_code not in [200, 201]:
+        raise graph_error(response)
     
-    # Remove None values
-    payload = {k: v for k, v in payload.items() if v is not None}
+    data = response.json()
+    if mirror is not None:
+        mirror.upsert(data)
+    return _contact_result(client, data, status_code=201)
+
+
+@router.post("/batch", response_model=ContactsBatchResponse)
+async def batch_contacts(
+    batch: ContactsBatchRequest,
+    client: MSGraphClient = Depends(get_graph_client),
+    mirror: Optional[ContactsMirror] = Depends(get_contacts_mirror)
+):
+    """
+    Create, update and delete many contacts at once
     
-    async with httpx.AsyncClient() as http:
-        response = await http.post(
-            f"{GRAPH_API_BASE}/me/contacts",
-            headers=headers,
-            json=payload
-        )
+    Operations are sent through Graph JSON $batch (20 per call, several calls
+    in parallel). `depends_on` lists ids of operations that must complete
+    first; dependent operations fail with 424 if a prerequisite fails.
+    Every operation gets its own status in the response.
+    """
+    if len(batch.operations) > BATCH_MAX_OPERATIONS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_OPERATIONS} operations")
+    
+    op_ids = [op.id or str(i) for i, op in enumerate(batch.operations)]
+    if len(set(op_ids)) != len(op_ids):
+        raise HTTPException(status_code=400, detail="Operation ids must be unique")
+    
+    results = {}
+    requests = []
+    for op_id, op in zip(op_ids, batch.operations):
+        try:
+            if op.op != "create" and not op.contact_id:
+                raise ValueError(f"contact_id is required for {op.op}")
+            unknown = [dep for dep in op.depends_on if dep not in op_ids]
+            if unknown:
+                raise ValueError(f"Unknown depends_on ids: {', '.join(unknown)}")
+            
+            if op.op == "create":
+                item = {"method": "POST", "url": "/me/contacts",
+                        "body": _create_payload(ContactCreate.model_validate(op.contact or {}))}
+            elif op.op == "update":
+                item = {"method": "PATCH", "url": f"/me/contacts/{op.contact_id}",
+                        "body": _update_payload(ContactUpdate.model_validate(op.contact or {}))}
+            else:
+                item = {"method": "DELETE", "url": f"/me/contacts/{op.contact_id}"}
+        except (ValueError, ValidationError) as e:
+            results[op_id] = ContactBatchResult(id=op_id, status=400, error=str(e))
+            continue
         
-        if response.status_code not in [200, 201]:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Graph API error: {response.text}"
-            )
+        item["id"] = op_id
+        if "body" in item:
+            item["headers"] = {"Content-Type": "application/json"}
+        if op.depends_on:
+            item["dependsOn"] = op.depends_on
+        requests.append(item)
+    
+    # Operations depending on a rejected operation cannot run
+    rejected = set(results)
+    while True:
+        blocked = [item for item in requests if rejected.intersection(item.get("dependsOn", []))]
+        if not blocked:
+            break
+        for item in blocked:
+            results[item["id"]] = ContactBatchResult(id=item["id"], status=424, error="Dependency failed")
+            rejected.add(item["id"])
+        requests = [item for item in requests if item["id"] not in rejected]
+    
+    try:
+        responses = await client.batch(requests) if requests else {}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    for item in requests:
+        reply = responses[item["id"]]
+        status = int(reply.get("status", 502))
+        body = reply.get("body") or {}
+        if status >= 400:
+            error = body.get("error", {}).get("message") if isinstance(body, dict) else None
+            results[item["id"]] = ContactBatchResult(id=item["id"], status=status, error=error or "Graph API error")
+            continue
         
-        return client._parse_contact(response.json())
+        contact = None
+        if item["method"] == "DELETE":
+            if mirror is not None:
+                mirror.remove(item["url"].rsplit("/", 1)[-1])
+        elif isinstance(body, dict) and body.get("id"):
+            if mirror is not None:
+                mirror.upsert(body)
+            contact = client._parse_contact(body)
+        results[item["id"]] = ContactBatchResult(id=item["id"], status=status, contact=contact)
+    
+    ordered = [results[op_id] for op_id in op_ids]
+    succeeded = sum(1 for r in ordered if r.status < 400)
+    return ContactsBatchResponse(results=ordered, succeeded=succeeded, failed=len(ordered) - succeeded)
 
 
 @router.patch("/{contact_id}", response_model=ContactResponse)
 async def update_contact(
     contact_id: str,
     contact: ContactUpdate,
-    client: MSGraphClient = Depends(get_graph_client)
+    client: MSGraphClient = Depends(get_graph_client),
+    mirror: Optional[ContactsMirror] = Depends(get_contacts_mirror)
 ):
     """Update an existing contact"""
-    headers = await client.get_headers()
+    response = await client.request("PATCH", f"/me/contacts/{contact_id}", json=_update_payload(contact))
     
-    # Build payload with only provided fields
-    payload = {}
+    if response.status_code == 404:
+        raise HTTPException(status_code=404, detail="Contact not found")
     
-    if contact.given_name is not None:
-        payload["givenName"] = contact.given_name
-    if contact.surname is not None:
-        payload["surname"] = contact.surname
-    if contact.display_name is not None:
-        payload["displayName"] = contact.display_name
-    if contact.company_name is not None:
-        payload["companyName"] = contact.company_name
-    if contact.job_title is not None:
-        payload["jobTitle"] = contact.job_title
-    if contact.notes is not None:
-        payload["personalNotes"] = contact.notes
-    if contact.email_addresses is not None:
-        payload["emailAddresses"] = [
-            {"address": e.address, "name": e.name} for e in contact.email_addresses
-        ]
-    if contact.phone_numbers is not None:
-        payload["businessPhones"] = [p.number for p in contact.phone_numbers if p.type == "business"]
-        payload["homePhones"] = [p.number for p in contact.phone_numbers if p.type == "home"]
-        payload["mobilePhone"] = next((p.number for p in contact.phone_numbers if p.type == "mobile"), None)
+    if response.status_code != 200:
+        raise graph_error(response)
     
-    async with httpx.AsyncClient() as http:
-        response = await http.patch(
-            f"{GRAPH_API_BASE}/me/contacts/{contact_id}",
-            headers=headers,
-            json=payload
-        )
-        
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Contact not found")
-        
-        if response.status_code != 200:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Graph API error: {response.text}"
-            )
-        
-        return client._parse_contact(response.json())
+    data = response.json()
+    if mirror is not None:
+        mirror.upsert(data)
+    return _contact_result(client, data)
 
 
 @router.delete("/{contact_id}", status_code=204)
 async def delete_contact(
     contact_id: str,
-    client: MSGraphClient = Depends(get_graph_client)
+    client: MSGraphClient = Depends(get_graph_client),
+    mirror: Optional[ContactsMirror] = Depends(get_contacts_mirror)
 ):
     """Delete a contact"""
-    headers = await client.get_headers()
+    response = await client.request("DELETE", f"/me/contacts/{contact_id}")
     
-    async with httpx.AsyncClient() as http:
-        response = await http.delete(
-            f"{GRAPH_API_BASE}/me/contacts/{contact_id}",
-            headers=headers
-        )
-        
-        if response.status_code == 404:
-            raise HTTPException(status_code=404, detail="Contact not found")
-        
-        if response.status_code not in [200, 204]:
-            raise HTTPException(
-                status_code=response.status_code,
-                detail=f"Graph API error: {response.text}"
-            )
+    if response.status_code == 404:
+        raise HTTPException(status_code=404, detail="Contact not found")
+    
+    if response.status_code not in [200, 204]:
+        raise graph_error(response)
+    
+    if mirror is not None:
+        mirror.remove(contact_id)
 
 
 @router.get("/sync/status")
-async def sync_status(client: MSGraphClient = Depends(get_graph_client)):
+async def sync_status(request: Request, client: MSGraphClient = Depends(get_graph_client)):
     """Check Microsoft Graph API connection status"""
+    mirror = getattr(request.app.state, "contacts_mirror", None)
     try:
-        headers = await client.get_headers()
+        response = await client.request("GET", "/me")
         
-        async with httpx.AsyncClient() as http:
-            response = await http.get(
-                f"{GRAPH_API_BASE}/me",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                user = response.json()
-                return {
-                    "status": "connected",
-                    "user": user.get("displayName"),
-                    "email": user.get("mail") or user.get("userPrincipalName"),
-                    "provider": "Microsoft Graph API"
-                }
-            else:
-                return {
-                    "status": "error",
-                    "error": response.text
-                }
+        if response.status_code == 200:
+            user = response.json()
+            result = {
+                "status": "connected",
+                "user": user.get("displayName"),
+                "email": user.get("mail") or user.get("userPrincipalName"),
+                "provider": "Microsoft Graph API"
+            }
+        else:
+            result = {
+                "status": "error",
+                "error": response.text
+            }
     except HTTPException as e:
-        return {
+        result = {
             "status": "not_configured",
             "error": e.detail
         }
+    
+    result["throttling"] = client.limiters.status()
+    if mirror is not None:
+        result["mirror"] = mirror.status()
+    return result
@@ -1,134 +1,351 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from typing import List, Optional
 from datetime import date, datetime
+import csv
+import io
+import json
 import os
-from supabase import create_client, Client
 
+from api.cache import AsyncTTLCache, get_events_cache
 from api.models.events import (
     ProjectEvent,
     EventResponse,
     TimelineStats,
     SystemHealth,
-    EventType
+    EventType,
+    BatchItemError,
+    EventBatchResponse
 )
+from api.repositories.events import (
+    EventsRepository,
+    get_events_repository,
+    encode_cursor,
+    decode_cursor
+)
+from api.repositories.event_buffer import EventWriteBuffer, get_event_buffer
+from api.serialization import FAST_SERIALIZATION, fast_response, project_rows
 
 router = APIRouter(prefix="/events", tags=["events"])
 
-def get_supabase() -> Client:
-    """Get Supabase client"""
-    url = os.environ.get("SUPABASE_URL")
-    key = os.environ.get("SUPABASE_KEY")
-    if not url or not key:
-        raise HTTPException(status_code=500, detail="Supabase credentials not configured")
-    return create_client(url, key)
+# Batch ingestion limits
+BATCH_MAX_ITEMS = int(os.environ.get("EVENTS_BATCH_MAX_ITEMS", "5000"))
+BATCH_CHUNK_SIZE = int(os.environ.get("EVENTS_BATCH_CHUNK_SIZE", "500"))
+
+# Largest page for GET /events/; one extra row is fetched to detect a next
+# page, so this must stay below PostgREST's max-rows (1000 on Supabase)
+LIST_MAX_LIMIT = int(os.environ.get("EVENTS_LIST_MAX_LIMIT", "999"))
+
+# Dashboard cache TTLs in seconds (0 disables caching for the endpoint)
+CACHE_TTLS = {
+    "timeline": float(os.environ.get("EVENTS_CACHE_TTL_TIMELINE", "30")),
+    "health": float(os.environ.get("EVENTS_CACHE_TTL_HEALTH", "5")),
+    "by_phase": float(os.environ.get("EVENTS_CACHE_TTL_BY_PHASE", "15")),
+    "phase_progress": float(os.environ.get("EVENTS_CACHE_TTL_PHASE_PROGRESS", "15")),
+}
+
+# Columns returned by list endpoints on the FAST_SERIALIZATION path
+EVENT_RESPONSE_FIELDS = tuple(EventResponse.model_fields)
+
+# Export settings
+EXPORT_PAGE_SIZE = int(os.environ.get("EVENTS_EXPORT_PAGE_SIZE", "1000"))
+EXPORT_COLUMNS = [
+    "id", "created_at", "event_type", "phase", "step_name",
+    "description", "success", "metadata"
+]
+
+
+def _event_row(event: ProjectEvent) -> dict:
+    """Map a validated event to a project_events row"""
+    return {
+        "event_type": event.event_type,
+        "phase": event.phase,
+        "step_name": event.step_name,
+        "description": event.description,
+        "metadata": event.metadata,
+        "success": event.success
+    }
+
+
+def _parse_batch_body(body: bytes, content_type: str) -> List:
+    """Split a JSON array or NDJSON body into raw items (None marks an unparseable line)"""
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+
+    try:
+        items = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    return items
+
+
+def _ndjson_page(rows: List[dict]) -> bytes:
+    return "".join(json.dumps(row, default=str) + "\n" for row in rows).encode()
+
+
+def _csv_page(rows: List[dict], header: bool = False) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([
+            json.dumps(row.get(col)) if col == "metadata" else row.get(col)
+            for col in EXPORT_COLUMNS
+        ])
+    return buf.getvalue().encode()
 
 @router.post("/", response_model=EventResponse, status_code=201)
 async def create_event(
     event: ProjectEvent,
-    supabase: Client = Depends(get_supabase)
+    repo: EventsRepository = Depends(get_events_repository),
+    cache: AsyncTTLCache = Depends(get_events_cache)
 ):
     """Create a new project event"""
     try:
-        result = supabase.table("project_events").insert({
-            "event_type": event.event_type,
-            "phase": event.phase,
-            "step_name": event.step_name,
-            "description": event.description,
-            "metadata": event.metadata,
-            "success": event.success
-        }).execute()
-        
-        if not result.data:
+        row = await repo.insert_event(_event_row(event))
+
+        if not row:
             raise HTTPException(status_code=500, detail="Failed to create event")
-            
-        return result.data[0]
+
+        cache.invalidate()
+        return row
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/batch", response_model=EventBatchResponse, status_code=201)
+async def create_events_batch(
+    request: Request,
+    response: Response,
+    sync: bool = Query(False, description="Insert immediately even when write-behind is enabled"),
+    repo: EventsRepository = Depends(get_events_repository),
+    cache: AsyncTTLCache = Depends(get_events_cache),
+    buffer: Optional[EventWriteBuffer] = Depends(get_event_buffer)
+):
+    """
+    Create many project events at once
+
+    Accepts a JSON array of events or NDJSON (Content-Type: application/x-ndjson).
+    Invalid items are reported by index and do not fail the rest of the batch.
+    With EVENTS_WRITE_BEHIND enabled, valid events are queued and written in
+    the background (202); otherwise they are stored with multi-row inserts (201).
+    """
+    items = _parse_batch_body(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} events")
+
+    errors = []
+    valid = []  # (index, row)
+    for index, item in enumerate(items):
+        if item is None:
+            errors.append(BatchItemError(index=index, error="Invalid JSON"))
+            continue
+        try:
+            valid.append((index, _event_row(ProjectEvent.model_validate(item))))
+        except ValidationError as e:
+            errors.append(BatchItemError(index=index, error=str(e)))
+
+    if buffer is not None and not sync:
+        queued = buffer.add([row for _, row in valid])
+        for index, _ in valid[queued:]:
+            errors.append(BatchItemError(index=index, error="Write buffer is full"))
+        response.status_code = 202
+        return EventBatchResponse(
+            accepted=queued,
+            rejected=len(errors),
+            queued=True,
+            errors=sorted(errors, key=lambda e: e.index)
+        )
+
+    created = []
+    for start in range(0, len(valid), BATCH_CHUNK_SIZE):
+        chunk = valid[start:start + BATCH_CHUNK_SIZE]
+        try:
+            created.extend(await repo.insert_events([row for _, row in chunk]))
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            errors.extend(BatchItemError(index=index, error=detail) for index, _ in chunk)
+
+    if created:
+        cache.invalidate()
+    return EventBatchResponse(
+        accepted=len(created),
+        rejected=len(errors),
+        errors=sorted(errors, key=lambda e: e.index),
+        events=created
+    )
+
 @router.get("/", response_model=List[EventResponse])
 async def get_events(
-    limit: int = 100,
+    response: Response,
+    limit: int = Query(100, ge=1, le=LIST_MAX_LIMIT),
+    phase: Optional[str] = None,
+    event_type: Optional[EventType] = None,
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    repo: EventsRepository = Depends(get_events_repository)
+):
+    """
+    Get recent events with optional filters
+
+    Results are paged with keyset cursors: when more rows exist the response
+    carries an X-Next-Cursor header; pass it back as `cursor` (with the same
+    filters) to get the next page.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    try:
+        rows = await repo.list_events(
+            limit=limit + 1,
+            phase=phase,
+            event_type=event_type.value if event_type else None,
+            after=after
+        )
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+        if FAST_SERIALIZATION:
+            return fast_response(project_rows(rows, EVENT_RESPONSE_FIELDS), headers=headers)
+        response.headers.update(headers)
+        return rows
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/export")
+async def export_events(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
     phase: Optional[str] = None,
     event_type: Optional[EventType] = None,
-    supabase: Client = Depends(get_supabase)
+    repo: EventsRepository = Depends(get_events_repository)
 ):
-    """Get recent events with optional filters"""
+    """
+    Stream the full project_events history as NDJSON or CSV
+
+    Rows are read in keyset-paged chunks and serialized page by page,
+    so memory use does not depend on the size of the history.
+    """
+    pages = repo.iter_event_pages(
+        page_size=EXPORT_PAGE_SIZE,
+        phase=phase,
+        event_type=event_type.value if event_type else None
+    )
+
+    # Read the first page up front so query errors still return a proper status
     try:
-        query = supabase.table("project_events").select("*")
-        
-        if phase:
-            query = query.eq("phase", phase)
-        if event_type:
-            query = query.eq("event_type", event_type.value)
-            
-        result = query.order("created_at", desc=True).limit(limit).execute()
-        return result.data
+        first_page = await anext(pages, None)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def body():
+        if format == "csv":
+            yield _csv_page(first_page or [], header=True)
+        elif first_page:
+            yield _ndjson_page(first_page)
+        async for page in pages:
+            yield _csv_page(page) if format == "csv" else _ndjson_page(page)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="project_events.{format}"'}
+    )
+
 @router.get("/recent", response_model=List[EventResponse])
 async def get_recent_events(
     limit: int = 20,
-    supabase: Client = Depends(get_supabase)
+    repo: EventsRepository = Depends(get_events_repository)
 ):
     """Get most recent events using v_recent_events view"""
     try:
-        result = supabase.table("v_recent_events").select("*").limit(limit).execute()
-        return result.data
+        rows = await repo.recent_events(limit)
+        if FAST_SERIALIZATION:
+            return fast_response(project_rows(rows, EVENT_RESPONSE_FIELDS))
+        return rows
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/timeline", response_model=List[TimelineStats])
 async def get_timeline(
     days: int = 7,
-    supabase: Client = Depends(get_supabase)
+    repo: EventsRepository = Depends(get_events_repository),
+    cache: AsyncTTLCache = Depends(get_events_cache)
 ):
     """Get timeline statistics"""
     try:
-        result = supabase.table("project_timeline")\
-            .select("*")\
-            .order("date", desc=True)\
-            .limit(days)\
-            .execute()
-        return result.data
+        return await cache.get_or_load(
+            ("timeline", days), CACHE_TTLS["timeline"], lambda: repo.timeline(days)
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/health", response_model=SystemHealth)
 async def get_system_health(
-    supabase: Client = Depends(get_supabase)
+    repo: EventsRepository = Depends(get_events_repository),
+    cache: AsyncTTLCache = Depends(get_events_cache)
 ):
     """Get system health status"""
     try:
-        result = supabase.table("v_system_health").select("*").limit(1).execute()
-        if not result.data:
+        health = await cache.get_or_load("health", CACHE_TTLS["health"], repo.system_health)
+        if not health:
             return SystemHealth(
                 total_events_today=0,
                 successful_today=0,
                 success_rate=0.0
             )
-        return result.data[0]
+        return health
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/by-phase")
 async def get_events_by_phase(
-    supabase: Client = Depends(get_supabase)
+    repo: EventsRepository = Depends(get_events_repository),
+    cache: AsyncTTLCache = Depends(get_events_cache)
 ):
     """Get events grouped by phase"""
     try:
-        result = supabase.table("v_events_by_phase").select("*").execute()
-        return result.data
+        return await cache.get_or_load("by_phase", CACHE_TTLS["by_phase"], repo.events_by_phase)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/phase-progress")
 async def get_phase_progress(
-    supabase: Client = Depends(get_supabase)
+    repo: EventsRepository = Depends(get_events_repository),
+    cache: AsyncTTLCache = Depends(get_events_cache)
 ):
     """Get progress by phase"""
     try:
-        result = supabase.table("v_phase_progress").select("*").execute()
-        return result.data
+        return await cache.get_or_load("phase_progress", CACHE_TTLS["phase_progress"], repo.phase_progress)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/cache/stats")
+async def get_cache_stats(cache: AsyncTTLCache = Depends(get_events_cache)):
+    """Hit/miss counters of the dashboard views cache"""
+    return cache.stats()
@@ -0,0 +1,22 @@
+from fastapi.responses import ORJSONResponse
+from typing import Any, Iterable, List, Optional, Sequence
+import os
+
+# Opt-in: shape trusted upstream data into plain dicts and encode with orjson,
+# skipping pydantic validation of responses (requests are still validated)
+FAST_SERIALIZATION = os.environ.get("FAST_SERIALIZATION", "false").lower() == "true"
+
+
+def fast_response(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> ORJSONResponse:
+    """
+    Response for already-shaped content
+
+    Returning a Response bypasses the route's response_model, so content must
+    already have the documented shape.
+    """
+    return ORJSONResponse(content=content, status_code=status_code, headers=headers)
+
+
+def project_rows(rows: Iterable[dict], fields: Sequence[str]) -> List[dict]:
+    """Keep only the response model fields of database rows"""
+    return [{field: row.get(field) for field in fields} for row in rows]
@@ -0,0 +1,280 @@
+"""
+Offline load test for services/api
+
+Starts the Graph and PostgREST stubs and the API under uvicorn, drives a
+weighted mix of /contacts and /events requests from N concurrent workers
+and reports throughput and latency percentiles. Results are written as JSON
+so runs from different commits can be compared.
+
+Run from the services directory:
+
+    python -m benchmarks.run --mix mixed --duration 30 --concurrency 64
+    python -m benchmarks.run --throttle-rate 0.05 --output after.json --compare before.json
+    python -m benchmarks.run --app-env FAST_SERIALIZATION=true
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Union
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+SERVICES_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, weight, method, path, json body); "{contact_id}" is filled per request
+MIXES: Dict[str, List[Tuple[str, int, str, str, Optional[dict]]]] = {
+    "contacts": [
+        ("list_contacts", 50, "GET", "/contacts/?top=50", None),
+        ("get_contact", 35, "GET", "/contacts/{contact_id}", None),
+        ("create_contact", 10, "POST", "/contacts/", {"given_name": "Bench", "surname": "User"}),
+        ("update_contact", 5, "PATCH", "/contacts/{contact_id}", {"job_title": "Benchmarker"}),
+    ],
+    "events": [
+        ("list_events", 40, "GET", "/events/?limit=100", None),
+        ("recent_events", 20, "GET", "/events/recent", None),
+        ("system_health", 20, "GET", "/events/health", None),
+        ("timeline", 10, "GET", "/events/timeline", None),
+        ("create_event", 10, "POST", "/events/", {"event_type": "info", "phase": "bench", "description": "load test"}),
+    ],
+}
+MIXES["mixed"] = MIXES["contacts"] + MIXES["events"]
+
+PERCENTILES = (50, 95, 99)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_uvicorn(app: str, port: int, env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICES_DIR,
+        env=env
+    )
+
+
+async def _wait_ready(url: str, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(samples: List[Tuple[float, Union[int, str]]], elapsed: float) -> dict:
+    """Throughput and latency (ms) of (latency_seconds, status) samples; transport errors carry the exception name"""
+    latencies = sorted(latency * 1000 for latency, _ in samples)
+    statuses: Dict[str, int] = {}
+    for _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for _, status in samples if isinstance(status, str) or status >= 500)
+    result = {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        "statuses": statuses
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(latencies, pct), 2)
+    return result
+
+
+async def drive(base_url: str, mix: str, concurrency: int, duration: float, warmup: float, contact_ids: List[str]) -> dict:
+    """Run the load and return per-operation and overall summaries"""
+    operations = MIXES[mix]
+    weights = [op[1] for op in operations]
+    samples: Dict[str, List[Tuple[float, Union[int, str]]]] = {op[0]: [] for op in operations}
+
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            while True:
+                now = time.monotonic()
+                if now >= stop_at:
+                    return
+                name, _, method, path, body = random.choices(operations, weights)[0]
+                path = path.replace("{contact_id}", random.choice(contact_ids))
+                sent = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                    status = response.status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if now >= measure_from:
+                    samples[name].append((time.perf_counter() - sent, status))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    elapsed = time.monotonic() - measure_from
+    every = [s for op_samples in samples.values() for s in op_samples]
+    return {
+        "total": summarize(every, elapsed),
+        "operations": {name: summarize(op_samples, elapsed) for name, op_samples in samples.items()}
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=SERVICES_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict, baseline: Optional[dict] = None):
+    header = f"{'operation':<16}{'requests':>10}{'errors':>8}{'rps':>10}" + "".join(f"{f'p{p} ms':>11}" for p in PERCENTILES)
+    print(header)
+    print("-" * len(header))
+    rows = list(results["operations"].items()) + [("TOTAL", results["total"])]
+    for name, summary in rows:
+        line = f"{name:<16}{summary['requests']:>10}{summary['errors']:>8}{summary['rps']:>10}"
+        line += "".join(f"{summary[f'p{p}_ms']:>11}" for p in PERCENTILES)
+        print(line)
+        if baseline is not None:
+            base = baseline["operations"].get(name) if name != "TOTAL" else baseline["total"]
+            if base:
+                deltas = [_delta(summary["rps"], base["rps"])] + [
+                    _delta(summary[f"p{p}_ms"], base[f"p{p}_ms"]) for p in PERCENTILES
+                ]
+                print(f"{'  vs baseline':<34}{deltas[0]:>10}" + "".join(f"{d:>11}" for d in deltas[1:]))
+
+
+def _delta(value: float, base: float) -> str:
+    if not base:
+        return "n/a"
+    return f"{(value - base) / base * 100:+.1f}%"
+
+
+async def main(args: argparse.Namespace):
+    graph_port, postgrest_port, api_port = _free_port(), _free_port(), _free_port()
+
+    stub_env = dict(
+        os.environ,
+        BENCH_GRAPH_LATENCY_MS=str(args.graph_latency_ms),
+        BENCH_SUPABASE_LATENCY_MS=str(args.supabase_latency_ms),
+        BENCH_GRAPH_THROTTLE_RATE=str(args.throttle_rate),
+        BENCH_GRAPH_RETRY_AFTER=str(args.retry_after),
+        BENCH_CONTACTS=str(args.contacts),
+        BENCH_EVENTS=str(args.events)
+    )
+    api_env = dict(
+        os.environ,
+        GRAPH_API_BASE=f"http://127.0.0.1:{graph_port}/v1.0",
+        MS_ACCESS_TOKEN="benchmark-token",
+        SUPABASE_URL=f"http://127.0.0.1:{postgrest_port}",
+        SUPABASE_KEY="benchmark.supabase.key"
+    )
+    for item in args.app_env:
+        key, _, value = item.partition("=")
+        api_env[key] = value
+
+    processes = [
+        _start_uvicorn("benchmarks.stubs:graph_app", graph_port, stub_env),
+        _start_uvicorn("benchmarks.stubs:postgrest_app", postgrest_port, stub_env),
+    ]
+    try:
+        await _wait_ready(f"http://127.0.0.1:{graph_port}/docs")
+        await _wait_ready(f"http://127.0.0.1:{postgrest_port}/docs")
+        processes.append(_start_uvicorn("api.main:app", api_port, api_env))
+        await _wait_ready(f"http://127.0.0.1:{api_port}/health")
+
+        contact_ids = [f"contact-{i:06d}" for i in range(args.contacts)]
+        results = await drive(
+            f"http://127.0.0.1:{api_port}",
+            args.mix,
+            args.concurrency,
+            args.duration,
+            args.warmup,
+            contact_ids
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "mix": args.mix,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "graph_latency_ms": args.graph_latency_ms,
+            "supabase_latency_ms": args.supabase_latency_ms,
+            "throttle_rate": args.throttle_rate,
+            "retry_after": args.retry_after,
+            "contacts": args.contacts,
+            "events": args.events,
+            "app_env": args.app_env
+        },
+        **results
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline load test for services/api")
+    parser.add_argument("--mix", choices=sorted(MIXES), default="mixed", help="Traffic mix")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent client workers")
+    parser.add_argument("--duration", type=float, default=20, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Unmeasured seconds before measuring")
+    parser.add_argument("--graph-latency-ms", type=float, default=50, help="Mean Graph stub latency")
+    parser.add_argument("--supabase-latency-ms", type=float, default=20, help="Mean PostgREST stub latency")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of Graph calls answered 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds on stub 429s")
+    parser.add_argument("--contacts", type=int, default=2000, help="Contacts in the Graph stub")
+    parser.add_argument("--events", type=int, default=5000, help="Rows in the PostgREST stub")
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Extra environment for the API process (repeatable)")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--compare", help="Baseline results JSON to diff against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,182 @@
+"""
+Local stand-ins for Microsoft Graph and Supabase (PostgREST) used by the benchmarks
+
+Both apps are configured through environment variables so they can be
+started with plain uvicorn:
+
+    BENCH_GRAPH_LATENCY_MS / BENCH_SUPABASE_LATENCY_MS  mean added latency
+    BENCH_LATENCY_JITTER                                 +/- fraction of it
+    BENCH_GRAPH_THROTTLE_RATE                            share of Graph calls answered 429
+    BENCH_GRAPH_RETRY_AFTER                              Retry-After sent with those 429s
+    BENCH_CONTACTS / BENCH_EVENTS                        dataset sizes
+"""
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+import asyncio
+import itertools
+import os
+import random
+
+GRAPH_LATENCY = float(os.environ.get("BENCH_GRAPH_LATENCY_MS", "50")) / 1000
+SUPABASE_LATENCY = float(os.environ.get("BENCH_SUPABASE_LATENCY_MS", "20")) / 1000
+LATENCY_JITTER = float(os.environ.get("BENCH_LATENCY_JITTER", "0.5"))
+THROTTLE_RATE = float(os.environ.get("BENCH_GRAPH_THROTTLE_RATE", "0"))
+RETRY_AFTER = os.environ.get("BENCH_GRAPH_RETRY_AFTER", "1")
+CONTACT_COUNT = int(os.environ.get("BENCH_CONTACTS", "2000"))
+EVENT_COUNT = int(os.environ.get("BENCH_EVENTS", "5000"))
+
+
+async def _delay(mean: float):
+    if mean > 0:
+        await asyncio.sleep(mean * random.uniform(1 - LATENCY_JITTER, 1 + LATENCY_JITTER))
+
+
+# ==========================================
+# Microsoft Graph
+# ==========================================
+
+def _contact(i: int) -> dict:
+    return {
+        "id": f"contact-{i:06d}",
+        "givenName": f"Given{i}",
+        "surname": f"Surname{i}",
+        "displayName": f"Given{i} Surname{i}",
+        "emailAddresses": [{"address": f"user{i}@example.com", "name": f"Given{i} Surname{i}"}],
+        "mobilePhone": f"+1555{i:07d}",
+        "businessPhones": [],
+        "homePhones": [],
+        "companyName": "Example Ltd",
+        "jobTitle": "Engineer",
+        "createdDateTime": "2024-01-01T00:00:00Z",
+        "lastModifiedDateTime": "2024-06-01T00:00:00Z"
+    }
+
+
+CONTACTS = {c["id"]: c for c in (_contact(i) for i in range(CONTACT_COUNT))}
+CONTACT_IDS = list(CONTACTS)
+_new_ids = itertools.count(CONTACT_COUNT)
+
+graph_app = FastAPI(title="Graph stub")
+graph = APIRouter(prefix="/v1.0")
+
+
+@graph_app.middleware("http")
+async def graph_latency_and_throttling(request: Request, call_next):
+    await _delay(GRAPH_LATENCY)
+    if THROTTLE_RATE and random.random() < THROTTLE_RATE:
+        return JSONResponse(
+            {"error": {"code": "TooManyRequests", "message": "Throttled by stub"}},
+            status_code=429,
+            headers={"Retry-After": RETRY_AFTER}
+        )
+    return await call_next(request)
+
+
+@graph.get("/me")
+async def graph_me():
+    return {"displayName": "Benchmark User", "mail": "bench@example.com"}
+
+
+@graph.get("/me/contacts")
+async def graph_list_contacts(request: Request):
+    top = int(request.query_params.get("$top", "10"))
+    skip = int(request.query_params.get("$skip", "0"))
+    body = {"value": [CONTACTS[cid] for cid in CONTACT_IDS[skip:skip + top]]}
+    if skip + top < len(CONTACT_IDS):
+        body["@odata.nextLink"] = f"{request.base_url}v1.0/me/contacts?$top={top}&$skip={skip + top}"
+    return body
+
+
+@graph.get("/me/contacts/{contact_id}")
+async def graph_get_contact(contact_id: str):
+    contact = CONTACTS.get(contact_id)
+    if contact is None:
+        return JSONResponse({"error": {"code": "ErrorItemNotFound"}}, status_code=404)
+    return contact
+
+
+@graph.post("/me/contacts")
+async def graph_create_contact(request: Request):
+    contact = dict(await request.json(), id=f"contact-{next(_new_ids):06d}")
+    return JSONResponse(contact, status_code=201)
+
+
+@graph.patch("/me/contacts/{contact_id}")
+async def graph_update_contact(contact_id: str, request: Request):
+    contact = CONTACTS.get(contact_id)
+    if contact is None:
+        return JSONResponse({"error": {"code": "ErrorItemNotFound"}}, status_code=404)
+    return dict(contact, **(await request.json()))
+
+
+@graph.delete("/me/contacts/{contact_id}")
+async def graph_delete_contact(contact_id: str):
+    return Response(status_code=204)
+
+
+@graph.post("/$batch")
+async def graph_batch(request: Request):
+    responses = []
+    for item in (await request.json())["requests"]:
+        if item["method"] == "POST":
+            responses.append({"id": item["id"], "status": 201, "body": dict(item.get("body") or {}, id=f"contact-{next(_new_ids):06d}")})
+        elif item["method"] == "DELETE":
+            responses.append({"id": item["id"], "status": 204})
+        else:
+            responses.append({"id": item["id"], "status": 200, "body": CONTACTS.get(item["url"].rsplit("/", 1)[-1], {})})
+    return {"responses": responses}
+
+
+graph_app.include_router(graph)
+
+
+# ==========================================
+# Supabase (PostgREST)
+# ==========================================
+
+_now = datetime.now(timezone.utc)
+EVENTS = [
+    {
+        "id": EVENT_COUNT - i,
+        "created_at": (_now - timedelta(seconds=i)).isoformat(),
+        "event_type": "step_complete" if i % 10 else "error",
+        "phase": f"phase_{i % 4 + 1}",
+        "step_name": f"step_{i % 25}",
+        "description": "Benchmark event",
+        "success": bool(i % 10),
+        "metadata": {"source": "benchmark"}
+    }
+    for i in range(EVENT_COUNT)
+]
+VIEWS = {
+    "v_system_health": [{"total_events_today": EVENT_COUNT, "successful_today": EVENT_COUNT * 9 // 10, "success_rate": 90.0}],
+    "project_timeline": [
+        {"date": (_now - timedelta(days=d)).date().isoformat(), "total_events": 100, "successful_events": 90,
+         "failed_events": 10, "phases_active": ["phase_1", "phase_2"]}
+        for d in range(30)
+    ],
+    "v_events_by_phase": [{"phase": f"phase_{p}", "total": EVENT_COUNT // 4} for p in range(1, 5)],
+    "v_phase_progress": [{"phase": f"phase_{p}", "progress": p * 25} for p in range(1, 5)]
+}
+_event_ids = itertools.count(EVENT_COUNT + 1)
+
+postgrest_app = FastAPI(title="PostgREST stub")
+
+
+@postgrest_app.get("/rest/v1/{table}")
+async def postgrest_select(table: str, request: Request):
+    await _delay(SUPABASE_LATENCY)
+    rows = EVENTS if table in ("project_events", "v_recent_events") else VIEWS.get(table, [])
+    # Filters and keyset conditions are not evaluated; only the page size matters here
+    limit = int(request.query_params.get("limit", str(len(rows))))
+    return rows[:limit]
+
+
+@postgrest_app.post("/rest/v1/{table}")
+async def postgrest_insert(table: str, request: Request):
+    await _delay(SUPABASE_LATENCY)
+    body = await request.json()
+    rows = body if isinstance(body, list) else [body]
+    created_at = datetime.now(timezone.utc).isoformat()
+    return JSONResponse([dict(row, id=next(_event_ids), created_at=created_at) for row in rows], status_code=201)
@@ -0,0 +1,166 @@
+"""
+Tests for the async TTL cache: single-flight loads, invalidation and eviction
+"""
+
+import asyncio
+
+import pytest
+
+from api.cache import AsyncTTLCache
+
+
+class Loader:
+    """Counts calls and finishes when released"""
+
+    def __init__(self, value="value", error=None):
+        self.value = value
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class TestSingleFlight:
+    """Concurrent misses share one loader call"""
+
+    def test_concurrent_callers_share_one_load(self):
+        async def run():
+            cache = AsyncTTLCache()
+            loader = Loader()
+            callers = [asyncio.create_task(cache.get_or_load("k", 60, loader)) for _ in range(10)]
+            await asyncio.sleep(0)
+            loader.release.set()
+            results = await asyncio.gather(*callers)
+            # Now cached: no further loads
+            again = await cache.get_or_load("k", 60, loader)
+            return cache, loader, results, again
+
+        cache, loader, results, again = asyncio.run(run())
+        assert loader.calls == 1
+        assert results == ["value"] * 10
+        assert again == "value"
+        assert cache.stats()["misses"] == 1
+        assert cache.stats()["coalesced"] == 9
+        assert cache.stats()["hits"] == 1
+
+    def test_failed_load_reaches_every_waiter_and_is_not_cached(self):
+        async def run():
+            cache = AsyncTTLCache()
+            failing = Loader(error=RuntimeError("upstream down"))
+            callers = [asyncio.create_task(cache.get_or_load("k", 60, failing)) for _ in range(5)]
+            await asyncio.sleep(0)
+            failing.release.set()
+            outcomes = await asyncio.gather(*callers, return_exceptions=True)
+
+            retry = Loader("fresh")
+            retry.release.set()
+            return failing, outcomes, await cache.get_or_load("k", 60, retry), retry
+
+        failing, outcomes, value, retry = asyncio.run(run())
+        assert failing.calls == 1
+        assert all(isinstance(o, RuntimeError) and str(o) == "upstream down" for o in outcomes)
+        assert value == "fresh"
+        assert retry.calls == 1
+
+    def test_cancelled_caller_does_not_cancel_the_load(self):
+        async def run():
+            cache = AsyncTTLCache()
+            loader = Loader()
+            first = asyncio.create_task(cache.get_or_load("k", 60, loader))
+            second = asyncio.create_task(cache.get_or_load("k", 60, loader))
+            await asyncio.sleep(0)
+            first.cancel()
+            loader.release.set()
+            return await second, first.cancelled(), loader.calls
+
+        assert asyncio.run(run()) == ("value", True, 1)
+
+
+class TestInvalidate:
+    """invalidate() drops entries and stale in-flight results"""
+
+    def test_load_in_flight_during_invalidate_is_not_stored(self):
+        async def run():
+            cache = AsyncTTLCache()
+            stale = Loader("stale")
+            waiter = asyncio.create_task(cache.get_or_load("k", 60, stale))
+            await asyncio.sleep(0)
+            cache.invalidate()
+            stale.release.set()
+            # The caller that started the load still gets its result
+            first = await waiter
+
+            fresh = Loader("fresh")
+            fresh.release.set()
+            return first, await cache.get_or_load("k", 60, fresh), fresh.calls
+
+        assert asyncio.run(run()) == ("stale", "fresh", 1)
+
+    def test_invalidate_drops_entries(self):
+        async def run():
+            cache = AsyncTTLCache()
+            loader = Loader()
+            loader.release.set()
+            await cache.get_or_load("k", 60, loader)
+            cache.invalidate()
+            await cache.get_or_load("k", 60, loader)
+            return loader.calls, cache.stats()["invalidations"]
+
+        assert asyncio.run(run()) == (2, 1)
+
+
+class TestExpiryAndEviction:
+    """TTL expiry and least-recently-used eviction at max_entries"""
+
+    def test_expired_entry_is_reloaded(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr("api.cache.time.monotonic", lambda: now[0])
+
+        async def run():
+            cache = AsyncTTLCache()
+            loader = Loader()
+            loader.release.set()
+            await cache.get_or_load("k", 5, loader)
+            now[0] += 4
+            await cache.get_or_load("k", 5, loader)
+            calls_before_expiry = loader.calls
+            now[0] += 2
+            await cache.get_or_load("k", 5, loader)
+            return calls_before_expiry, loader.calls
+
+        assert asyncio.run(run()) == (1, 2)
+
+    def test_zero_ttl_is_not_cached(self):
+        async def run():
+            cache = AsyncTTLCache()
+            loader = Loader()
+            loader.release.set()
+            await cache.get_or_load("k", 0, loader)
+            await cache.get_or_load("k", 0, loader)
+            return loader.calls
+
+        assert asyncio.run(run()) == 2
+
+    def test_least_recently_used_is_evicted(self):
+        async def run():
+            cache = AsyncTTLCache(max_entries=3)
+            loaders = {key: Loader(key) for key in "abcd"}
+            for loader in loaders.values():
+                loader.release.set()
+            for key in "abc":
+                await cache.get_or_load(key, 60, loaders[key])
+            # Touch "a" so "b" becomes the least recently used
+            await cache.get_or_load("a", 60, loaders["a"])
+            await cache.get_or_load("d", 60, loaders["d"])
+            return cache, loaders
+
+        cache, loaders = asyncio.run(run())
+        assert list(cache._entries) == ["c", "a", "d"]
+        assert cache.stats()["entries"] == 3
+        assert loaders["a"].calls == 1
@@ -0,0 +1,156 @@
+"""
+Tests for the delta-synced contacts mirror
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from api.clients.graph import MSGraphClient
+from api.contacts_mirror import ContactsMirror
+from benchmarks.stubs import _contact
+
+DELTA = "https://graph.test/v1.0/me/contacts/delta"
+
+
+class DeltaStub:
+    """Answers delta requests from a {request key: response} table, recording the keys"""
+
+    def __init__(self, monkeypatch, tmp_path):
+        for name in ("MS_CLIENT_ID", "MS_CLIENT_SECRET", "MS_TENANT_ID", "MS_USER_ID"):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv("MS_ACCESS_TOKEN", "token")
+        monkeypatch.setenv("CONTACTS_MIRROR_PATH", str(tmp_path / "contacts.sqlite3"))
+        self.responses = {}
+        self.requested = []
+
+        graph = MSGraphClient()
+        graph._http = httpx.AsyncClient(base_url="https://graph.test/v1.0", transport=httpx.MockTransport(self.handle))
+        self.graph = graph
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        params = request.url.params
+        key = params.get("$deltatoken") or params.get("$skiptoken") or "start"
+        self.requested.append(key)
+        status, body = self.responses[key]
+        return httpx.Response(status, json=body)
+
+    def page(self, key: str, items, next_token: str = None, delta_token: str = None):
+        body = {"value": items}
+        if next_token:
+            body["@odata.nextLink"] = f"{DELTA}?$skiptoken={next_token}"
+        if delta_token:
+            body["@odata.deltaLink"] = f"{DELTA}?$deltatoken={delta_token}"
+        self.responses[key] = (200, body)
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    return DeltaStub(monkeypatch, tmp_path)
+
+
+def names(mirror: ContactsMirror):
+    return [contact["displayName"] for contact in mirror.all()]
+
+
+class TestSync:
+    """Delta rounds apply changes and removals to the mirror"""
+
+    def test_full_then_delta(self, stub):
+        stub.page("start", [_contact(2), _contact(1)], next_token="p2")
+        stub.page("p2", [_contact(3)], delta_token="d1")
+        mirror = ContactsMirror(stub.graph)
+
+        asyncio.run(mirror.sync())
+
+        assert stub.requested == ["start", "p2"]
+        assert names(mirror) == ["Given1 Surname1", "Given2 Surname2", "Given3 Surname3"]
+        assert mirror.delta_link == f"{DELTA}?$deltatoken=d1"
+        assert mirror.ready
+
+        stub.page("d1", [
+            dict(_contact(2), displayName="Aaron Renamed"),
+            {"id": _contact(1)["id"], "@removed": {"reason": "deleted"}},
+            _contact(4),
+            # Added and removed within the same round
+            _contact(5),
+            {"id": _contact(5)["id"], "@removed": {"reason": "deleted"}},
+        ], delta_token="d2")
+
+        asyncio.run(mirror.sync())
+
+        assert stub.requested[2:] == ["d1"]
+        assert names(mirror) == ["Aaron Renamed", "Given3 Surname3", "Given4 Surname4"]
+        assert mirror.get(_contact(1)["id"]) is None
+        assert mirror.list_page(top=10, search="aaron")[0] == [mirror.get(_contact(2)["id"])]
+        assert mirror.delta_link == f"{DELTA}?$deltatoken=d2"
+
+    def test_expired_delta_link_falls_back_to_full_resync(self, stub):
+        stub.page("start", [_contact(1), _contact(2)], delta_token="d1")
+        mirror = ContactsMirror(stub.graph)
+        asyncio.run(mirror.sync())
+
+        stub.responses["d1"] = (410, {"error": {"code": "SyncStateNotFound"}})
+        stub.page("start", [_contact(2), _contact(3)], delta_token="d2")
+
+        asyncio.run(mirror.sync())
+
+        assert stub.requested == ["start", "d1", "start"]
+        # Contact 1 is missing from the full enumeration, so it is dropped
+        assert names(mirror) == ["Given2 Surname2", "Given3 Surname3"]
+        assert mirror.delta_link == f"{DELTA}?$deltatoken=d2"
+
+    def test_error_leaves_mirror_unchanged(self, stub):
+        stub.page("start", [_contact(1)], delta_token="d1")
+        mirror = ContactsMirror(stub.graph)
+        asyncio.run(mirror.sync())
+        synced_at = mirror.synced_at
+
+        stub.responses["d1"] = (503, {"error": {"code": "ServiceUnavailable"}})
+        stub.graph.retry_policy.max_retries = 0
+        with pytest.raises(RuntimeError):
+            asyncio.run(mirror.sync())
+
+        assert names(mirror) == ["Given1 Surname1"]
+        assert mirror.synced_at == synced_at
+        assert mirror.delta_link == f"{DELTA}?$deltatoken=d1"
+
+
+class TestSnapshot:
+    """A new mirror restores contacts and the delta link from SQLite"""
+
+    def test_restore_after_full_and_delta(self, stub):
+        stub.page("start", [_contact(1), _contact(2), _contact(3)], delta_token="d1")
+        stub.page("d1", [{"id": _contact(2)["id"], "@removed": {}}, dict(_contact(3), jobTitle="Lead")], delta_token="d2")
+        mirror = ContactsMirror(stub.graph)
+        asyncio.run(mirror.sync())
+        asyncio.run(mirror.sync())
+
+        restored = ContactsMirror(stub.graph)
+        assert not restored.ready
+        restored._load_snapshot()
+
+        assert restored.ready
+        assert restored.all() == mirror.all()
+        assert restored.get(_contact(3)["id"])["jobTitle"] == "Lead"
+        assert restored.delta_link == f"{DELTA}?$deltatoken=d2"
+        assert restored.synced_at == mirror.synced_at
+
+        # The restored mirror resumes from the stored delta link
+        stub.page("d2", [_contact(4)], delta_token="d3")
+        asyncio.run(restored.sync())
+        assert stub.requested[-1] == "d2"
+        assert len(restored.all()) == 3
+
+    def test_full_resync_replaces_snapshot(self, stub):
+        stub.page("start", [_contact(1), _contact(2)], delta_token="d1")
+        mirror = ContactsMirror(stub.graph)
+        asyncio.run(mirror.sync())
+        stub.responses["d1"] = (410, {})
+        stub.page("start", [_contact(3)], delta_token="d2")
+        asyncio.run(mirror.sync())
+
+        restored = ContactsMirror(stub.graph)
+        restored._load_snapshot()
+        assert names(restored) == ["Given3 Surname3"]
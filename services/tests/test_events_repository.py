@@ -0,0 +1,108 @@
+"""
+Tests for event keyset cursors and the queries built from them
+"""
+
+import asyncio
+import base64
+import json
+
+import pytest
+from fastapi import HTTPException
+from postgrest import SyncPostgrestClient
+
+from api.repositories.events import EventsRepository, decode_cursor, encode_cursor
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+class RecordingProvider:
+    """Runs query builders against a real PostgREST builder and records them"""
+
+    def __init__(self, pages=None):
+        self.db = SyncPostgrestClient("http://db.test")
+        self.queries = []
+        self.pages = list(pages or [])
+
+    async def execute(self, build_query, timeout=None, operation="query"):
+        self.queries.append(build_query(self.db))
+        data = self.pages.pop(0) if self.pages else []
+        return type("Result", (), {"data": data})()
+
+
+class TestCursor:
+    """Cursors round-trip and tampered ones are rejected"""
+
+    def test_round_trip(self):
+        row = {"created_at": "2024-01-15T10:30:00.123456+00:00", "id": 42}
+        assert decode_cursor(encode_cursor(row)) == ("2024-01-15T10:30:00.123456+00:00", 42)
+
+    @pytest.mark.parametrize("created_at,expected", [
+        ("2024-01-15T10:30:00Z", "2024-01-15T10:30:00+00:00"),
+        ("2024-01-15 10:30:00.5+03:00", "2024-01-15T10:30:00.500000+03:00"),
+        ("2024-01-15", "2024-01-15T00:00:00"),
+    ])
+    def test_created_at_is_canonical(self, created_at, expected):
+        assert decode_cursor(raw_cursor([created_at, 1])) == (expected, 1)
+
+    @pytest.mark.parametrize("cursor", [
+        "not base64 at all!",
+        raw_cursor("just a string"),
+        raw_cursor([]),
+        raw_cursor(["2024-01-15T10:30:00+00:00"]),
+        raw_cursor(["2024-01-15T10:30:00+00:00", 1, 2]),
+        raw_cursor(["2024-01-15T10:30:00+00:00", "1 or 1=1"]),
+        raw_cursor(["2024-01-15T10:30:00+00:00", None]),
+        raw_cursor([None, 1]),
+        raw_cursor([20240115, 1]),
+        raw_cursor(['2024-01-15",id.gt.0)', 1]),
+        raw_cursor(['2024-01-15T10:30:00+00:00",and(id.gt.0', 1]),
+        raw_cursor({"created_at": "2024-01-15", "id": 1}),
+    ])
+    def test_tampered_cursor_is_400(self, cursor):
+        with pytest.raises(HTTPException) as e:
+            decode_cursor(cursor)
+        assert e.value.status_code == 400
+        assert e.value.detail == "Invalid cursor"
+
+
+class TestKeysetFilter:
+    """list_events turns a cursor into the (created_at, id) keyset condition"""
+
+    def test_filter_for_equal_created_at(self):
+        provider = RecordingProvider()
+        after = decode_cursor(encode_cursor({"created_at": "2024-01-15T10:30:00+00:00", "id": 7}))
+
+        asyncio.run(EventsRepository(provider).list_events(limit=5, phase="build", after=after))
+
+        [query] = provider.queries
+        params = dict(query.params)
+        assert params["or"] == (
+            '(created_at.lt."2024-01-15T10:30:00+00:00",'
+            'and(created_at.eq."2024-01-15T10:30:00+00:00",id.lt.7))'
+        )
+        assert params["phase"] == "eq.build"
+        assert params["order"] == "created_at.desc,id.desc"
+        assert params["limit"] == "5"
+
+    def test_first_page_has_no_keyset_filter(self):
+        provider = RecordingProvider()
+        asyncio.run(EventsRepository(provider).list_events(limit=5))
+        assert "or" not in dict(provider.queries[0].params)
+
+    def test_export_pages_until_empty(self):
+        # Short pages (PostgREST max-rows below page_size) do not end the walk
+        pages = [
+            [{"created_at": "2024-01-03T00:00:00+00:00", "id": 3}],
+            [{"created_at": "2024-01-02T00:00:00+00:00", "id": 2}],
+            [],
+        ]
+        provider = RecordingProvider(pages)
+
+        async def collect():
+            return [page async for page in EventsRepository(provider).iter_event_pages(page_size=1000)]
+
+        assert [len(page) for page in asyncio.run(collect())] == [1, 1]
+        assert len(provider.queries) == 3
+        assert 'id.lt.2' in dict(provider.queries[2].params)["or"]
@@ -0,0 +1,262 @@
+"""
+Tests for the Microsoft Graph client
+"""
+
+import asyncio
+import random
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from api.clients.graph import MSGraphClient, pack_batches
+
+
+def make_client(monkeypatch, handler=None, **env) -> MSGraphClient:
+    for name in ("MS_ACCESS_TOKEN", "MS_CLIENT_ID", "MS_CLIENT_SECRET", "MS_TENANT_ID", "MS_USER_ID"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    client = MSGraphClient()
+    if handler is not None:
+        client._http = httpx.AsyncClient(base_url="https://graph.test/v1.0", transport=httpx.MockTransport(handler))
+    return client
+
+
+def in_flight(client: MSGraphClient) -> int:
+    return sum(status["in_flight"] for status in client.limiters.status().values())
+
+
+class TestRequestSlots:
+    """Limiter slots are given back however a request ends"""
+
+    def test_config_error_releases_slot(self, monkeypatch):
+        client = make_client(monkeypatch)
+
+        async def run():
+            # More calls than the initial concurrency limit: a leaked slot would hang here
+            for _ in range(20):
+                with pytest.raises(HTTPException):
+                    await asyncio.wait_for(client.request("GET", "/me/contacts"), timeout=1)
+
+        asyncio.run(run())
+        assert in_flight(client) == 0
+
+    def test_cancelled_request_releases_slot(self, monkeypatch):
+        async def run():
+            sent = asyncio.Event()
+
+            async def handler(request):
+                sent.set()
+                await asyncio.sleep(60)
+
+            client = make_client(monkeypatch, handler, MS_ACCESS_TOKEN="token")
+            task = asyncio.create_task(client.request("GET", "/me/contacts"))
+            await sent.wait()
+            assert in_flight(client) == 1
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            return in_flight(client)
+
+        assert asyncio.run(run()) == 0
+
+    def test_success_releases_slot(self, monkeypatch):
+        async def run():
+            client = make_client(monkeypatch, lambda request: httpx.Response(200, json={}), MS_ACCESS_TOKEN="token")
+            response = await client.request("GET", "/me/contacts")
+            return response.status_code, in_flight(client)
+
+        assert asyncio.run(run()) == (200, 0)
+
+
+APP_ONLY = {"MS_CLIENT_ID": "app", "MS_CLIENT_SECRET": "secret", "MS_TENANT_ID": "tenant"}
+
+
+def app_only_client(monkeypatch, sent, **env) -> MSGraphClient:
+    """App-only client with a fixed token, recording the paths it sends"""
+    def handler(request):
+        sent.append(request.url.raw_path.decode())
+        return httpx.Response(200, json={})
+
+    client = make_client(monkeypatch, handler, **APP_ONLY, **env)
+
+    async def get_token():
+        return "app-token"
+
+    client.token_provider.get_token = get_token
+    return client
+
+
+class TestPathResolution:
+    """/me needs a mailbox when the token is app-only"""
+
+    def test_me_without_user_id_is_config_error(self, monkeypatch):
+        sent = []
+        client = app_only_client(monkeypatch, sent)
+
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(client.request("GET", "/me/contacts"))
+        assert e.value.status_code == 500
+        assert "MS_USER_ID" in e.value.detail
+        assert sent == []
+        assert in_flight(client) == 0
+
+    def test_me_is_rewritten_to_user(self, monkeypatch):
+        sent = []
+        client = app_only_client(monkeypatch, sent, MS_USER_ID="ops@example.com")
+
+        asyncio.run(client.request("GET", "/me/contacts?$top=5"))
+        asyncio.run(client.request("GET", "/me"))
+        assert sent == ["/v1.0/users/ops@example.com/contacts?$top=5", "/v1.0/users/ops@example.com"]
+
+    def test_other_paths_do_not_need_user_id(self, monkeypatch):
+        sent = []
+        client = app_only_client(monkeypatch, sent)
+
+        asyncio.run(client.request("GET", "/users/ops@example.com/contacts"))
+        asyncio.run(client.request("GET", "/measurements"))
+        assert sent == ["/v1.0/users/ops@example.com/contacts", "/v1.0/measurements"]
+
+    def test_delegated_token_keeps_me(self, monkeypatch):
+        sent = []
+
+        def handler(request):
+            sent.append(request.url.raw_path.decode())
+            return httpx.Response(200, json={})
+
+        client = make_client(monkeypatch, handler, MS_ACCESS_TOKEN="token")
+        asyncio.run(client.request("GET", "/me/contacts"))
+        assert sent == ["/v1.0/me/contacts"]
+
+
+def random_requests(rng: random.Random, n: int, link_rate: float = 0.3):
+    """Batch items where some depend on one or two earlier items"""
+    requests = []
+    for i in range(n):
+        item = {"id": str(i), "method": "GET", "url": f"/me/contacts/{i}"}
+        if i and rng.random() < link_rate:
+            item["dependsOn"] = sorted({str(rng.randrange(i)) for _ in range(rng.randint(1, 2))})
+        requests.append(item)
+    return requests
+
+
+def reference_groups(requests):
+    """Connected components of the dependsOn graph, by flood fill"""
+    neighbours = {item["id"]: set() for item in requests}
+    for item in requests:
+        for dep in item.get("dependsOn", []):
+            neighbours[item["id"]].add(dep)
+            neighbours[dep].add(item["id"])
+    groups, seen = [], set()
+    for item in requests:
+        if item["id"] in seen:
+            continue
+        group, stack = set(), [item["id"]]
+        while stack:
+            node = stack.pop()
+            if node not in group:
+                group.add(node)
+                stack.extend(neighbours[node] - group)
+        seen |= group
+        groups.append(group)
+    return groups
+
+
+class TestPackBatches:
+    """Dependency chains stay together and calls respect the size limit"""
+
+    @pytest.mark.parametrize("seed", range(10))
+    @pytest.mark.parametrize("limit", [5, 20])
+    def test_matches_reference_groups(self, seed, limit):
+        rng = random.Random(seed)
+        requests = random_requests(rng, 60, link_rate=0.15 if limit == 5 else 0.3)
+        groups = reference_groups(requests)
+        if max(len(group) for group in groups) > limit:
+            with pytest.raises(ValueError):
+                pack_batches(requests, limit)
+            return
+
+        batches = pack_batches(requests, limit)
+
+        ids = [item["id"] for batch in batches for item in batch]
+        assert sorted(ids) == sorted(item["id"] for item in requests)
+        assert all(len(batch) <= limit for batch in batches)
+        batch_of = {item["id"]: b for b, batch in enumerate(batches) for item in batch}
+        for group in groups:
+            assert len({batch_of[item_id] for item_id in group}) == 1
+        # Request order is kept inside each dependency group
+        order = {item["id"]: i for i, item in enumerate(requests)}
+        for batch in batches:
+            for group in groups:
+                positions = [order[item["id"]] for item in batch if item["id"] in group]
+                assert positions == sorted(positions)
+
+    def test_group_larger_than_limit(self):
+        requests = [{"id": "0", "method": "GET", "url": "/me"}] + [
+            {"id": str(i), "method": "GET", "url": "/me", "dependsOn": [str(i - 1)]} for i in range(1, 4)
+        ]
+        with pytest.raises(ValueError):
+            pack_batches(requests, 3)
+
+
+class TestThrottledBatchItems:
+    """Throttled items and their failed dependents are retried"""
+
+    @pytest.mark.parametrize("seed", range(10))
+    def test_matches_reference(self, monkeypatch, seed):
+        rng = random.Random(seed)
+        requests = random_requests(rng, 40)
+        responses = {}
+        for item in requests:
+            status = rng.choice([200, 200, 201, 429, 404])
+            if status == 429:
+                responses[item["id"]] = {
+                    "id": item["id"], "status": 429, "headers": {"Retry-After": str(rng.randint(1, 9))}
+                }
+            else:
+                responses[item["id"]] = {"id": item["id"], "status": status}
+        # Items depending on a failed item fail with 424
+        failed = set()
+        for item in requests:
+            if failed.intersection(item.get("dependsOn", [])) or responses[item["id"]]["status"] == 429:
+                if responses[item["id"]]["status"] != 429:
+                    responses[item["id"]] = {"id": item["id"], "status": 424}
+                failed.add(item["id"])
+
+        client = make_client(monkeypatch, MS_ACCESS_TOKEN="token")
+        retry, delay = asyncio.run(client._throttled_batch_items(requests, responses, 0))
+
+        throttled = {i for i, r in responses.items() if r["status"] == 429}
+        expected = set(throttled)
+        for item in requests:
+            # Requests are in dependency order, so one pass reaches every dependent
+            if responses[item["id"]]["status"] == 424 and expected.intersection(item["dependsOn"]):
+                expected.add(item["id"])
+
+        if not throttled:
+            assert (retry, delay) == ([], None)
+            return
+        assert [item["id"] for item in retry] == [item["id"] for item in requests if item["id"] in expected]
+        assert delay == max(float(responses[i]["headers"]["Retry-After"]) for i in throttled)
+        # Only prerequisites that are sent again stay in dependsOn
+        original = {item["id"]: item for item in requests}
+        for item in retry:
+            deps = [d for d in original[item["id"]].get("dependsOn", []) if d in expected]
+            if deps:
+                assert item["dependsOn"] == deps
+            else:
+                assert "dependsOn" not in item
+
+    def test_retry_after_above_max_gives_up(self, monkeypatch):
+        client = make_client(monkeypatch, MS_ACCESS_TOKEN="token")
+        client.retry_policy.retry_after_max = 5
+        requests = [{"id": "1", "method": "GET", "url": "/me"}]
+        responses = {"1": {"id": "1", "status": 429, "headers": {"Retry-After": "30"}}}
+        assert asyncio.run(client._throttled_batch_items(requests, responses, 0)) == ([], None)
+
+    def test_nothing_throttled(self, monkeypatch):
+        client = make_client(monkeypatch, MS_ACCESS_TOKEN="token")
+        requests = [{"id": "1", "method": "GET", "url": "/me"}]
+        responses = {"1": {"id": "1", "status": 200}}
+        assert asyncio.run(client._throttled_batch_items(requests, responses, 0)) == ([], None)
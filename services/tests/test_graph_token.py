@@ -0,0 +1,155 @@
+"""
+Tests for app-only Graph token caching and renewal
+"""
+
+import asyncio
+import itertools
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from api.clients.graph import MSGraphClient
+from api.clients.graph_token import GraphTokenProvider
+
+
+class TokenEndpoint:
+    """Issues tok-1, tok-2, ...; each request waits until `release` is set"""
+
+    def __init__(self, expires_in: int = 3600, status: int = 200):
+        self.expires_in = expires_in
+        self.status = status
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.release.set()
+        self._numbers = itertools.count(1)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await self.release.wait()
+        if self.status != 200:
+            return httpx.Response(self.status, json={"error": "invalid_client"})
+        return httpx.Response(200, json={
+            "access_token": f"tok-{next(self._numbers)}",
+            "token_type": "Bearer",
+            "expires_in": self.expires_in
+        })
+
+
+def make_provider(endpoint: TokenEndpoint) -> GraphTokenProvider:
+    provider = GraphTokenProvider("app", "secret", "tenant")
+    provider._http = httpx.AsyncClient(transport=httpx.MockTransport(endpoint.handle))
+    return provider
+
+
+class TestGetToken:
+    """Concurrent callers share one token request and the cached token"""
+
+    def test_single_in_flight_fetch(self):
+        async def run():
+            endpoint = TokenEndpoint()
+            endpoint.release.clear()
+            provider = make_provider(endpoint)
+
+            callers = [asyncio.create_task(provider.get_token()) for _ in range(20)]
+            await asyncio.sleep(0.01)
+            endpoint.release.set()
+            tokens = await asyncio.gather(*callers)
+
+            assert await provider.get_token() == "tok-1"
+            return tokens, endpoint.calls
+
+        tokens, calls = asyncio.run(run())
+        assert tokens == ["tok-1"] * 20
+        assert calls == 1
+
+    def test_cancelled_caller_does_not_cancel_fetch(self):
+        async def run():
+            endpoint = TokenEndpoint()
+            endpoint.release.clear()
+            provider = make_provider(endpoint)
+
+            first = asyncio.create_task(provider.get_token())
+            second = asyncio.create_task(provider.get_token())
+            await asyncio.sleep(0.01)
+            first.cancel()
+            endpoint.release.set()
+            return await second, endpoint.calls
+
+        assert asyncio.run(run()) == ("tok-1", 1)
+
+    def test_failed_fetch_is_502_and_retried(self):
+        async def run():
+            endpoint = TokenEndpoint(status=401)
+            provider = make_provider(endpoint)
+            with pytest.raises(HTTPException) as e:
+                await provider.get_token()
+            assert e.value.status_code == 502
+
+            endpoint.status = 200
+            return await provider.get_token(), endpoint.calls
+
+        assert asyncio.run(run()) == ("tok-1", 2)
+
+    def test_token_inside_margin_is_renewed_in_background(self, monkeypatch):
+        monkeypatch.setenv("GRAPH_TOKEN_REFRESH_MARGIN", "300")
+
+        async def run():
+            # A 10 minute token: renewal is due after 5 minutes
+            endpoint = TokenEndpoint(expires_in=600)
+            provider = make_provider(endpoint)
+            assert await provider.get_token() == "tok-1"
+
+            provider._refresh_at -= 400
+            endpoint.release.clear()
+            # Still valid, so it is returned without waiting for the renewal
+            assert await provider.get_token() == "tok-1"
+            endpoint.release.set()
+            await provider._refresh_task
+            return await provider.get_token(), endpoint.calls
+
+        assert asyncio.run(run()) == ("tok-2", 2)
+
+
+class TestInvalidate:
+    """A token Graph rejects is replaced once"""
+
+    def test_stale_invalidate_keeps_newer_token(self):
+        async def run():
+            provider = make_provider(TokenEndpoint())
+            await provider.get_token()
+            provider.invalidate()
+            assert await provider.get_token() == "tok-2"
+            # A caller still holding tok-1 must not drop tok-2
+            provider.invalidate("tok-1")
+            return await provider.get_token()
+
+        assert asyncio.run(run()) == "tok-2"
+
+    def test_401_fetches_new_token_and_retries(self, monkeypatch):
+        for name in ("MS_ACCESS_TOKEN", "MS_USER_ID"):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setenv("MS_CLIENT_ID", "app")
+        monkeypatch.setenv("MS_CLIENT_SECRET", "secret")
+        monkeypatch.setenv("MS_TENANT_ID", "tenant")
+
+        async def run():
+            endpoint = TokenEndpoint()
+            seen = []
+
+            async def handler(request: httpx.Request) -> httpx.Response:
+                if request.url.host == "login.microsoftonline.com":
+                    return await endpoint.handle(request)
+                seen.append(request.headers["Authorization"])
+                # tok-1 was revoked
+                status = 401 if request.headers["Authorization"] == "Bearer tok-1" else 200
+                return httpx.Response(status, json={})
+
+            client = MSGraphClient()
+            client._http = httpx.AsyncClient(base_url="https://graph.test/v1.0", transport=httpx.MockTransport(handler))
+            client.token_provider._http = client._http
+
+            response = await client.request("GET", "/users/ops@example.com/contacts")
+            return response.status_code, seen, endpoint.calls
+
+        assert asyncio.run(run()) == (200, ["Bearer tok-1", "Bearer tok-2"], 2)
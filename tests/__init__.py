@@ -0,0 +1 @@
+"""Tests for api_simple"""
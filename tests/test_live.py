@@ -0,0 +1,120 @@
+"""
+Tests for the live WebSocket feed in api_simple
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import api_simple
+from api_simple import Subscriber
+
+HEADERS = {"X-API-Key": api_simple.API_KEY}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api_simple, "TWINS", {})
+    monkeypatch.setattr(api_simple, "TELEMETRY", {})
+    monkeypatch.setattr(api_simple, "LIVE_FLUSH_INTERVAL", 0.02)
+    with TestClient(api_simple.app) as client:
+        yield client
+
+
+class RecordingSocket:
+    """Stands in for a WebSocket; fails every send once `error` is set"""
+
+    def __init__(self, error=None):
+        self.sent = []
+        self.error = error
+
+    async def send_text(self, message):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(message)
+
+
+class TestSubscriber:
+    """The outbox keeps the latest message per key and stays bounded"""
+
+    def test_newer_message_replaces_pending_one(self):
+        async def run():
+            subscriber = Subscriber(RecordingSocket(), None)
+            subscriber.offer(("twin", "a"), "a1")
+            subscriber.offer(("twin", "b"), "b1")
+            subscriber.offer(("twin", "a"), "a2")
+            sender = asyncio.create_task(subscriber.run())
+            await asyncio.sleep(0)
+            sender.cancel()
+            return subscriber.websocket.sent
+
+        # The replacement keeps the queue position of the message it replaced
+        assert asyncio.run(run()) == ["a2", "b1"]
+
+    def test_full_outbox_drops_oldest(self, monkeypatch):
+        monkeypatch.setattr(api_simple, "LIVE_QUEUE_SIZE", 2)
+        subscriber = Subscriber(RecordingSocket(), None)
+        for name in "abc":
+            subscriber.offer(("twin", name), name)
+        assert list(subscriber.pending.values()) == ["b", "c"]
+
+    @pytest.mark.parametrize("error", [OSError("peer gone"), RuntimeError("closed"), WebSocketDisconnect()])
+    def test_send_failure_ends_run(self, error):
+        async def run():
+            subscriber = Subscriber(RecordingSocket(error), None)
+            subscriber.offer(("twin", "a"), "a1")
+            await asyncio.wait_for(subscriber.run(), timeout=1)
+
+        asyncio.run(run())
+
+
+class TestLiveFeed:
+    """Subscribers get a snapshot, then twin and telemetry changes"""
+
+    def test_snapshot_then_updates(self, client):
+        pump = client.post("/api/v1/twins", json={"name": "pump"}, headers=HEADERS).json()
+
+        with client.websocket_connect(f"/api/v1/twins/live?api_key={api_simple.API_KEY}") as ws:
+            snapshot = ws.receive_json()
+            assert snapshot["type"] == "snapshot"
+            assert [twin["id"] for twin in snapshot["twins"]] == [pump["id"]]
+
+            created = client.post("/api/v1/twins", json={"name": "fan"}, headers=HEADERS).json()
+            message = ws.receive_json()
+            assert message["type"] == "twin"
+            assert message["event"] == "created"
+            assert message["twin"]["id"] == created["id"]
+
+            # Batches between two flushes go out as one message with the latest values
+            url = f"/api/v1/twins/{pump['id']}/telemetry"
+            client.post(url, content=json.dumps({"timestamps": [1, 2], "metrics": {"t": [10, 20]}}), headers=HEADERS)
+            client.post(url, content=json.dumps({"timestamps": [3], "metrics": {"t": [30]}}), headers=HEADERS)
+            message = ws.receive_json()
+            assert message["type"] == "telemetry"
+            assert message["twin_id"] == pump["id"]
+            if message["metrics"]["t"]["samples"] < 3:
+                # The flush ran between the two posts
+                message = ws.receive_json()
+            assert message["metrics"]["t"] == {"timestamp": 3, "value": 30, "samples": 3}
+
+    def test_subscription_filters_twins(self, client):
+        pump = client.post("/api/v1/twins", json={"name": "pump"}, headers=HEADERS).json()
+        client.post("/api/v1/twins", json={"name": "fan"}, headers=HEADERS)
+
+        url = f"/api/v1/twins/live?api_key={api_simple.API_KEY}&twin_id={pump['id']}"
+        with client.websocket_connect(url) as ws:
+            assert [twin["id"] for twin in ws.receive_json()["twins"]] == [pump["id"]]
+
+            client.post("/api/v1/twins", json={"name": "valve"}, headers=HEADERS)
+            client.delete(f"/api/v1/twins/{pump['id']}", headers=HEADERS)
+            message = ws.receive_json()
+            assert (message["event"], message["twin"]["id"]) == ("deleted", pump["id"])
+
+    def test_invalid_key_is_closed(self, client):
+        with pytest.raises(WebSocketDisconnect) as e:
+            with client.websocket_connect("/api/v1/twins/live?api_key=wrong") as ws:
+                ws.receive_json()
+        assert e.value.code == 1008
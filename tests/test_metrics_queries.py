@@ -0,0 +1,236 @@
+"""
+Tests for telemetry rollups, aggregates and downsampling in api_simple
+
+Each algorithm is checked against a brute-force reference on seeded
+random series.
+"""
+
+import math
+import random
+from array import array
+
+import pytest
+from fastapi import HTTPException
+
+import api_simple
+from api_simple import RingBuffer, _minmax_reduce, aggregate, lttb
+
+
+def random_series(rng: random.Random, n: int, start: float = 0.0):
+    """Non-decreasing timestamps (with occasional repeats) and random values"""
+    timestamps, t = [], start
+    for _ in range(n):
+        t += rng.choice([0.0, 0.25, 0.5, 1.0, 3.0])
+        timestamps.append(t)
+    return array("d", timestamps), array("d", (rng.uniform(-100, 100) for _ in range(n)))
+
+
+def reference_buckets(timestamps, values, bucket):
+    """{bucket start: [count, min, max, sum]} by a straight scan"""
+    buckets = {}
+    for t, v in zip(timestamps, values):
+        start = math.floor(t / bucket) * bucket
+        stats = buckets.setdefault(start, [0, math.inf, -math.inf, 0.0])
+        stats[0] += 1
+        stats[1] = min(stats[1], v)
+        stats[2] = max(stats[2], v)
+        stats[3] += v
+    return buckets
+
+
+def assert_stats_equal(actual, expected):
+    assert actual[0] == expected[0]
+    assert actual[1] == expected[1]
+    assert actual[2] == expected[2]
+    assert actual[3] == pytest.approx(expected[3])
+
+
+class TestRollup:
+    """Incremental rollups match a full recomputation"""
+
+    @pytest.mark.parametrize("seed", range(5))
+    @pytest.mark.parametrize("bucket", [1.0, 2.5, 10.0])
+    def test_matches_reference_across_wraparound(self, seed, bucket):
+        rng = random.Random(seed)
+        buffer = RingBuffer(50)
+        t = 0.0
+        # Batches smaller than, around and larger than the capacity
+        for size in [7, 20, 30, 3, 49, 50, 80, 1, 12]:
+            timestamps, values = random_series(rng, size, t)
+            t = timestamps[-1]
+            buffer.extend(timestamps, values)
+
+            rollup = buffer.rollup(bucket)
+            expected = reference_buckets(*buffer.ordered(), bucket)
+            assert sorted(rollup.buckets) == sorted(expected)
+            for start, stats in expected.items():
+                assert_stats_equal(rollup.buckets[start], stats)
+
+    def test_unchanged_buffer_is_not_rescanned(self):
+        buffer = RingBuffer(10)
+        buffer.extend(array("d", [1, 2, 3]), array("d", [1, 2, 3]))
+        rollup = buffer.rollup(1.0)
+        consumed = rollup.consumed
+        assert buffer.rollup(1.0) is rollup
+        assert rollup.consumed == consumed
+
+
+class TestAggregate:
+    """aggregate() over a window matches a scan of the raw samples"""
+
+    @pytest.mark.parametrize("seed", range(5))
+    @pytest.mark.parametrize("percentiles", [[], [50, 95]])
+    def test_bucketed_window(self, seed, percentiles):
+        rng = random.Random(seed)
+        buffer = RingBuffer(200)
+        for _ in range(4):
+            buffer.extend(*random_series(rng, 120, buffer.last_timestamp or 0.0))
+
+        timestamps, values = buffer.ordered()
+        since = rng.uniform(timestamps[0], timestamps[len(timestamps) // 2])
+        until = rng.uniform(timestamps[len(timestamps) // 2], timestamps[-1])
+        bucket = 5.0
+        # Warm the rollup so covered buckets come from the cache
+        buffer.rollup(bucket)
+
+        rows = aggregate(buffer, since, until, bucket, percentiles)
+
+        window = [(t, v) for t, v in zip(timestamps, values) if since <= t <= until]
+        expected = reference_buckets([t for t, _ in window], [v for _, v in window], bucket)
+        assert [row["start"] for row in rows] == sorted(expected)
+        for row in rows:
+            stats = expected[row["start"]]
+            assert_stats_equal([row["count"], row["min"], row["max"], row["mean"] * row["count"]], stats)
+            chunk = sorted(v for t, v in window if math.floor(t / bucket) * bucket == row["start"])
+            for pct in percentiles:
+                rank = max(math.ceil(pct / 100 * len(chunk)) - 1, 0)
+                assert row[f"p{pct:g}"] == chunk[rank]
+
+    def test_whole_window(self):
+        rng = random.Random(7)
+        buffer = RingBuffer(100)
+        timestamps, values = random_series(rng, 100)
+        buffer.extend(timestamps, values)
+
+        [row] = aggregate(buffer, None, None, None, [])
+        assert row["start"] == timestamps[0]
+        assert row["count"] == 100
+        assert row["min"] == min(values)
+        assert row["max"] == max(values)
+        assert row["mean"] == pytest.approx(sum(values) / 100)
+
+    def test_bucket_too_small_for_timestamps(self):
+        buffer = RingBuffer(10)
+        buffer.extend(array("d", [0, 1e9]), array("d", [1, 2]))
+        with pytest.raises(HTTPException) as e:
+            aggregate(buffer, 0, 1e9, 1e-300, [])
+        assert e.value.status_code == 422
+        # A window holding a single sample is rejected too, not a 500
+        with pytest.raises(HTTPException) as e:
+            aggregate(buffer, 1e9, 1e9, 1e-300, [])
+        assert e.value.status_code == 422
+
+    def test_narrow_window_does_not_build_whole_buffer_rollup(self):
+        buffer = RingBuffer(1000)
+        timestamps = array("d", (float(i) for i in range(1000)))
+        values = array("d", (float(i % 17) for i in range(1000)))
+        buffer.extend(timestamps, values)
+
+        rows = aggregate(buffer, 10, 10.5, 0.000001, [])
+
+        # The buffer spans far more than METRICS_MAX_BUCKETS such buckets
+        assert buffer.rollups == {}
+        window = [(t, v) for t, v in zip(timestamps, values) if 10 <= t <= 10.5]
+        expected = reference_buckets([t for t, _ in window], [v for _, v in window], 0.000001)
+        assert [row["start"] for row in rows] == sorted(expected)
+        for row in rows:
+            assert row["count"] == expected[row["start"]][0]
+
+    def test_empty_window(self):
+        buffer = RingBuffer(10)
+        buffer.extend(array("d", [1, 2, 3]), array("d", [1, 2, 3]))
+        assert aggregate(buffer, 10, 20, 1.0, []) == []
+
+
+def reference_lttb(timestamps, values, points):
+    """Textbook Largest-Triangle-Three-Buckets"""
+    n = len(timestamps)
+    selected = [0]
+    every = (n - 2) / (points - 2)
+    a = 0
+    for i in range(points - 2):
+        lo, hi = int(i * every) + 1, int((i + 1) * every) + 1
+        next_lo, next_hi = hi, min(int((i + 2) * every) + 1, n)
+        cx = sum(timestamps[next_lo:next_hi]) / (next_hi - next_lo)
+        cy = sum(values[next_lo:next_hi]) / (next_hi - next_lo)
+        best, best_area = lo, -1.0
+        for b in range(lo, hi):
+            area = 0.5 * abs(
+                (timestamps[a] - cx) * (values[b] - values[a])
+                - (timestamps[a] - timestamps[b]) * (cy - values[a])
+            )
+            if area > best_area:
+                best, best_area = b, area
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
+
+
+class TestDownsampling:
+    """LTTB and the min/max pre-reduction"""
+
+    @pytest.mark.parametrize("seed", range(5))
+    @pytest.mark.parametrize("n,points", [(10, 3), (100, 7), (1000, 100), (997, 250)])
+    def test_lttb_matches_reference(self, seed, n, points):
+        rng = random.Random(seed)
+        timestamps, values = random_series(rng, n)
+        timestamps = array("d", (t + i * 1e-6 for i, t in enumerate(timestamps)))
+
+        out_t, out_v = lttb(timestamps, values, points)
+
+        indices = reference_lttb(timestamps, values, points)
+        assert list(out_t) == [timestamps[i] for i in indices]
+        assert list(out_v) == [values[i] for i in indices]
+
+    def test_lttb_passes_small_inputs_through(self):
+        timestamps, values = array("d", [1, 2, 3]), array("d", [4, 5, 6])
+        assert lttb(timestamps, values, 5) == (timestamps, values)
+        assert lttb(timestamps, values, 2) == (timestamps, values)
+
+    @pytest.mark.parametrize("seed", range(5))
+    @pytest.mark.parametrize("n,target", [(100, 10), (1001, 64), (37, 36), (5, 40)])
+    def test_minmax_reduce_matches_reference(self, seed, n, target):
+        rng = random.Random(seed)
+        timestamps, values = random_series(rng, n)
+
+        out_t, out_v = _minmax_reduce(timestamps, values, target)
+
+        chunks = max(target // 2, 1)
+        expected = []
+        for c in range(chunks):
+            lo, hi = int(c * n / chunks), int((c + 1) * n / chunks)
+            if hi <= lo:
+                continue
+            chunk = list(range(lo, hi))
+            lowest = min(chunk, key=lambda k: (values[k], k))
+            highest = min(chunk, key=lambda k: (-values[k], k))
+            expected.extend(sorted({lowest, highest}))
+        assert list(out_t) == [timestamps[k] for k in expected]
+        assert list(out_v) == [values[k] for k in expected]
+        assert len(out_t) <= 2 * chunks
+        assert min(out_v) == min(values)
+        assert max(out_v) == max(values)
+
+    def test_large_input_is_reduced_before_lttb(self, monkeypatch):
+        monkeypatch.setattr(api_simple, "LTTB_MAX_INPUT", 200)
+        rng = random.Random(3)
+        timestamps, values = random_series(rng, 5000)
+        timestamps = array("d", (t + i * 1e-6 for i, t in enumerate(timestamps)))
+
+        out_t, out_v = lttb(timestamps, values, 50)
+
+        reduced_t, reduced_v = _minmax_reduce(timestamps, values, 200)
+        indices = reference_lttb(reduced_t, reduced_v, 50)
+        assert list(out_t) == [reduced_t[i] for i in indices]
+        assert list(out_v) == [reduced_v[i] for i in indices]
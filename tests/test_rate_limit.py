@@ -0,0 +1,120 @@
+"""
+Tests for per-key quotas and the token bucket rate limiter in api_simple
+"""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api_simple
+from api_simple import RateLimitMiddleware, TokenBucket, _parse_api_keys
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    """A client for a bare app behind the rate limiter, with two slow tenants"""
+    monkeypatch.setattr(api_simple, "API_KEYS", {
+        "key-a": {"tenant": "a", "rate": 0.5, "burst": 2},
+        "key-b": {"tenant": "b", "rate": 0.5, "burst": 3},
+    })
+    monkeypatch.setattr(api_simple, "RATE_LIMIT_RPS", 0.5)
+    monkeypatch.setattr(api_simple, "RATE_LIMIT_BURST", 1)
+
+    app = FastAPI()
+
+    @app.get("/api/v1/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    return TestClient(RateLimitMiddleware(app))
+
+
+class TestParseApiKeys:
+    """API_KEYS entries become per-key tenants and quotas"""
+
+    def test_entries(self, monkeypatch):
+        monkeypatch.setattr(api_simple, "API_KEY", "main")
+        monkeypatch.setattr(api_simple, "RATE_LIMIT_RPS", 20.0)
+        monkeypatch.setattr(api_simple, "RATE_LIMIT_BURST", 40.0)
+
+        keys = _parse_api_keys(" a:key-a:50:100 , b:key-b:80,c:key-c,")
+
+        assert keys == {
+            "main": {"tenant": "default", "rate": 20.0, "burst": 40.0},
+            "key-a": {"tenant": "a", "rate": 50.0, "burst": 100.0},
+            "key-b": {"tenant": "b", "rate": 80.0, "burst": 80.0},
+            "key-c": {"tenant": "c", "rate": 20.0, "burst": 40.0},
+        }
+
+    @pytest.mark.parametrize("spec", ["just-a-name", "a:key:0", "a:key:-1", "a:key:5:0.5", "a:key:fast"])
+    def test_invalid_entry(self, spec):
+        with pytest.raises(ValueError):
+            _parse_api_keys(spec)
+
+    def test_invalid_default_quota(self, monkeypatch):
+        monkeypatch.setattr(api_simple, "RATE_LIMIT_RPS", 0.0)
+        with pytest.raises(ValueError):
+            _parse_api_keys("")
+
+
+class TestTokenBucket:
+    """Tokens refill with time up to the burst size"""
+
+    def test_refill(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(api_simple.time, "monotonic", lambda: now[0])
+        bucket = TokenBucket(rate=2, burst=3)
+
+        assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+        now[0] += 0.5
+        assert bucket.take() is True
+        assert bucket.take() is False
+        now[0] += 60
+        assert bucket.take() is True
+        assert bucket.tokens == 2
+
+
+class TestRateLimitMiddleware:
+    """Requests past the quota get 429 with headers telling when to retry"""
+
+    def test_headers_and_429(self, limited):
+        first = limited.get("/api/v1/ping", headers={"X-API-Key": "key-a"})
+        assert first.status_code == 200
+        assert first.headers["ratelimit-limit"] == "2"
+        assert first.headers["ratelimit-remaining"] == "1"
+        assert first.headers["ratelimit-policy"] == "2;w=4"
+        assert "retry-after" not in first.headers
+
+        assert limited.get("/api/v1/ping", headers={"X-API-Key": "key-a"}).status_code == 200
+        refused = limited.get("/api/v1/ping", headers={"X-API-Key": "key-a"})
+        assert refused.status_code == 429
+        assert refused.json() == {"detail": "Rate limit exceeded"}
+        assert refused.headers["ratelimit-remaining"] == "0"
+        assert refused.headers["retry-after"] == "2"
+        assert refused.headers["ratelimit-reset"] == "4"
+
+    def test_keys_have_separate_buckets(self, limited):
+        for _ in range(2):
+            limited.get("/api/v1/ping", headers={"X-API-Key": "key-a"})
+        assert limited.get("/api/v1/ping", headers={"X-API-Key": "key-a"}).status_code == 429
+
+        response = limited.get("/api/v1/ping", headers={"X-API-Key": "key-b"})
+        assert response.status_code == 200
+        assert response.headers["ratelimit-limit"] == "3"
+
+    def test_unknown_keys_share_one_bucket(self, limited):
+        assert limited.get("/api/v1/ping", headers={"X-API-Key": "guess-1"}).status_code == 200
+        assert limited.get("/api/v1/ping", headers={"X-API-Key": "guess-2"}).status_code == 429
+        assert limited.get("/api/v1/ping").status_code == 429
+        # Configured keys are not affected
+        assert limited.get("/api/v1/ping", headers={"X-API-Key": "key-a"}).status_code == 200
+
+    def test_other_paths_are_not_limited(self, limited):
+        for _ in range(5):
+            response = limited.get("/health")
+            assert response.status_code == 200
+            assert "ratelimit-limit" not in response.headers
@@ -0,0 +1,112 @@
+"""
+Tests for saving and restoring the twin snapshot in api_simple
+"""
+
+import asyncio
+import os
+from array import array
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api_simple
+from api_simple import RingBuffer, Twin, load_snapshot, save_snapshot
+
+HEADERS = {"X-API-Key": api_simple.API_KEY}
+
+
+@pytest.fixture
+def state(monkeypatch, tmp_path):
+    """Empty registry and telemetry, snapshotting to a temporary file"""
+    monkeypatch.setattr(api_simple, "TWINS", {})
+    monkeypatch.setattr(api_simple, "TELEMETRY", {})
+    monkeypatch.setattr(api_simple, "TELEMETRY_BUFFER_SIZE", 8)
+    monkeypatch.setattr(api_simple, "SNAPSHOT_PATH", str(tmp_path / "twins.snap"))
+    monkeypatch.setattr(api_simple, "_snapshot_saved", None)
+    return api_simple.SNAPSHOT_PATH
+
+
+def add_twin(twin_id: str, **series):
+    now = datetime(2024, 1, 15, 10, 30)
+    api_simple.TWINS[twin_id] = Twin(id=twin_id, name=twin_id.title(), status="active",
+                                     metadata={"line": 3}, created_at=now, updated_at=now)
+    buffers = api_simple.TELEMETRY[twin_id] = {}
+    for metric, (timestamps, values) in series.items():
+        buffer = buffers[metric] = RingBuffer(api_simple.TELEMETRY_BUFFER_SIZE)
+        buffer.extend(array("d", timestamps), array("d", values))
+
+
+def dump_state():
+    return (
+        {twin_id: twin.model_dump() for twin_id, twin in api_simple.TWINS.items()},
+        {
+            twin_id: {
+                metric: ([list(column) for column in buffer.ordered()], buffer.appended)
+                for metric, buffer in buffers.items()
+            }
+            for twin_id, buffers in api_simple.TELEMETRY.items()
+        },
+    )
+
+
+class TestSnapshot:
+    """save_snapshot -> load_snapshot restores twins and samples"""
+
+    def test_round_trip(self, state):
+        # Twelve samples in a buffer of eight: the ring has wrapped
+        add_twin("pump", temperature=(range(12), [t * 1.5 for t in range(12)]), pressure=([1, 2], [0.1, -0.2]))
+        add_twin("fan", rpm=([5, 5, 6], [1e9, -1e-9, 0]))
+        add_twin("valve")
+        saved = dump_state()
+
+        asyncio.run(save_snapshot())
+        api_simple.TWINS.clear()
+        api_simple.TELEMETRY.clear()
+        load_snapshot(state)
+
+        assert dump_state() == saved
+        assert saved[1]["pump"]["temperature"] == ([list(range(4, 12)), [t * 1.5 for t in range(4, 12)]], 12)
+        # Restored buffers keep accepting samples
+        api_simple.TELEMETRY["fan"]["rpm"].extend(array("d", [7]), array("d", [1]))
+        assert api_simple.TELEMETRY["fan"]["rpm"].last() == (7, 1)
+
+    def test_unchanged_state_is_not_rewritten(self, state):
+        add_twin("pump", temperature=([1], [1]))
+        asyncio.run(save_snapshot())
+        written = os.stat(state).st_mtime_ns
+        os.utime(state, ns=(0, 0))
+
+        asyncio.run(save_snapshot())
+        assert os.stat(state).st_mtime_ns == 0
+
+        api_simple.TELEMETRY["pump"]["temperature"].extend(array("d", [2]), array("d", [2]))
+        asyncio.run(save_snapshot())
+        assert os.stat(state).st_mtime_ns >= written
+
+    def test_missing_file_is_ignored(self, state):
+        add_twin("pump")
+        load_snapshot(state)
+        assert list(api_simple.TWINS) == ["pump"]
+
+    def test_other_file_is_rejected(self, state):
+        with open(state, "wb") as f:
+            f.write(b"not a snapshot")
+        add_twin("pump")
+        with pytest.raises(ValueError):
+            load_snapshot(state)
+        assert list(api_simple.TWINS) == ["pump"]
+
+    def test_restart_restores_twins(self, state):
+        with TestClient(api_simple.app) as client:
+            twin = client.post("/api/v1/twins", json={"name": "pump"}, headers=HEADERS).json()
+            client.post(f"/api/v1/twins/{twin['id']}/telemetry",
+                        content='{"timestamps": [1, 2], "metrics": {"t": [3, 4]}}', headers=HEADERS)
+        # Shutdown saved the snapshot; startup loads it back
+        api_simple.TWINS.clear()
+        api_simple.TELEMETRY.clear()
+
+        with TestClient(api_simple.app) as client:
+            response = client.get(f"/api/v1/twins/{twin['id']}/telemetry/t", headers=HEADERS)
+        assert response.status_code == 200
+        assert response.json()["values"] == [3, 4]
@@ -0,0 +1,86 @@
+"""
+Tests for telemetry batch validation in api_simple
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api_simple
+
+HEADERS = {"X-API-Key": api_simple.API_KEY}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(api_simple, "TWINS", {})
+    monkeypatch.setattr(api_simple, "TELEMETRY", {})
+    with TestClient(api_simple.app) as client:
+        yield client
+
+
+@pytest.fixture
+def ingest(client):
+    twin_id = client.post("/api/v1/twins", json={"name": "pump"}, headers=HEADERS).json()["id"]
+
+    def post(body: str):
+        return client.post(f"/api/v1/twins/{twin_id}/telemetry", content=body, headers=HEADERS)
+
+    post.twin_id = twin_id
+    return post
+
+
+class TestIngest:
+    """Batches are stored in order and invalid ones leave the buffers untouched"""
+
+    def test_accepted_batch_is_stored(self, ingest):
+        response = ingest('{"timestamps": [1, 2, 2, 3], "metrics": {"t": [1.5, 2, 3, 4], "p": [0, 0, 0, 1]}}')
+
+        assert response.status_code == 202
+        assert response.json() == {"accepted": 8, "metrics": 2}
+        buffer = api_simple.TELEMETRY[ingest.twin_id]["t"]
+        assert [list(column) for column in buffer.ordered()] == [[1, 2, 2, 3], [1.5, 2, 3, 4]]
+
+    def test_out_of_order_batch_is_422(self, ingest):
+        response = ingest('{"timestamps": [2, 1], "metrics": {"t": [1, 2]}}')
+        assert response.status_code == 422
+        assert "non-decreasing" in response.json()["detail"]
+
+    def test_batch_older_than_stored_samples_is_422(self, ingest):
+        assert ingest('{"timestamps": [10, 11], "metrics": {"t": [1, 2]}}').status_code == 202
+
+        response = ingest('{"timestamps": [5, 12], "metrics": {"t": [3, 4], "p": [1, 1]}}')
+
+        assert response.status_code == 422
+        assert "already has samples up to 11" in response.json()["detail"]
+        # Nothing from the rejected batch is stored, not even the new metric
+        assert list(api_simple.TELEMETRY[ingest.twin_id]) == ["t"]
+        assert api_simple.TELEMETRY[ingest.twin_id]["t"].count == 2
+
+    @pytest.mark.parametrize("body", [
+        '{"timestamps": [1, NaN], "metrics": {"t": [1, 2]}}',
+        '{"timestamps": [1, Infinity], "metrics": {"t": [1, 2]}}',
+        '{"timestamps": [1, 2], "metrics": {"t": [1, NaN]}}',
+        '{"timestamps": [1, 2], "metrics": {"t": [-Infinity, 2]}}',
+    ])
+    def test_non_finite_samples_are_422(self, ingest, body):
+        assert ingest(body).status_code == 422
+        assert api_simple.TELEMETRY[ingest.twin_id] == {}
+
+    @pytest.mark.parametrize("body", [
+        '{"timestamps": [1, 2], "metrics": {"t": [true, 2]}}',
+        '{"timestamps": [false, 2], "metrics": {"t": [1, 2]}}',
+        '{"timestamps": [1, 2], "metrics": {"t": ["1", 2]}}',
+        '{"timestamps": [1, 2], "metrics": {"t": [1, null]}}',
+    ])
+    def test_non_numeric_samples_are_422(self, ingest, body):
+        response = ingest(body)
+        assert response.status_code == 422
+        assert response.json()["detail"].startswith("Invalid telemetry batch")
+
+    def test_metric_named_true_is_accepted(self, ingest):
+        assert ingest('{"timestamps": [1], "metrics": {"true": [1]}}').status_code == 202
+
+    def test_length_mismatch_is_422(self, ingest):
+        response = ingest('{"timestamps": [1, 2], "metrics": {"t": [1]}}')
+        assert response.status_code == 422
+        assert response.json()["detail"] == "Metric 't' has 1 values for 2 timestamps"